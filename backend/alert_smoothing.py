@@ -0,0 +1,147 @@
+"""
+Alert smoothing — per-track temporal filtering of shoplifting scores with
+enter / exit hysteresis, so a single noisy window does not raise an alert.
+
+Modes:
+  "none"    raw score >= enter threshold alerts (previous behaviour)
+  "ema"     exponential moving average of the score, starting from a prior
+            (0 by default) so one high window on a new track cannot alert;
+            alerts when it rises to the enter threshold, re-arms once it
+            falls below the exit threshold
+  "k_of_n"  alerts when k of the last n scores reach the enter threshold,
+            re-arms once fewer than k of the last n reach the exit threshold
+
+Settings come from config and can be overridden per camera. Raw scores can
+be logged (ALERT_SCORE_LOG) and replayed offline with replay_alerts.py.
+"""
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+
+from config import (
+    ALERT_SMOOTHING,
+    ALERT_EMA_ALPHA,
+    ALERT_EMA_PRIOR,
+    ALERT_K_OF_N,
+    ALERT_ENTER_THRESHOLD,
+    ALERT_EXIT_THRESHOLD,
+    ALERT_SMOOTHING_OVERRIDES,
+)
+
+MODES = ("none", "ema", "k_of_n")
+
+
+@dataclass(frozen=True)
+class SmoothingConfig:
+    mode: str = ALERT_SMOOTHING
+    ema_alpha: float = ALERT_EMA_ALPHA
+    ema_prior: float = ALERT_EMA_PRIOR
+    k: int = ALERT_K_OF_N[0]
+    n: int = ALERT_K_OF_N[1]
+    enter_threshold: float = ALERT_ENTER_THRESHOLD
+    exit_threshold: float = ALERT_EXIT_THRESHOLD
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown alert smoothing mode {self.mode!r} (expected one of {MODES})")
+        if self.exit_threshold > self.enter_threshold:
+            raise ValueError("Alert exit threshold must not exceed the enter threshold")
+        if not 0.0 <= self.ema_prior <= 1.0:
+            raise ValueError("Alert EMA prior must be between 0 and 1")
+        if not 1 <= self.k <= self.n:
+            raise ValueError("Alert k-of-n needs 1 <= k <= n")
+
+    def describe(self) -> str:
+        if self.mode == "ema":
+            detail = f"alpha={self.ema_alpha}, prior={self.ema_prior}"
+        elif self.mode == "k_of_n":
+            detail = f"k={self.k}/{self.n}"
+        else:
+            detail = "raw"
+        return f"{self.mode}({detail}, enter={self.enter_threshold}, exit={self.exit_threshold})"
+
+
+def smoothing_config_for(camera_id: str) -> SmoothingConfig:
+    """Default settings with this camera's ALERT_SMOOTHING_OVERRIDES applied."""
+    overrides = ALERT_SMOOTHING_OVERRIDES.get(camera_id, {})
+    try:
+        return replace(SmoothingConfig(), **overrides)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid ALERT_SMOOTHING_OVERRIDES for camera {camera_id!r}: {e}") from e
+
+
+def validate_smoothing_overrides():
+    """Build every configured camera's settings once, so bad overrides fail at startup."""
+    if not isinstance(ALERT_SMOOTHING_OVERRIDES, dict) or not all(
+        isinstance(v, dict) for v in ALERT_SMOOTHING_OVERRIDES.values()
+    ):
+        raise ValueError("ALERT_SMOOTHING_OVERRIDES must map camera ids to objects of settings")
+    SmoothingConfig()
+    for camera_id in ALERT_SMOOTHING_OVERRIDES:
+        smoothing_config_for(camera_id)
+
+
+@dataclass
+class _TrackScore:
+    ema: float | None = None
+    recent: deque = field(default_factory=deque)
+    active: bool = False
+
+
+class AlertSmoother:
+    """Smoothed score + hysteresis state per track of one camera (not thread-safe)."""
+
+    def __init__(self, config: SmoothingConfig | None = None):
+        self.config = config or SmoothingConfig()
+        self._tracks: dict[int, _TrackScore] = {}
+
+    def update(self, track_id: int, score: float) -> bool:
+        """Feed a track's next window score. Returns True when it should alert."""
+        cfg = self.config
+        state = self._tracks.setdefault(track_id, _TrackScore(recent=deque(maxlen=cfg.n)))
+
+        if cfg.mode == "none":
+            return score >= cfg.enter_threshold
+
+        if cfg.mode == "ema":
+            prev = cfg.ema_prior if state.ema is None else state.ema
+            state.ema = cfg.ema_alpha * score + (1.0 - cfg.ema_alpha) * prev
+            enter = state.ema >= cfg.enter_threshold
+            stay = state.ema >= cfg.exit_threshold
+        else:
+            state.recent.append(score)
+            enter = sum(s >= cfg.enter_threshold for s in state.recent) >= cfg.k
+            stay = sum(s >= cfg.exit_threshold for s in state.recent) >= cfg.k
+
+        if not state.active and enter:
+            state.active = True
+            return True
+        if state.active and not stay:
+            state.active = False
+        return False
+
+    def smoothed(self, track_id: int) -> float | None:
+        state = self._tracks.get(track_id)
+        return state.ema if state is not None else None
+
+    def forget(self, track_id: int):
+        self._tracks.pop(track_id, None)
+
+    def reset(self):
+        self._tracks.clear()
+
+
+class ScoreLog:
+    """Append-only JSONL log of raw per-track scores, for replay_alerts.py."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, camera_id: str, track_id: int, timestamp: float, score: float):
+        line = json.dumps({"camera_id": camera_id, "track_id": track_id,
+                           "ts": round(timestamp, 3), "score": round(score, 5)})
+        with self._lock:
+            self._file.write(line + "\n")
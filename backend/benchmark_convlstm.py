@@ -0,0 +1,71 @@
+"""
+Benchmark the Keras ConvLSTM fallback: model.predict vs compiled tf.function.
+
+Usage (from backend/):
+    python benchmark_convlstm.py [path/to/model_grocery.h5] [--iters 50]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+import tensorflow as tf
+
+from convlstm_runtime import build_keras_infer_fns, run_keras_compiled
+
+SEQUENCE_LENGTH = 30
+IMAGE_HEIGHT = 96
+IMAGE_WIDTH = 96
+
+
+def _time_calls(fn, sequence: np.ndarray, iters: int) -> list[float]:
+    fn(sequence)  # warm-up call, excluded from timings
+    timings = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn(sequence)
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    return timings
+
+
+def _report(name: str, timings: list[float]):
+    arr = np.array(timings)
+    print(
+        f"  {name:<10} mean={arr.mean():7.2f} ms  p50={np.percentile(arr, 50):7.2f} ms  "
+        f"p95={np.percentile(arr, 95):7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "model", nargs="?", default=os.path.join("models", "model_grocery.h5")
+    )
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--batch-sizes", default="1,2,4")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        raise SystemExit(f"ERROR: {args.model} not found")
+
+    model = tf.keras.models.load_model(args.model)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    t0 = time.perf_counter()
+    fns = build_keras_infer_fns(model, SEQUENCE_LENGTH, IMAGE_HEIGHT, IMAGE_WIDTH, batch_sizes)
+    print(f"Compiled + warmed up {sorted(fns)} in {time.perf_counter() - t0:.2f} s")
+
+    for bs in batch_sizes:
+        sequence = np.random.rand(bs, SEQUENCE_LENGTH, IMAGE_HEIGHT, IMAGE_WIDTH, 3).astype(np.float32)
+        print(f"\nBatch size {bs}:")
+        predict_t = _time_calls(lambda x: model.predict(x, verbose=0), sequence, args.iters)
+        compiled_t = _time_calls(lambda x: run_keras_compiled(fns, model, x), sequence, args.iters)
+        _report("predict", predict_t)
+        _report("compiled", compiled_t)
+        print(f"  speedup    {np.mean(predict_t) / np.mean(compiled_t):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
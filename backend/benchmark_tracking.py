@@ -0,0 +1,139 @@
+"""
+Compare tracking backends on recorded footage: identity churn and per-frame
+tracking cost.
+
+YOLO runs once per frame; the cached detections are then replayed through a
+pipeline's tracking stage for each backend. Without ground truth, ID
+switches are estimated: a "likely switch" is a new person id that appears
+within --gap frames of another id ending, near where it ended.
+
+Usage (from backend/):
+    python benchmark_tracking.py footage.mp4 [--model "models/best (2).pt"]
+        [--backends iou,bytetrack,ultralytics] [--reid] [--realtime] [--max-frames 3000]
+
+--realtime paces the replay at the video's frame rate, so the pipeline's
+wall-clock track timeouts and re-ID gallery ages behave as they do live.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from config import YOLO_CONFIDENCE, YOLO_IMGSZ
+from detector import resolve_person_classes
+from pipeline import BoundingBox, FrameJob, ShopliftingPipeline
+from reid import ReIdGallery
+
+
+def read_frames(video_path: str, max_frames: int):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for _ in range(max_frames):
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def detect_all(model_path: str, video_path: str, max_frames: int):
+    """(per-frame detections, fps) for the video."""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    classes = resolve_person_classes(model.names)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 10.0
+    cap.release()
+    detections = []
+    for frame in read_frames(video_path, max_frames):
+        result = model(frame, conf=YOLO_CONFIDENCE, imgsz=YOLO_IMGSZ, classes=classes, verbose=False)[0]
+        xyxy = result.boxes.xyxy.cpu().numpy().astype(int)
+        confs = result.boxes.conf.cpu().numpy()
+        detections.append([BoundingBox(*map(int, b), float(c)) for b, c in zip(xyxy, confs)])
+    return detections, fps
+
+
+def run_backend(backend: str, video_path: str, detections, fps: float, use_reid: bool, realtime: bool):
+    pipeline = ShopliftingPipeline(
+        yolo_model=None,
+        convlstm_predict_fn=None,
+        sequence_length=1,  # keep buffers tiny; only tracking is exercised
+        camera_id=f"bench-{backend}",
+        reid_gallery=ReIdGallery() if use_reid else None,
+        tracker_backend=backend,
+    )
+    per_frame_ms, assignments = [], []
+    frames = read_frames(video_path, len(detections))  # re-read: crops need the pixels
+    for index, (frame, boxes) in enumerate(zip(frames, detections)):
+        started = time.perf_counter()
+        job = FrameJob(frame_bgr=frame, frame_index=index, timestamp=index / fps)
+        job.bboxes = list(boxes)
+        before = pipeline._tracking_ms
+        pipeline._stage_track(job)
+        with pipeline._lock:
+            pipeline._cleanup_stale_tracks()
+        per_frame_ms.append(pipeline._tracking_ms - before)
+        assignments.append(job.assignments)
+        if realtime:
+            time.sleep(max(0.0, 1.0 / fps - (time.perf_counter() - started)))
+    return per_frame_ms, assignments
+
+
+def identity_metrics(assignments, gap: int) -> dict:
+    first_seen, last_seen, last_box, lengths = {}, {}, {}, {}
+    likely_switches = 0
+    for index, frame_assignments in enumerate(assignments):
+        present = {pid for pid, _ in frame_assignments}
+        for pid, bbox in frame_assignments:
+            if pid not in first_seen:
+                first_seen[pid] = index
+                cx, cy = (bbox.x1 + bbox.x2) / 2, (bbox.y1 + bbox.y2) / 2
+                for other, seen in last_seen.items():
+                    if other in present or not 0 < index - seen <= gap:
+                        continue
+                    o = last_box[other]
+                    reach = max(o.x2 - o.x1, o.y2 - o.y1)
+                    if np.hypot(cx - (o.x1 + o.x2) / 2, cy - (o.y1 + o.y2) / 2) <= reach:
+                        likely_switches += 1
+                        break
+            last_seen[pid] = index
+            last_box[pid] = bbox
+            lengths[pid] = lengths.get(pid, 0) + 1
+    return {
+        "ids": len(first_seen),
+        "likely_switches": likely_switches,
+        "mean_track_len": float(np.mean(list(lengths.values()))) if lengths else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("--model", default="models/best (2).pt")
+    parser.add_argument("--backends", default="iou,bytetrack,ultralytics")
+    parser.add_argument("--reid", action="store_true", help="enable appearance re-ID")
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument("--max-frames", type=int, default=3000)
+    parser.add_argument("--gap", type=int, default=15, help="frames for the likely-switch estimate")
+    args = parser.parse_args()
+
+    detections, fps = detect_all(args.model, args.video, args.max_frames)
+    n_boxes = sum(len(d) for d in detections)
+    print(f"{len(detections)} frames @ {fps:.1f} fps, {n_boxes} detections\n")
+    print(f"  {'backend':<12} {'ids':>6} {'likely sw':>10} {'mean len':>9} "
+          f"{'mean ms':>8} {'p95 ms':>7}")
+    for backend in args.backends.split(","):
+        per_frame_ms, assignments = run_backend(
+            backend, args.video, detections, fps, args.reid, args.realtime
+        )
+        m = identity_metrics(assignments, args.gap)
+        ms = np.array(per_frame_ms)
+        print(f"  {backend:<12} {m['ids']:>6} {m['likely_switches']:>10} {m['mean_track_len']:>9.1f} "
+              f"{ms.mean():>8.3f} {np.percentile(ms, 95):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
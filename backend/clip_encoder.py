@@ -0,0 +1,153 @@
+"""
+Clip encoder — turns a list of BGR frames into MP4 bytes without a disk
+round trip.
+
+Preferred path: PyAV encodes H.264 (yuv420p, mobile-friendly profile,
+faststart) straight into an in-memory buffer. Fallback: OpenCV's
+VideoWriter needs a real path ending in .mp4 (FFmpeg picks the container
+from the extension), so it writes a file on tmpfs (/dev/shm) where
+available, created race-free with mkstemp.
+
+Benchmark (from backend/):
+    python clip_encoder.py --benchmark [--frames 100] [--width 960]
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from config import CLIP_CODEC_PROFILE, CLIP_CODEC_CRF, CLIP_CODEC_PRESET
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+def encode_mp4(frames: list[np.ndarray], fps: float) -> bytes | None:
+    """Encode same-sized BGR frames as MP4 bytes, in memory where possible (None if no encoder works)."""
+    if av is not None:
+        try:
+            return _encode_pyav(frames, fps)
+        except Exception as e:
+            print(f"[WARN] PyAV encode failed ({e}), falling back to OpenCV")
+    return _encode_opencv(frames, fps)
+
+
+def _encode_pyav(frames: list[np.ndarray], fps: float) -> bytes:
+    h, w = frames[0].shape[:2]
+    buf = io.BytesIO()
+    with av.open(buf, mode="w", format="mp4", options={"movflags": "+faststart"}) as container:
+        stream = container.add_stream("libx264", rate=int(round(fps)))
+        # yuv420p needs even dimensions
+        stream.width = w - (w % 2)
+        stream.height = h - (h % 2)
+        stream.pix_fmt = "yuv420p"
+        stream.options = {
+            "profile": CLIP_CODEC_PROFILE,
+            "preset": CLIP_CODEC_PRESET,
+            "crf": str(CLIP_CODEC_CRF),
+        }
+        for frame in frames:
+            if frame.shape[:2] != (h, w):
+                frame = cv2.resize(frame, (w, h))
+            video_frame = av.VideoFrame.from_ndarray(
+                frame[: stream.height, : stream.width], format="bgr24"
+            )
+            for packet in stream.encode(video_frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def _scratch_file() -> tuple[int, str]:
+    """Return (fd, path) for an .mp4 scratch file, on tmpfs if available."""
+    tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkstemp(suffix=".mp4", dir=tmp_dir)
+
+
+def _encode_opencv(frames: list[np.ndarray], fps: float) -> bytes | None:
+    h, w = frames[0].shape[:2]
+    fd, path = _scratch_file()
+    os.close(fd)  # VideoWriter reopens the path itself
+    try:
+        # H.264 if this OpenCV build has an encoder for it, else MPEG-4 Part 2
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"avc1"), fps, (w, h))
+        if not writer.isOpened():
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        if not writer.isOpened():
+            print("[ERROR] OpenCV has no usable MP4 encoder - clip not encoded")
+            return None
+        for frame in frames:
+            if frame.shape[:2] != (h, w):
+                frame = cv2.resize(frame, (w, h))
+            writer.write(frame)
+        writer.release()
+
+        with open(path, "rb") as f:
+            data = f.read()
+        return data or None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ──────────────────────────────────────────────────────────
+# Benchmark
+# ──────────────────────────────────────────────────────────
+def _legacy_mktemp(frames: list[np.ndarray], fps: float) -> bytes:
+    """The previous implementation: mp4v via a tempfile.mktemp path on disk."""
+    h, w = frames[0].shape[:2]
+    tmp_path = tempfile.mktemp(suffix=".mp4")
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    try:
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incident clip encoding")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=960)
+    parser.add_argument("--height", type=int, default=540)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Moving gradient + noise so encoders do real work
+    base = np.tile(np.linspace(0, 255, args.width, dtype=np.uint8), (args.height, 1))
+    frames = [
+        cv2.merge([np.roll(base, 8 * i, axis=1)] * 3)
+        + np.random.randint(0, 8, (args.height, args.width, 3), dtype=np.uint8)
+        for i in range(args.frames)
+    ]
+
+    backends = [("legacy mktemp", _legacy_mktemp), ("opencv tmpfs", _encode_opencv)]
+    if av is not None:
+        backends.append(("pyav h264 in-memory", _encode_pyav))
+
+    print(f"{args.frames} frames @ {args.width}x{args.height}")
+    for name, fn in backends:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            data = fn(frames, args.fps) or b""
+            timings.append((time.perf_counter() - t0) * 1000.0)
+        print(f"  {name:<22} {np.median(timings):8.1f} ms  {len(data) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,22 @@
 """
 Cloudinary upload service — uploads images and videos, returns secure_url.
+
+Uploads go through the SDK's own HTTP connector. It keeps urllib3's default
+pool of one idle connection per host, so concurrent outbox uploads open
+extra connections rather than reusing them; UPLOAD_POOL_SIZE does not apply
+here (only to the S3 backend).
 """
+import io
+
 import cloudinary
 import cloudinary.uploader
-from config import CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
+from config import (
+    CLOUDINARY_CLOUD_NAME,
+    CLOUDINARY_API_KEY,
+    CLOUDINARY_API_SECRET,
+    UPLOAD_CHUNKED_MIN_BYTES,
+    UPLOAD_CHUNK_SIZE,
+)
 
 # Configure once at import time
 cloudinary.config(
@@ -14,29 +27,54 @@ cloudinary.config(
 )
 
 
-def upload_image_bytes(image_bytes: bytes, folder: str = "incidents/images") -> dict:
+def upload_image_bytes(
+    image_bytes: bytes,
+    folder: str = "incidents/images",
+    public_id: str | None = None,
+    image_format: str = "jpg",
+) -> dict:
     """
-    Upload a JPEG/PNG image (as raw bytes) to Cloudinary.
+    Upload a JPEG/PNG/WebP image (as raw bytes) to Cloudinary, stored as `image_format`.
+    With a `public_id`, re-uploading overwrites instead of duplicating.
     Returns dict with 'secure_url', 'public_id', etc.
     """
     result = cloudinary.uploader.upload(
         image_bytes,
         folder=folder,
         resource_type="image",
-        format="jpg",
+        format=image_format,
+        public_id=public_id,
+        overwrite=True,
     )
     return result
 
 
-def upload_video_bytes(video_bytes: bytes, folder: str = "incidents/videos") -> dict:
+def upload_video_bytes(
+    video_bytes: bytes, folder: str = "incidents/videos", public_id: str | None = None
+) -> dict:
     """
     Upload a video file (as raw bytes) to Cloudinary.
+    Clips of UPLOAD_CHUNKED_MIN_BYTES or more go up in chunks.
+    With a `public_id`, re-uploading overwrites instead of duplicating.
     Returns dict with 'secure_url', 'public_id', etc.
     """
+    if len(video_bytes) >= UPLOAD_CHUNKED_MIN_BYTES:
+        return cloudinary.uploader.upload_large(
+            io.BytesIO(video_bytes),
+            filename=f"{public_id or 'clip'}.mp4",
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            folder=folder,
+            resource_type="video",
+            public_id=public_id,
+            overwrite=True,
+        )
+
     result = cloudinary.uploader.upload(
         video_bytes,
         folder=folder,
         resource_type="video",
         format="mp4",
+        public_id=public_id,
+        overwrite=True,
     )
     return result
@@ -1,6 +1,7 @@
 """
 Backend configuration: Cloudinary, Firebase, and incident settings.
 """
+import json
 import os
 
 # ──────────────────────────────────────────────────────────
@@ -10,11 +11,31 @@ CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "dj9nt7iks")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY", "759295334388447")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET", "")
 
+# ──────────────────────────────────────────────────────────
+# Media storage (screenshots + clips)
+# ──────────────────────────────────────────────────────────
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "cloudinary")     # "cloudinary", "local" or "s3"
+MEDIA_LOCAL_DIR = os.getenv("MEDIA_LOCAL_DIR", os.path.join(os.path.dirname(__file__), "media"))
+MEDIA_PUBLIC_BASE_URL = os.getenv("MEDIA_PUBLIC_BASE_URL", "http://localhost:8000")  # how clients reach this backend
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")           # e.g. MinIO; empty for AWS
+S3_REGION = os.getenv("S3_REGION", "")
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL", "")     # CDN / public bucket URL for stored objects
+
 # ──────────────────────────────────────────────────────────
 # Firebase
 # ──────────────────────────────────────────────────────────
 FIREBASE_PROJECT_ID = "retaillift-ed290"
 FIREBASE_COLLECTION = "IncidentLibrary"
+FIREBASE_TELEMETRY_COLLECTION = os.getenv("FIREBASE_TELEMETRY_COLLECTION", "CameraTelemetry")
+
+# Batched Firestore writer (set FIRESTORE_EMULATOR_HOST to use the emulator)
+FIRESTORE_BATCH_MAX = int(os.getenv("FIRESTORE_BATCH_MAX", "100"))          # documents per commit (<= 500)
+FIRESTORE_FLUSH_INTERVAL_SEC = float(os.getenv("FIRESTORE_FLUSH_INTERVAL_SEC", "0.25"))
+FIRESTORE_WRITE_RETRIES = int(os.getenv("FIRESTORE_WRITE_RETRIES", "5"))
+FIRESTORE_WRITE_TIMEOUT_SEC = float(os.getenv("FIRESTORE_WRITE_TIMEOUT_SEC", "30"))
+# Per-camera telemetry merged into FIREBASE_TELEMETRY_COLLECTION at most this often (0 = off)
+CAMERA_TELEMETRY_INTERVAL_SEC = float(os.getenv("CAMERA_TELEMETRY_INTERVAL_SEC", "30"))
 
 # Path to service account key (optional – if not set, uses Application Default Credentials)
 FIREBASE_SERVICE_ACCOUNT_PATH = os.getenv(
@@ -25,7 +46,159 @@ FIREBASE_SERVICE_ACCOUNT_PATH = os.getenv(
 # ──────────────────────────────────────────────────────────
 # Incident capture settings
 # ──────────────────────────────────────────────────────────
-INCIDENT_VIDEO_DURATION_SEC = 5       # seconds of video to save when shoplifting detected
-INCIDENT_VIDEO_FPS = 10               # fps for the saved clip
-SHOPLIFTING_THRESHOLD = 0.5
+INCIDENT_VIDEO_DURATION_SEC = 5       # seconds of video (by capture time) to save when shoplifting detected
+INCIDENT_VIDEO_FPS = 10               # constant output fps; buffered frames are resampled to it
+SHOPLIFTING_THRESHOLD = float(os.getenv("SHOPLIFTING_THRESHOLD", "0.5"))
 ALERT_COOLDOWN_SEC = 30               # don't re-alert for same person within this window
+# Per-track score smoothing before alerting (see alert_smoothing.py):
+# "none", "ema" or "k_of_n", with enter / exit hysteresis thresholds.
+ALERT_SMOOTHING = os.getenv("ALERT_SMOOTHING", "ema")
+ALERT_EMA_ALPHA = float(os.getenv("ALERT_EMA_ALPHA", "0.4"))
+ALERT_EMA_PRIOR = float(os.getenv("ALERT_EMA_PRIOR", "0.0"))   # a new track's EMA starts here
+ALERT_K_OF_N = tuple(int(v) for v in os.getenv("ALERT_K_OF_N", "3/5").split("/"))
+ALERT_ENTER_THRESHOLD = float(os.getenv("ALERT_ENTER_THRESHOLD", str(SHOPLIFTING_THRESHOLD)))
+ALERT_EXIT_THRESHOLD = float(os.getenv("ALERT_EXIT_THRESHOLD", "0.4"))
+# Per-camera overrides, e.g. '{"aisle-3": {"mode": "k_of_n", "k": 4, "n": 6}}' (checked at startup)
+ALERT_SMOOTHING_OVERRIDES = json.loads(os.getenv("ALERT_SMOOTHING_OVERRIDES", "{}"))
+ALERT_SCORE_LOG = os.getenv("ALERT_SCORE_LOG", "")   # JSONL of raw scores, for replay_alerts.py
+
+# Tracking backend: "iou" (built-in matcher), "bytetrack" (vectorised NumPy
+# ByteTrack-style association) or "ultralytics" (its BYTETracker per camera)
+TRACKER_BACKEND = os.getenv("TRACKER_BACKEND", "iou")
+TRACKER_HIGH_THRESH = float(os.getenv("TRACKER_HIGH_THRESH", "0.5"))           # first-stage detections
+TRACKER_NEW_TRACK_THRESH = float(os.getenv("TRACKER_NEW_TRACK_THRESH", "0.6"))  # score to start a track
+TRACKER_MATCH_IOU = float(os.getenv("TRACKER_MATCH_IOU", "0.2"))
+TRACKER_BUFFER_FRAMES = int(os.getenv("TRACKER_BUFFER_FRAMES", "30"))           # keep lost tracks this long
+
+# Re-identification: a box that loses IoU overlap is matched by appearance to
+# recently lost tracks, which keep their frame buffer and alert state.
+# Off by default: validate on your footage first (benchmark_tracking.py --reid)
+REID_ENABLED = os.getenv("REID_ENABLED", "0") == "1"
+REID_THRESHOLD = float(os.getenv("REID_THRESHOLD", "0.9"))         # cosine similarity to re-associate
+REID_MAX_AGE_SEC = float(os.getenv("REID_MAX_AGE_SEC", "10"))      # how long lost tracks are kept
+REID_GALLERY_SIZE = int(os.getenv("REID_GALLERY_SIZE", "64"))
+REID_EMBED_MOMENTUM = float(os.getenv("REID_EMBED_MOMENTUM", "0.8"))
+# A candidate must lie within this many box heights of where it was last
+# seen, plus REID_GATE_PER_SEC box heights per second since then
+REID_GATE_BASE = float(os.getenv("REID_GATE_BASE", "0.5"))
+REID_GATE_PER_SEC = float(os.getenv("REID_GATE_PER_SEC", "1.0"))
+# Track buffers sample crops onto the ConvLSTM's training time grid by
+# capture time: faster input is dropped, gaps are filled by repeating the
+# last crop for at most TEMPORAL_MAX_HOLD_SEC.
+CONVLSTM_FPS = float(os.getenv("CONVLSTM_FPS", "10"))
+TEMPORAL_MAX_HOLD_SEC = float(os.getenv("TEMPORAL_MAX_HOLD_SEC", "1.0"))
+CAPTURE_TS_MAX_SKEW_SEC = float(os.getenv("CAPTURE_TS_MAX_SKEW_SEC", "10"))  # else use arrival time
+# Alerts on one camera + zone within this window merge into one incident
+# (one upload, one push) listing every subject; zones are an ALERT_ZONE_GRID
+# ("<cols>x<rows>") split of the frame, "1x1" = the whole camera.
+ALERT_COALESCE_WINDOW_SEC = float(os.getenv("ALERT_COALESCE_WINDOW_SEC", "20"))
+ALERT_ZONE_GRID = tuple(int(v) for v in os.getenv("ALERT_ZONE_GRID", "1x1").lower().split("x"))
+INCIDENT_POSTROLL_SEC = float(os.getenv("INCIDENT_POSTROLL_SEC", "5"))    # keep recording after detection
+INCIDENT_MAX_CLIP_SEC = float(os.getenv("INCIDENT_MAX_CLIP_SEC", "30"))   # cap for a shared, extended recording
+INCIDENT_INLINE_THUMB_WIDTH = 160    # inline base-64 thumbnail sent with the first Firestore write
+# Uploaded incident images: a list thumbnail, a crop around the triggering
+# person and the full frame, each stored separately.
+INCIDENT_IMAGE_FORMAT = os.getenv("INCIDENT_IMAGE_FORMAT", "webp")          # "webp" or "jpg"
+INCIDENT_IMAGE_QUALITY = int(os.getenv("INCIDENT_IMAGE_QUALITY", "80"))
+INCIDENT_THUMB_WIDTH = int(os.getenv("INCIDENT_THUMB_WIDTH", "320"))
+INCIDENT_CROP_MAX_SIDE = int(os.getenv("INCIDENT_CROP_MAX_SIDE", "640"))
+INCIDENT_CROP_PADDING = float(os.getenv("INCIDENT_CROP_PADDING", "0.25"))   # fraction of the bbox size
+INCIDENT_WORKERS = int(os.getenv("INCIDENT_WORKERS", "2"))              # encode/upload/notify workers
+INCIDENT_QUEUE_SIZE = int(os.getenv("INCIDENT_QUEUE_SIZE", "16"))
+# When the queue is full: "coalesce" (merge into a queued job for the same
+# camera, else drop the oldest job), "drop_oldest" or "drop_newest"
+INCIDENT_QUEUE_FULL_POLICY = os.getenv("INCIDENT_QUEUE_FULL_POLICY", "coalesce")
+# Alerts waiting for image encoding + outbox write (off the pipeline threads);
+# when full, the alerting pipeline thread handles the incident itself
+INCIDENT_INTAKE_QUEUE_SIZE = int(os.getenv("INCIDENT_INTAKE_QUEUE_SIZE", "32"))
+
+# Durable incident outbox: media + metadata are persisted locally first and
+# delivered (Cloudinary, Firestore, FCM) asynchronously with backoff.
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", os.path.join(os.path.dirname(__file__), "outbox"))
+OUTBOX_RETRY_BASE_SEC = float(os.getenv("OUTBOX_RETRY_BASE_SEC", "2"))
+OUTBOX_RETRY_MAX_SEC = float(os.getenv("OUTBOX_RETRY_MAX_SEC", "600"))
+OUTBOX_DELIVERY_CONCURRENCY = int(os.getenv("OUTBOX_DELIVERY_CONCURRENCY", "4"))   # incidents in flight
+OUTBOX_RETENTION_SEC = float(os.getenv("OUTBOX_RETENTION_SEC", str(7 * 24 * 3600)))  # delivered rows kept
+OUTBOX_MISSING_MEDIA_ATTEMPTS = int(os.getenv("OUTBOX_MISSING_MEDIA_ATTEMPTS", "5"))  # then the row is failed
+# Keep-alive connections per host for the S3 backend only: the Cloudinary SDK
+# has no supported way to size its connection pool and uses its own defaults
+UPLOAD_POOL_SIZE = int(os.getenv("UPLOAD_POOL_SIZE", "8"))
+UPLOAD_CHUNKED_MIN_BYTES = int(os.getenv("UPLOAD_CHUNKED_MIN_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+
+# Continuous segmented recorder (optional): short encoded segments in an
+# on-disk ring per camera; incidents concatenate segments without re-encoding.
+RECORDER_ENABLED = os.getenv("RECORDER_ENABLED", "0") == "1"
+RECORDER_DIR = os.getenv("RECORDER_DIR", os.path.join(os.path.dirname(__file__), "recordings"))
+RECORDER_SEGMENT_SEC = float(os.getenv("RECORDER_SEGMENT_SEC", "2"))
+RECORDER_MAX_BYTES_PER_CAMERA = int(os.getenv("RECORDER_MAX_BYTES_PER_CAMERA", str(512 * 1024 * 1024)))
+
+# Pre-roll buffer: frames are JPEG-encoded in the background and downscaled
+# to the clip resolution, with a hard memory cap per camera.
+INCIDENT_CLIP_MAX_WIDTH = int(os.getenv("INCIDENT_CLIP_MAX_WIDTH", "960"))
+INCIDENT_PREROLL_JPEG_QUALITY = int(os.getenv("INCIDENT_PREROLL_JPEG_QUALITY", "80"))
+INCIDENT_PREROLL_MAX_BYTES = int(os.getenv("INCIDENT_PREROLL_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# ──────────────────────────────────────────────────────────
+# Inference runtime
+# ──────────────────────────────────────────────────────────
+# Batch sizes traced for the Keras ConvLSTM fallback (used when no .tflite exists).
+# Each size gets its own compiled graph, warmed up once at startup.
+KERAS_COMPILED_BATCH_SIZES = tuple(
+    int(b) for b in os.getenv("KERAS_COMPILED_BATCH_SIZES", "1,2,4,8").split(",") if b.strip()
+)
+
+# YOLO person detector
+YOLO_RUNTIME = os.getenv("YOLO_RUNTIME", "onnx")          # "onnx" (exported, CPU-optimised) or "pytorch"
+# Inference size (frames are letterboxed to this). 640 matches training and
+# the pipeline default; 480 is faster but misses small / distant people.
+YOLO_IMGSZ = int(os.getenv("YOLO_IMGSZ", "640"))
+YOLO_CONFIDENCE = float(os.getenv("YOLO_CONFIDENCE", "0.4"))
+YOLO_PERSON_CLASS_NAMES = ("person", "human", "man", "woman", "people")
+
+# Batched detection across cameras
+DETECTOR_BATCHING = os.getenv("DETECTOR_BATCHING", "1") == "1"
+DETECTOR_MAX_BATCH = int(os.getenv("DETECTOR_MAX_BATCH", "8"))
+DETECTOR_MAX_WAIT_MS = float(os.getenv("DETECTOR_MAX_WAIT_MS", "15"))  # max queueing delay per frame
+
+# Pipeline-parallel stage graph (detect -> track -> classify -> alert, one worker each)
+PIPELINE_PARALLEL = os.getenv("PIPELINE_PARALLEL", "1") == "1"
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+# Per-camera state (pipeline threads, tracker, re-ID gallery, load control,
+# pre-roll) is dropped after CAMERA_IDLE_SEC without frames; at most
+# MAX_CAMERAS cameras are served at once, further camera ids get 503.
+MAX_CAMERAS = int(os.getenv("MAX_CAMERAS", "32"))
+CAMERA_IDLE_SEC = float(os.getenv("CAMERA_IDLE_SEC", "600"))
+
+# Client load control (see load_control.py): every /camera_frame response
+# recommends a send rate and frame width per camera; frames beyond the
+# in-flight limits are shed with 429 + Retry-After.
+FRAME_TARGET_LATENCY_MS = float(os.getenv("FRAME_TARGET_LATENCY_MS", "300"))   # server time per frame
+FRAME_MIN_FPS = float(os.getenv("FRAME_MIN_FPS", "1"))
+FRAME_MAX_FPS = float(os.getenv("FRAME_MAX_FPS", "0")) or CONVLSTM_FPS          # faster input is dropped anyway
+FRAME_WIDTHS = tuple(int(w) for w in os.getenv("FRAME_WIDTHS", "640,480,320").split(",") if w.strip())
+FRAME_MAX_INFLIGHT_PER_CAMERA = int(os.getenv("FRAME_MAX_INFLIGHT_PER_CAMERA", "3"))
+FRAME_MAX_INFLIGHT_TOTAL = int(os.getenv("FRAME_MAX_INFLIGHT_TOTAL", "24"))
+FRAME_CONTROL_INTERVAL_SEC = float(os.getenv("FRAME_CONTROL_INTERVAL_SEC", "1"))
+
+# Process-pool inference workers (0 = run models in the API process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_MAX_FRAME_BYTES = int(os.getenv("INFERENCE_MAX_FRAME_BYTES", str(1920 * 1080 * 3)))
+INFERENCE_WORKER_START_TIMEOUT_SEC = float(os.getenv("INFERENCE_WORKER_START_TIMEOUT_SEC", "300"))  # model loading
+INFERENCE_WORKER_WAIT_SEC = float(os.getenv("INFERENCE_WORKER_WAIT_SEC", "30"))   # for an idle worker per call
+INFERENCE_WORKER_MAX_RESTARTS = int(os.getenv("INFERENCE_WORKER_MAX_RESTARTS", "5"))
+
+# CPU thread budget (see thread_budget.py). Unset values are derived from
+# THREAD_BUDGET_CORES (default: all cores, divided across inference workers).
+THREAD_BUDGET_CORES = int(os.getenv("THREAD_BUDGET_CORES", "0")) or os.cpu_count() or 1
+THREADS_TORCH_INTRA = int(os.getenv("THREADS_TORCH_INTRA", "0"))
+THREADS_TORCH_INTER = int(os.getenv("THREADS_TORCH_INTER", "0"))
+THREADS_TF_INTRA = int(os.getenv("THREADS_TF_INTRA", "0"))
+THREADS_TF_INTER = int(os.getenv("THREADS_TF_INTER", "0"))
+THREADS_TFLITE = int(os.getenv("THREADS_TFLITE", "0"))
+THREADS_OPENCV = int(os.getenv("THREADS_OPENCV", "0"))
+
+# Incident clip encoding (PyAV H.264 in memory when available, else OpenCV via memfd/tmpfs)
+CLIP_CODEC_PROFILE = os.getenv("CLIP_CODEC_PROFILE", "main")   # H.264 profile: baseline / main / high
+CLIP_CODEC_CRF = int(os.getenv("CLIP_CODEC_CRF", "28"))
+CLIP_CODEC_PRESET = os.getenv("CLIP_CODEC_PRESET", "veryfast")
@@ -0,0 +1,99 @@
+"""
+YOLO detector loading — exports the PyTorch weights to an ONNX artifact
+(once, cached next to the .pt) and loads it through ultralytics so the
+onnxruntime CPU backend with full graph optimisations is used at inference.
+Inference workers receive the prepared file and never export themselves.
+"""
+import os
+import shutil
+import tempfile
+
+from config import YOLO_RUNTIME, YOLO_IMGSZ, YOLO_PERSON_CLASS_NAMES
+
+
+def _onnx_path_for(pt_path: str, imgsz: int) -> str:
+    stem, _ = os.path.splitext(pt_path)
+    return f"{stem}_{imgsz}.onnx"
+
+
+def export_onnx(pt_path: str, imgsz: int = YOLO_IMGSZ) -> str:
+    """
+    Export `pt_path` to ONNX at `imgsz` and return the artifact path.
+    Re-exports only if the .pt is newer than the cached artifact.
+    The graph is exported with a dynamic batch axis so several camera
+    frames can go through one call. The export runs in a private scratch
+    directory and the artifact is moved into place atomically, so a
+    concurrent reader never sees a half-written file.
+    """
+    from ultralytics import YOLO
+
+    onnx_path = _onnx_path_for(pt_path, imgsz)
+    if os.path.isfile(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(pt_path):
+        return onnx_path
+
+    print(f"[INFO] Exporting YOLO to ONNX (imgsz={imgsz}): {pt_path}")
+    scratch = tempfile.mkdtemp(prefix=".onnx-export-", dir=os.path.dirname(os.path.abspath(pt_path)))
+    try:
+        scratch_pt = os.path.join(scratch, os.path.basename(pt_path))
+        shutil.copy2(pt_path, scratch_pt)
+        exported = YOLO(scratch_pt).export(
+            format="onnx", imgsz=imgsz, dynamic=True, simplify=True, device="cpu"
+        )
+        os.replace(exported, onnx_path)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return onnx_path
+
+
+def prepare_yolo_weights(pt_path: str, runtime: str = YOLO_RUNTIME, imgsz: int = YOLO_IMGSZ) -> str:
+    """
+    Weights file to load: with runtime="onnx" the ONNX export (created once,
+    or the cached one), else, or if the export fails, the .pt itself.
+    """
+    if runtime == "onnx":
+        try:
+            return export_onnx(pt_path, imgsz)
+        except Exception as e:
+            print(f"[WARN] YOLO ONNX export failed ({e}), using PyTorch weights")
+    return pt_path
+
+
+def load_yolo_weights(path: str):
+    """Load a prepared weights file (.onnx or .pt) without exporting anything."""
+    from ultralytics import YOLO
+
+    if path.endswith(".onnx"):
+        model = YOLO(path, task="detect")
+        print(f"[INFO] YOLO ONNX detector loaded from: {path}")
+    else:
+        model = YOLO(path)
+        print(f"[INFO] YOLO model loaded from: {path}")
+    return model
+
+
+def load_yolo_detector(pt_path: str, runtime: str = YOLO_RUNTIME, imgsz: int = YOLO_IMGSZ):
+    """
+    Load the person detector. With runtime="onnx" the weights are exported
+    (or the cached export reused); any export or load failure falls back to
+    PyTorch.
+    """
+    weights = prepare_yolo_weights(pt_path, runtime, imgsz)
+    if weights != pt_path:
+        try:
+            return load_yolo_weights(weights)
+        except Exception as e:
+            print(f"[WARN] YOLO ONNX load failed ({e}), using PyTorch weights")
+    return load_yolo_weights(pt_path)
+
+
+def resolve_person_classes(names: dict, person_names=YOLO_PERSON_CLASS_NAMES) -> list[int] | None:
+    """
+    Map the model's class names to the ids we treat as a person
+    (including custom "shoplift"/"suspect" classes). Returns None when the
+    model has none of them, so callers keep every detection.
+    """
+    ids = [
+        int(idx) for idx, name in names.items()
+        if name.lower() in person_names or "shoplift" in name.lower() or "suspect" in name.lower()
+    ]
+    return ids or None
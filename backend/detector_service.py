@@ -0,0 +1,127 @@
+"""
+Batched detector service — collects the latest frame from each active camera
+within a short window and runs them through YOLO as one batched call.
+
+Each camera's pipeline detects one frame at a time (under its frame lock, or
+on its single detect-stage worker), so a camera never has more than one frame
+pending: the batch always contains the newest frame per camera. A batch is flushed as soon as every recently active camera has
+submitted, when `max_batch` is reached, or after `max_wait_ms` — whichever
+comes first — so queueing delay is bounded.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from config import DETECTOR_MAX_BATCH, DETECTOR_MAX_WAIT_MS
+
+
+class BatchedDetectorService:
+
+    def __init__(
+        self,
+        yolo_model,
+        confidence: float,
+        imgsz: int,
+        classes: list[int] | None = None,
+        max_batch: int = DETECTOR_MAX_BATCH,
+        max_wait_ms: float = DETECTOR_MAX_WAIT_MS,
+        camera_idle_sec: float = 5.0,
+    ):
+        self.yolo_model = yolo_model
+        self.confidence = confidence
+        self.imgsz = imgsz
+        self.classes = classes
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.camera_idle_sec = camera_idle_sec
+
+        self._pending: dict[str, tuple[np.ndarray, Future, float]] = {}
+        self._last_seen: dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stats = {"batches": 0, "frames": 0, "max_queue_ms": 0.0}
+
+        self._worker = threading.Thread(target=self._run, daemon=True, name="yolo-batcher")
+        self._worker.start()
+
+    # ──────────────────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────────────────
+    def detect(self, camera_id: str, frame_bgr: np.ndarray):
+        """Submit a frame and block until its batch has run. Returns an ultralytics Results."""
+        future: Future = Future()
+        with self._cond:
+            now = time.time()
+            self._last_seen[camera_id] = now
+            previous = self._pending.pop(camera_id, None)
+            if previous is not None:
+                # Superseded by a newer frame from the same camera
+                previous[1].set_exception(RuntimeError("frame superseded"))
+            self._pending[camera_id] = (frame_bgr, future, now)
+            self._cond.notify()
+        return future.result()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["avg_batch_size"] = round(
+                stats["frames"] / stats["batches"], 2
+            ) if stats["batches"] else 0.0
+            stats["active_cameras"] = len(self._active_cameras(time.time()))
+            return stats
+
+    # ──────────────────────────────────────────────────────
+    # Batching loop
+    # ──────────────────────────────────────────────────────
+    def _active_cameras(self, now: float) -> list[str]:
+        return [c for c, t in self._last_seen.items() if now - t <= self.camera_idle_sec]
+
+    def _collect_batch(self) -> list[tuple[str, np.ndarray, Future, float]]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            deadline = min(t for _, _, t in self._pending.values()) + self.max_wait
+            while True:
+                now = time.time()
+                active = self._active_cameras(now)
+                if (
+                    len(self._pending) >= self.max_batch
+                    or len(self._pending) >= len(active)
+                    or now >= deadline
+                ):
+                    break
+                self._cond.wait(timeout=deadline - now)
+
+            camera_ids = list(self._pending)[: self.max_batch]
+            return [(cid, *self._pending.pop(cid)) for cid in camera_ids]
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.time()
+            frames = [frame for _, frame, _, _ in batch]
+            try:
+                results = self.yolo_model(
+                    frames,
+                    conf=self.confidence,
+                    imgsz=self.imgsz,
+                    classes=self.classes,
+                    verbose=False,
+                )
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._cond:
+                self._stats["batches"] += 1
+                self._stats["frames"] += len(batch)
+                self._stats["max_queue_ms"] = max(
+                    self._stats["max_queue_ms"],
+                    max((started - t) * 1000.0 for _, _, _, t in batch),
+                )
+
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
@@ -1,11 +1,18 @@
 """
 Firebase service — writes incidents to Firestore and sends FCM push notifications.
-Uses firebase-admin SDK.
+Uses firebase-admin SDK. Firestore writes go through one batched writer.
 """
 import os
 import firebase_admin
 from firebase_admin import credentials, firestore, messaging
-from config import FIREBASE_SERVICE_ACCOUNT_PATH, FIREBASE_COLLECTION, FIREBASE_PROJECT_ID
+from config import (
+    FIREBASE_SERVICE_ACCOUNT_PATH,
+    FIREBASE_COLLECTION,
+    FIREBASE_PROJECT_ID,
+    FIREBASE_TELEMETRY_COLLECTION,
+    FIRESTORE_WRITE_TIMEOUT_SEC,
+)
+from firestore_writer import BatchedFirestoreWriter
 
 
 # ──────────────────────────────────────────────────────────
@@ -18,6 +25,9 @@ def _init_firebase():
     if _app is not None:
         return
 
+    if os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print(f"[INFO] Using Firestore emulator at {os.environ['FIRESTORE_EMULATOR_HOST']}")
+
     if os.path.isfile(FIREBASE_SERVICE_ACCOUNT_PATH):
         cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_PATH)
         _app = firebase_admin.initialize_app(cred, {"projectId": FIREBASE_PROJECT_ID})
@@ -42,6 +52,14 @@ def _get_db():
         return None
 
 
+# All Firestore writes are coalesced into batched commits
+_writer = BatchedFirestoreWriter(_get_db)
+
+
+def get_writer_stats() -> dict:
+    return _writer.get_stats()
+
+
 # ──────────────────────────────────────────────────────────
 # Firestore: save incident
 # ──────────────────────────────────────────────────────────
@@ -62,7 +80,7 @@ def save_incident(incident: dict) -> str | None:
     try:
         doc_id = incident.get("id") or db.collection(FIREBASE_COLLECTION).document().id
         incident["id"] = doc_id
-        db.collection(FIREBASE_COLLECTION).document(doc_id).set(incident)
+        _writer.set(FIREBASE_COLLECTION, doc_id, incident).result(timeout=FIRESTORE_WRITE_TIMEOUT_SEC)
         print(f"[INFO] Incident saved to Firestore: {doc_id}")
         return doc_id
     except Exception as e:
@@ -70,6 +88,33 @@ def save_incident(incident: dict) -> str | None:
         return None
 
 
+def update_incident(doc_id: str, fields: dict) -> str | None:
+    """
+    Patch fields of an existing incident document (e.g. media URLs that
+    became available after the alert went out).
+    Returns the document ID, or None on failure.
+    """
+    if _get_db() is None:
+        print("[WARN] Firestore not available — skipping incident update.")
+        return None
+
+    try:
+        _writer.update(FIREBASE_COLLECTION, doc_id, fields).result(timeout=FIRESTORE_WRITE_TIMEOUT_SEC)
+        print(f"[INFO] Incident updated in Firestore: {doc_id}")
+        return doc_id
+    except Exception as e:
+        print(f"[ERROR] Failed to update incident: {e}")
+        return None
+
+
+def save_camera_telemetry(camera_id: str, fields: dict):
+    """
+    Merge per-camera telemetry into its Firestore document without waiting.
+    Repeated reports for a camera within one flush interval cost one write.
+    """
+    _writer.set(FIREBASE_TELEMETRY_COLLECTION, camera_id, fields, merge=True)
+
+
 # ──────────────────────────────────────────────────────────
 # FCM: send push notification
 # ──────────────────────────────────────────────────────────
@@ -0,0 +1,201 @@
+"""
+Batched Firestore writer — coalesces document writes from many threads into
+batched commits on one background thread.
+
+Writes to the same document that are still queued are merged (a later set
+replaces, an update merges its fields), so a burst of updates costs one
+write. A batch is committed when it reaches `max_batch` documents or when
+the oldest queued write is `flush_interval_sec` old, whichever comes first.
+Contention and transient errors are retried with backoff; a batch that
+fails for any other reason is retried document by document, so one bad
+write does not fail the rest.
+
+Callers get a Future per write and may wait on it. Setting
+FIRESTORE_EMULATOR_HOST points the client (and so this writer) at the
+Firestore emulator.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from config import (
+    FIRESTORE_BATCH_MAX,
+    FIRESTORE_FLUSH_INTERVAL_SEC,
+    FIRESTORE_WRITE_RETRIES,
+)
+
+# Firestore rejects batches larger than this
+_FIRESTORE_BATCH_LIMIT = 500
+
+try:
+    from google.api_core import exceptions as _gexc
+    _RETRYABLE = (
+        _gexc.Aborted,              # contention
+        _gexc.DeadlineExceeded,
+        _gexc.ServiceUnavailable,
+        _gexc.ResourceExhausted,
+        _gexc.InternalServerError,
+    )
+except ImportError:  # google-cloud-firestore not installed
+    _RETRYABLE = ()
+
+
+@dataclass
+class _PendingWrite:
+    collection: str
+    doc_id: str
+    data: dict
+    op: str  # "set", "merge" or "update"
+    queued: float
+    futures: list = field(default_factory=list)
+
+
+class BatchedFirestoreWriter:
+
+    def __init__(
+        self,
+        get_db,
+        max_batch: int = FIRESTORE_BATCH_MAX,
+        flush_interval_sec: float = FIRESTORE_FLUSH_INTERVAL_SEC,
+        max_retries: int = FIRESTORE_WRITE_RETRIES,
+    ):
+        """`get_db()` returns a Firestore client, or None if unavailable."""
+        self._get_db = get_db
+        self.max_batch = max(1, min(max_batch, _FIRESTORE_BATCH_LIMIT))
+        self.flush_interval = flush_interval_sec
+        self.max_retries = max_retries
+
+        self._pending: dict[tuple[str, str], _PendingWrite] = {}
+        self._cond = threading.Condition()
+        self._stats = {"writes": 0, "coalesced": 0, "batches": 0, "retries": 0, "failed": 0}
+        self._last_commit_ms = 0.0
+
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="firestore-writer")
+        self._thread.start()
+
+    # ──────────────────────────────────────────────────────
+    # Enqueue
+    # ──────────────────────────────────────────────────────
+    def set(self, collection: str, doc_id: str, data: dict, merge: bool = False) -> Future:
+        """Queue a document set (`merge=True` keeps fields not in `data`)."""
+        return self._enqueue(collection, doc_id, data, "merge" if merge else "set")
+
+    def update(self, collection: str, doc_id: str, fields: dict) -> Future:
+        """Queue a field update of an existing document."""
+        return self._enqueue(collection, doc_id, fields, "update")
+
+    def _enqueue(self, collection: str, doc_id: str, data: dict, op: str) -> Future:
+        future = Future()
+        key = (collection, doc_id)
+        with self._cond:
+            self._stats["writes"] += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = _PendingWrite(
+                    collection, doc_id, dict(data), op, time.time(), [future]
+                )
+            else:
+                # Coalesce with the write already queued for this document
+                self._stats["coalesced"] += 1
+                if op == "set":
+                    pending.data, pending.op = dict(data), "set"
+                else:
+                    pending.data.update(data)
+                    # set + update/merge stays a full set; update + merge becomes a merge
+                    if pending.op == "update" and op == "merge":
+                        pending.op = "merge"
+                pending.futures.append(future)
+            # Wake the flusher on a full batch, or to start the interval timer
+            if len(self._pending) >= self.max_batch or len(self._pending) == 1:
+                self._cond.notify()
+        return future
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return dict(
+                self._stats,
+                queued=len(self._pending),
+                last_commit_ms=round(self._last_commit_ms, 1),
+            )
+
+    # ──────────────────────────────────────────────────────
+    # Flush
+    # ──────────────────────────────────────────────────────
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._pending) >= self.max_batch:
+                        break
+                    oldest = min((p.queued for p in self._pending.values()), default=None)
+                    if oldest is None:
+                        self._cond.wait()
+                        continue
+                    remaining = oldest + self.flush_interval - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                # Oldest first, up to one batch; the rest waits for the next round
+                keys = sorted(self._pending, key=lambda k: self._pending[k].queued)[: self.max_batch]
+                batch = [self._pending.pop(k) for k in keys]
+
+            self._commit(batch)
+
+    def _commit(self, batch: list[_PendingWrite]):
+        db = self._get_db()
+        if db is None:
+            self._finish(batch, RuntimeError("Firestore not available"))
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                start = time.perf_counter()
+                write_batch = db.batch()
+                for write in batch:
+                    self._add_to_batch(db, write_batch, write)
+                write_batch.commit()
+                with self._cond:
+                    self._stats["batches"] += 1
+                    self._last_commit_ms = (time.perf_counter() - start) * 1000
+                self._finish(batch, None)
+                return
+            except _RETRYABLE as e:
+                if attempt == self.max_retries:
+                    self._finish(batch, e)
+                    return
+                with self._cond:
+                    self._stats["retries"] += 1
+                delay = min(5.0, 0.1 * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                print(f"[WARN] Firestore batch of {len(batch)} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+            except Exception as e:
+                if len(batch) == 1:
+                    print(f"[ERROR] Firestore write failed for {batch[0].doc_id}: {e}")
+                    self._finish(batch, e)
+                    return
+                # Isolate the failing write(s): commit the batch one document at a time
+                print(f"[WARN] Firestore batch of {len(batch)} failed ({e}); retrying per document")
+                for write in batch:
+                    self._commit([write])
+                return
+
+    @staticmethod
+    def _add_to_batch(db, write_batch, write: _PendingWrite):
+        ref = db.collection(write.collection).document(write.doc_id)
+        if write.op == "update":
+            write_batch.update(ref, write.data)
+        else:
+            write_batch.set(ref, write.data, merge=write.op == "merge")
+
+    def _finish(self, batch: list[_PendingWrite], error: Exception | None):
+        if error is not None:
+            with self._cond:
+                self._stats["failed"] += len(batch)
+        for write in batch:
+            for future in write.futures:
+                if error is None:
+                    future.set_result(write.doc_id)
+                else:
+                    future.set_exception(error)
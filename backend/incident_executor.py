@@ -0,0 +1,146 @@
+"""
+Incident executor — a fixed number of worker threads behind a bounded queue
+for finalized incident recordings (clip encoding, before the outbox hands
+them to delivery).
+
+Under a false-positive burst or a slow uplink the queue fills up instead of
+the process spawning unbounded threads. What happens then is set by the
+full policy:
+  coalesce     merge the new recording into a queued one from the same
+               camera (one clip, all incidents); otherwise drop the oldest
+  drop_oldest  drop the oldest queued recording
+  drop_newest  reject the new recording
+A dropped recording is handed to `on_drop`, so its incidents can still be
+delivered without a clip.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import INCIDENT_WORKERS, INCIDENT_QUEUE_SIZE, INCIDENT_QUEUE_FULL_POLICY
+
+
+class StageTimings:
+    """Thread-safe count / mean / max latency per named stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, list] = {}  # stage -> [count, total_sec, max_sec]
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self._stats.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    "count": count,
+                    "avg_ms": round(total * 1000.0 / count, 1) if count else 0.0,
+                    "max_ms": round(peak * 1000.0, 1),
+                }
+                for stage, (count, total, peak) in self._stats.items()
+            }
+
+
+class IncidentExecutor:
+
+    def __init__(
+        self,
+        handler,
+        workers: int = INCIDENT_WORKERS,
+        queue_size: int = INCIDENT_QUEUE_SIZE,
+        full_policy: str = INCIDENT_QUEUE_FULL_POLICY,
+        on_drop=None,
+    ):
+        """
+        `handler(recording)` runs on a worker for every accepted recording;
+        `on_drop(recording)` runs (on the submitting thread) for every
+        recording the full policy drops.
+        """
+        self.handler = handler
+        self.on_drop = on_drop
+        self.queue_size = queue_size
+        self.full_policy = full_policy
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._counters = {
+            "submitted": 0, "coalesced": 0, "dropped": 0, "dropped_incidents": 0,
+            "completed": 0, "in_flight": 0,
+        }
+        self._workers = [
+            threading.Thread(target=self._worker, daemon=True, name=f"incident-worker-{i}")
+            for i in range(workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, recording) -> bool:
+        """Queue a finalized recording. Returns False if it was dropped."""
+        queued = dropped = None
+        with self._cond:
+            self._counters["submitted"] += 1
+            if len(self._queue) >= self.queue_size:
+                if self.full_policy == "coalesce":
+                    queued = next(
+                        (r for r in self._queue if r.camera_id == recording.camera_id), None
+                    )
+                if queued is not None:
+                    _merge_recordings(queued, recording)
+                    self._counters["coalesced"] += 1
+                elif self.full_policy == "drop_newest":
+                    dropped = recording
+                    print(f"[WARN] Incident queue full - dropped recording for {recording.camera_id}")
+                else:
+                    dropped = self._queue.popleft()
+                    print(f"[WARN] Incident queue full - dropped oldest recording for {dropped.camera_id}")
+                if dropped is not None:
+                    self._counters["dropped"] += 1
+                    self._counters["dropped_incidents"] += len(dropped.incidents)
+            if queued is None and dropped is not recording:
+                self._queue.append(recording)
+                self._cond.notify()
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return dropped is not recording
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {"queue_depth": len(self._queue), **self._counters}
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                recording = self._queue.popleft()
+                self._counters["in_flight"] += 1
+            try:
+                self.handler(recording)
+            except Exception as e:
+                print(f"[ERROR] Incident worker failed: {e}")
+            finally:
+                with self._cond:
+                    self._counters["in_flight"] -= 1
+                    self._counters["completed"] += 1
+
+
+def _merge_recordings(target, extra):
+    """Fold `extra` into `target`: union of frames by timestamp, all incidents."""
+    frames = {ts: jpeg for ts, jpeg in target.frames}
+    frames.update({ts: jpeg for ts, jpeg in extra.frames})
+    target.frames = sorted(frames.items())
+    target.incidents.extend(extra.incidents)
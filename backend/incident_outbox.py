@@ -0,0 +1,476 @@
+"""
+Incident outbox — durable local queue (SQLite + media directory) between
+incident capture and delivery.
+
+Every incident is written to disk before anything touches the network:
+its Firestore document and screenshots at detection time, its clip once the
+recording is finalized. Delivery is notify-first: the Firestore document
+(with a small inline thumbnail, `mediaPending: true`) and the FCM push go
+out immediately, then the media uploads, and finally the URLs are patched
+into the document, where the client's Firestore stream picks them up.
+Failures retry with exponential backoff. Every step records its result, so
+a retry (or a restart) resumes where it left off. A row whose media file is
+gone can never succeed: after `missing_media_attempts` tries it is marked
+failed. Delivered rows are purged after `retention_sec`. Uploads use deterministic
+public ids and the Firestore writes use a fixed document id, so repeating a
+step never duplicates evidence.
+
+Several incidents are delivered concurrently, and independent steps within
+one incident (document + push, then the two uploads) run in parallel.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import (
+    OUTBOX_DIR,
+    OUTBOX_RETRY_BASE_SEC,
+    OUTBOX_RETRY_MAX_SEC,
+    OUTBOX_DELIVERY_CONCURRENCY,
+    OUTBOX_RETENTION_SEC,
+    OUTBOX_MISSING_MEDIA_ATTEMPTS,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id            TEXT PRIMARY KEY,
+    created       REAL NOT NULL,
+    state         TEXT NOT NULL,          -- awaiting_clip | pending | delivered | failed
+    doc           TEXT NOT NULL,          -- Firestore document (JSON)
+    image_path    TEXT,                   -- full frame
+    thumb_path    TEXT,                   -- list thumbnail
+    crop_path     TEXT,                   -- crop around the triggering person
+    video_path    TEXT,
+    image_url     TEXT DEFAULT '',
+    thumb_url     TEXT DEFAULT '',
+    crop_url      TEXT DEFAULT '',
+    video_url     TEXT DEFAULT '',
+    doc_saved     INTEGER DEFAULT 0,
+    notified      INTEGER DEFAULT 0,
+    media_patched INTEGER DEFAULT 0,
+    amended       TEXT DEFAULT '{}',      -- fields changed after the first save (JSON)
+    attempts      INTEGER DEFAULT 0,
+    next_attempt  REAL DEFAULT 0,
+    last_error    TEXT DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt);
+"""
+
+# Columns added after the first release: name -> definition
+_MIGRATIONS = {
+    "media_patched": "INTEGER DEFAULT 0",
+    "thumb_path": "TEXT",
+    "crop_path": "TEXT",
+    "thumb_url": "TEXT DEFAULT ''",
+    "crop_url": "TEXT DEFAULT ''",
+    "amended": "TEXT DEFAULT '{}'",
+}
+
+# Image renditions: name -> (path column, url column, public id suffix)
+_RENDITIONS = {
+    "full": ("image_path", "image_url", ""),
+    "thumb": ("thumb_path", "thumb_url", "_thumb"),
+    "crop": ("crop_path", "crop_url", "_crop"),
+}
+
+
+# Rows with work to do: released incidents, plus incidents still waiting for
+# their clip whose document / push have not gone out yet (notify-first).
+_DELIVERABLE = (
+    "(state='pending' OR (state='awaiting_clip' AND (doc_saved=0 OR notified=0)))"
+)
+
+_PURGE_INTERVAL_SEC = 3600
+
+
+class IncidentOutbox:
+
+    def __init__(
+        self,
+        upload_image,
+        upload_video,
+        save_doc,
+        patch_doc,
+        notify,
+        root_dir: str = OUTBOX_DIR,
+        retry_base_sec: float = OUTBOX_RETRY_BASE_SEC,
+        retry_max_sec: float = OUTBOX_RETRY_MAX_SEC,
+        concurrency: int = OUTBOX_DELIVERY_CONCURRENCY,
+        retention_sec: float = OUTBOX_RETENTION_SEC,
+        missing_media_attempts: int = OUTBOX_MISSING_MEDIA_ATTEMPTS,
+        timings=None,
+    ):
+        """
+        Delivery callables:
+          upload_image(bytes, public_id, fmt) -> url
+          upload_video(bytes, public_id) -> url
+          save_doc(doc) -> doc id or None on failure
+          patch_doc(doc_id, fields) -> doc id or None on failure
+          notify(doc) -> message id or None on failure
+        """
+        self.upload_image = upload_image
+        self.upload_video = upload_video
+        self.save_doc = save_doc
+        self.patch_doc = patch_doc
+        self.notify = notify
+        self.retry_base = retry_base_sec
+        self.retry_max = retry_max_sec
+        self.retention = retention_sec
+        self.missing_media_attempts = missing_media_attempts
+        self.timings = timings
+        self._next_purge = 0.0
+
+        self.media_dir = os.path.join(root_dir, "media")
+        os.makedirs(self.media_dir, exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(root_dir, "outbox.sqlite3"), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(outbox)")}
+        for column, definition in _MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE outbox ADD COLUMN {column} {definition}")
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+        # Several incidents deliver at once; inside each, independent steps
+        # (the two uploads, then Firestore + FCM) run concurrently.
+        self.concurrency = concurrency
+        self._in_flight: set[str] = set()
+        self._clip_locks: dict[str, list] = {}  # video path -> [lock, users]
+        self._delivery_pool = ThreadPoolExecutor(concurrency, thread_name_prefix="outbox-delivery")
+        self._step_pool = ThreadPoolExecutor(2 * concurrency, thread_name_prefix="outbox-step")
+
+        # Incidents whose recording never finalized (process died mid post-roll)
+        # are delivered without a clip rather than lost.
+        with self._lock:
+            self._db.execute("UPDATE outbox SET state='pending' WHERE state='awaiting_clip'")
+
+        self._thread = threading.Thread(target=self._deliver_loop, daemon=True, name="incident-outbox")
+        self._thread.start()
+
+    # ──────────────────────────────────────────────────────
+    # Persist (local disk only, never blocks on the network)
+    # ──────────────────────────────────────────────────────
+    def add_incident(self, doc: dict, images: dict[str, bytes], image_format: str = "jpg") -> str:
+        """
+        Persist an incident's document and image renditions ("full", plus
+        optional "thumb" and "crop", encoded as `image_format`).
+        Returns the incident id.
+        """
+        incident_id = doc.get("id") or uuid.uuid4().hex
+        doc["id"] = incident_id
+        paths = {
+            _RENDITIONS[name][0]: self._write_media(f"{incident_id}_{name}.{image_format}", data)
+            for name, data in images.items()
+            if data
+        }
+        columns = ", ".join(paths)
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR IGNORE INTO outbox (id, created, state, doc, {columns}) "
+                f"VALUES (?, ?, ?, ?{', ?' * len(paths)})",
+                (incident_id, time.time(), "awaiting_clip", json.dumps(doc), *paths.values()),
+            )
+        self._wake.set()  # the alert goes out before the clip exists
+        return incident_id
+
+    def attach_clip(self, incident_ids: list[str], clip: bytes | None):
+        """Store the (shared) clip for these incidents and release them for delivery."""
+        video_path = self._write_media(f"clip_{uuid.uuid4().hex}.mp4", clip) if clip else None
+        with self._lock:
+            self._db.executemany(
+                "UPDATE outbox SET state='pending', video_path=?, next_attempt=0 WHERE id=?",
+                [(video_path, incident_id) for incident_id in incident_ids],
+            )
+        self._wake.set()
+
+    def amend_doc(self, incident_id: str, fields: dict) -> bool:
+        """
+        Change fields of a persisted incident. While it waits for its clip
+        they go out with the document if it is not saved yet, and with the
+        media patch otherwise; once released, the saved document is patched
+        directly. Returns False if the incident is unknown.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT doc, amended, state FROM outbox WHERE id=?", (incident_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            doc = dict(json.loads(row["doc"]), **fields)
+            amended = dict(json.loads(row["amended"] or "{}"), **fields)
+            self._db.execute(
+                "UPDATE outbox SET doc=?, amended=? WHERE id=?",
+                (json.dumps(doc), json.dumps(amended), incident_id),
+            )
+        if row["state"] != "awaiting_clip":
+            self._step_pool.submit(self._amend_step, incident_id, fields)
+        return True
+
+    def _write_media(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.media_dir, name)
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+            oldest = self._db.execute(
+                "SELECT MIN(created) FROM outbox WHERE state NOT IN ('delivered', 'failed')"
+            ).fetchone()[0]
+        return {
+            "states": dict(rows),
+            "oldest_undelivered_sec": round(time.time() - oldest, 1) if oldest else 0.0,
+        }
+
+    # ──────────────────────────────────────────────────────
+    # Delivery
+    # ──────────────────────────────────────────────────────
+    def _deliver_loop(self):
+        """Dispatch due incidents to the delivery pool, up to its concurrency."""
+        while True:
+            if time.time() >= self._next_purge:
+                self._purge_delivered()
+            with self._lock:
+                free = self.concurrency - len(self._in_flight)
+                rows = []
+                if free > 0:
+                    placeholders = ",".join("?" * len(self._in_flight)) or "''"
+                    rows = [dict(r) for r in self._db.execute(
+                        f"SELECT * FROM outbox WHERE {_DELIVERABLE} AND next_attempt<=? "
+                        f"AND id NOT IN ({placeholders}) ORDER BY created LIMIT ?",
+                        (time.time(), *self._in_flight, free),
+                    ).fetchall()]
+                for row in rows:
+                    self._in_flight.add(row["id"])
+                next_due = self._db.execute(
+                    f"SELECT MIN(next_attempt) FROM outbox WHERE {_DELIVERABLE}"
+                ).fetchone()[0]
+
+            for row in rows:
+                self._delivery_pool.submit(self._deliver_row, row)
+            if not rows:
+                # Full: wait for a delivery to finish. Idle: wait for the next retry.
+                timeout = None if free <= 0 or next_due is None else max(0.05, next_due - time.time())
+                until_purge = max(0.05, self._next_purge - time.time())
+                timeout = until_purge if timeout is None else min(timeout, until_purge)
+                self._wake.wait(timeout=timeout)
+                self._wake.clear()
+
+    def _deliver_row(self, row: dict):
+        incident_id, attempts = row["id"], row["attempts"]
+        try:
+            self._deliver(row)
+        except FileNotFoundError as e:
+            # Retrying cannot bring the media back; give up after a few tries
+            if attempts + 1 >= self.missing_media_attempts:
+                print(f"[ERROR] Incident {incident_id} marked failed - media missing: {e}")
+                self._update(incident_id, state="failed", attempts=attempts + 1,
+                             last_error=str(e)[:500])
+            else:
+                self._retry_later(incident_id, attempts, e)
+        except Exception as e:
+            self._retry_later(incident_id, attempts, e)
+        finally:
+            with self._lock:
+                self._in_flight.discard(incident_id)
+            self._wake.set()
+
+    def _retry_later(self, incident_id: str, attempts: int, e: Exception):
+        delay = min(self.retry_max, self.retry_base * (2 ** attempts))
+        delay *= random.uniform(0.8, 1.2)
+        print(f"[WARN] Incident {incident_id} delivery failed (attempt {attempts + 1}), "
+              f"retrying in {delay:.0f}s: {e}")
+        self._update(incident_id, attempts=attempts + 1,
+                     next_attempt=time.time() + delay, last_error=str(e)[:500])
+
+    def _purge_delivered(self):
+        """Delete delivered and failed rows older than the retention period."""
+        self._next_purge = time.time() + _PURGE_INTERVAL_SEC
+        cutoff = time.time() - self.retention
+        with self._lock:
+            failed = self._db.execute(
+                "SELECT image_path, thumb_path, crop_path, video_path FROM outbox "
+                "WHERE state='failed' AND created<?",
+                (cutoff,),
+            ).fetchall()
+            purged = self._db.execute(
+                "DELETE FROM outbox WHERE state IN ('delivered', 'failed') AND created<?", (cutoff,)
+            ).rowcount
+        for row in failed:
+            self._cleanup_media(list(row[:3]), row[3])
+        if purged:
+            print(f"[INFO] Outbox purged {purged} rows older than {self.retention / 3600:.0f}h")
+
+    def _deliver(self, row: dict):
+        incident_id = row["id"]
+        doc = json.loads(row["doc"])
+
+        # 1. Notify first: document (inline thumbnail, no URLs yet) + FCM push
+        save_future = notify_future = None
+        if not row["doc_saved"]:
+            save_future = self._step_pool.submit(self._save_step, incident_id, doc)
+        if not row["notified"]:
+            notify_future = self._step_pool.submit(self._notify_step, incident_id, doc)
+        for future in (save_future, notify_future):
+            if future is not None:
+                future.result()
+        if row["state"] == "awaiting_clip":
+            return  # media follows once the recording is finalized
+
+        # 2. Image renditions and clip upload concurrently
+        urls = {}
+        futures = {}
+        for name, (path_col, url_col, _) in _RENDITIONS.items():
+            urls[name] = row[url_col] or ""
+            if not urls[name] and row[path_col]:
+                futures[name] = self._step_pool.submit(
+                    self._upload_image_step, incident_id, name, row[path_col]
+                )
+        video_url = row["video_url"] or ""
+        if not video_url and row["video_path"]:
+            futures["video"] = self._step_pool.submit(
+                self._upload_video_step, incident_id, row["video_path"]
+            )
+        for name, future in futures.items():
+            if name == "video":
+                video_url = future.result()
+            else:
+                urls[name] = future.result()
+
+        # 3. Patch the URLs (and any amended fields) into the document the
+        #    client is already showing
+        media = {
+            **json.loads(row["amended"] or "{}"),
+            "thumbnailUrl": urls["thumb"] or urls["full"],
+            "imageUrl": urls["full"],
+            "cropUrl": urls["crop"],
+            "videoUrl": video_url,
+            "mediaPending": False,
+        }
+        doc.update(media)
+        if not row["media_patched"]:
+            with self._timed("firestore_patch"):
+                if self.patch_doc(incident_id, media) is None:
+                    raise RuntimeError("Firestore media patch failed")
+            self._update(incident_id, media_patched=1)
+
+        self._update(incident_id, state="delivered", doc=json.dumps(doc))
+        self._cleanup_media(
+            [row[path_col] for path_col, _, _ in _RENDITIONS.values()], row["video_path"]
+        )
+        print(f"[INCIDENT] Full incident flow complete. Doc ID: {incident_id}")
+
+    def _upload_image_step(self, incident_id: str, rendition: str, image_path: str) -> str:
+        _, url_col, suffix = _RENDITIONS[rendition]
+        fmt = os.path.splitext(image_path)[1][1:]
+        with self._timed("upload_image"):
+            image_url = self.upload_image(_read(image_path), f"incident_{incident_id}{suffix}", fmt)
+        self._update(incident_id, **{url_col: image_url})
+        print(f"[INCIDENT] Screenshot ({rendition}) uploaded: {image_url}")
+        return image_url
+
+    def _upload_video_step(self, incident_id: str, video_path: str) -> str:
+        # Incidents sharing a clip upload it once
+        with self._clip_lock(video_path):
+            video_url = self._shared_video_url(video_path)
+            if not video_url:
+                clip_id = os.path.splitext(os.path.basename(video_path))[0]
+                with self._timed("upload_video"):
+                    video_url = self.upload_video(_read(video_path), clip_id)
+                print(f"[INCIDENT] Video uploaded: {video_url}")
+            self._update(incident_id, video_url=video_url)
+        return video_url
+
+    def _save_step(self, incident_id: str, doc: dict):
+        with self._timed("firestore"):
+            if self.save_doc(dict(doc)) is None:
+                raise RuntimeError("Firestore save failed")
+        self._update(incident_id, doc_saved=1)
+
+    def _amend_step(self, incident_id: str, fields: dict):
+        with self._timed("firestore_patch"):
+            if self.patch_doc(incident_id, fields) is None:
+                print(f"[WARN] Could not amend incident {incident_id} in Firestore")
+
+    def _notify_step(self, incident_id: str, doc: dict):
+        with self._timed("fcm"):
+            if self.notify(doc) is None:
+                raise RuntimeError("FCM send failed")
+        self._update(incident_id, notified=1)
+
+    @contextmanager
+    def _clip_lock(self, video_path: str):
+        """Per-clip lock, dropped once no upload of that clip is in progress."""
+        with self._lock:
+            entry = self._clip_locks.setdefault(video_path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._clip_locks[video_path]
+
+    def _shared_video_url(self, video_path: str) -> str:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT video_url FROM outbox WHERE video_path=? AND video_url != '' LIMIT 1",
+                (video_path,),
+            ).fetchone()
+        return row[0] if row else ""
+
+    def _cleanup_media(self, image_paths: list[str | None], video_path: str | None):
+        """Delete delivered media; a shared clip goes once no undelivered incident needs it."""
+        for image_path in image_paths:
+            if image_path:
+                _remove(image_path)
+        if video_path:
+            with self._lock:
+                still_needed = self._db.execute(
+                    "SELECT 1 FROM outbox WHERE video_path=? AND state != 'delivered' LIMIT 1",
+                    (video_path,),
+                ).fetchone()
+            if not still_needed:
+                _remove(video_path)
+
+    def _update(self, incident_id: str, **fields):
+        assignments = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE outbox SET {assignments} WHERE id=?", (*fields.values(), incident_id)
+            )
+
+    def _timed(self, stage: str):
+        if self.timings is None:
+            from contextlib import nullcontext
+            return nullcontext()
+        return self.timings.timed(stage)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
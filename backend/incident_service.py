@@ -1,45 +1,212 @@
 """
 Incident service — orchestrates screenshot capture, video clip capture,
-Cloudinary upload, Firestore save, and FCM push notification.
+media upload, Firestore save, and FCM push notification.
+
+A detection opens a per-camera recording made of the pre-roll (frames
+already buffered) plus a post-roll (frames that keep arriving for
+INCIDENT_POSTROLL_SEC). When the post-roll ends, the recording is finalized
+in the background: the clip is encoded once and shared by every incident
+that joined the recording while it was open. Screenshots, clips and
+documents go through the durable outbox, which handles delivery.
 """
+import base64
 import cv2
+import queue
 import time
 import threading
+import uuid
 import numpy as np
-from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from io import BytesIO
 
-from cloudinary_service import upload_image_bytes, upload_video_bytes
-from firebase_service import save_incident, send_shoplifting_notification
-from config import INCIDENT_VIDEO_DURATION_SEC, INCIDENT_VIDEO_FPS
+from firebase_service import (
+    save_incident,
+    update_incident,
+    send_shoplifting_notification,
+    get_writer_stats,
+)
+from config import (
+    INCIDENT_VIDEO_DURATION_SEC,
+    INCIDENT_VIDEO_FPS,
+    INCIDENT_POSTROLL_SEC,
+    INCIDENT_MAX_CLIP_SEC,
+    RECORDER_ENABLED,
+    INCIDENT_INLINE_THUMB_WIDTH,
+    INCIDENT_IMAGE_FORMAT,
+    INCIDENT_IMAGE_QUALITY,
+    INCIDENT_THUMB_WIDTH,
+    INCIDENT_CROP_MAX_SIDE,
+    INCIDENT_CROP_PADDING,
+    INCIDENT_INTAKE_QUEUE_SIZE,
+    ALERT_COALESCE_WINDOW_SEC,
+    ALERT_ZONE_GRID,
+)
+from clip_encoder import encode_mp4
+from incident_executor import IncidentExecutor, StageTimings
+from incident_outbox import IncidentOutbox
+from media_storage import MediaStorage, create_media_storage
+from preroll_buffer import PrerollBuffer, resample_indices, decode_jpeg, insert_in_order
+from segment_recorder import SegmentRecorder
+
+
+@dataclass
+class ZoneAlert:
+    """The incident that later alerts in the same camera zone merge into."""
+    incident_id: str
+    opened: float
+    subjects: list  # one entry per person that triggered the alert
+    persisted: bool = False  # the incident row exists in the outbox
+
+
+@dataclass
+class Recording:
+    """An open pre-roll + post-roll recording for one camera."""
+    camera_id: str
+    started: float  # server time the recording was opened
+    ends_at: float  # server time the post-roll ends
+    frames: list  # (capture timestamp, jpeg), pre-roll then post-roll
+    incidents: list = field(default_factory=list)  # outbox incident ids
 
 
 class IncidentCaptureService:
     """
     Maintains a rolling frame buffer so that when shoplifting is detected
-    we can save a screenshot and a short video clip (last N seconds).
+    we can save a screenshot and a short video clip (last N seconds, plus
+    a post-roll after the detection).
     """
 
     def __init__(
         self,
         video_duration_sec: int = INCIDENT_VIDEO_DURATION_SEC,
         video_fps: int = INCIDENT_VIDEO_FPS,
+        postroll_sec: float = INCIDENT_POSTROLL_SEC,
+        max_clip_sec: float = INCIDENT_MAX_CLIP_SEC,
+        use_recorder: bool = RECORDER_ENABLED,
+        storage: MediaStorage | None = None,
+        coalesce_window_sec: float = ALERT_COALESCE_WINDOW_SEC,
+        zone_grid: tuple[int, int] = ALERT_ZONE_GRID,
     ):
         self.video_duration = video_duration_sec
         self.video_fps = video_fps
-        self._max_frames = video_duration_sec * video_fps
-        # Rolling buffer of raw BGR frames (for video clip)
-        self._frame_buffer: deque = deque(maxlen=self._max_frames)
-        self._lock = threading.Lock()
+        self.postroll = postroll_sec
+        self.max_clip = max_clip_sec
+        self.coalesce_window = coalesce_window_sec
+        self.zone_grid = zone_grid
+        # Uploaded images use WebP where this OpenCV build can write it
+        self.image_format = INCIDENT_IMAGE_FORMAT
+        if self.image_format != "jpg" and not cv2.haveImageWriter(f".{self.image_format}"):
+            print(f"[WARN] OpenCV cannot write {self.image_format}; incident images fall back to JPEG")
+            self.image_format = "jpg"
+        # Rolling buffer of timestamped JPEG frames per camera, trimmed to
+        # the clip duration (for video clip)
+        self._preroll = PrerollBuffer(
+            max_duration_sec=video_duration_sec, on_frame=self._on_encoded_frame
+        )
+        # Optional continuous on-disk recorder; clips are then cut from its segments
+        self.recorder = SegmentRecorder(fps=video_fps) if use_recorder else None
+
+        # Bounded worker pool for clip encoding, with per-stage timings
+        self.timings = StageTimings()
+        self._executor = IncidentExecutor(self._recording_flow, on_drop=self._release_without_clip)
+
+        # Where screenshots and clips end up (Cloudinary, local disk or S3)
+        self.storage = storage if storage is not None else create_media_storage()
+
+        # Durable outbox: everything is on disk before delivery is attempted
+        self.outbox = IncidentOutbox(
+            upload_image=self.storage.put_image,
+            upload_video=self.storage.put_video,
+            save_doc=save_incident,
+            patch_doc=update_incident,
+            notify=_notify,
+            timings=self.timings,
+        )
+
+        # Open recordings by camera, finalized by a single scheduler thread
+        self._recordings: dict[str, Recording] = {}
+        # Latest incident per (camera, zone), kept for `coalesce_window`
+        self._zone_alerts: dict[tuple[str, str], ZoneAlert] = {}
+        self._cond = threading.Condition()
+        self._finalizer = threading.Thread(
+            target=self._finalize_loop, daemon=True, name="incident-finalizer"
+        )
+        self._finalizer.start()
+
+        # Alerts reported by pipelines, handled on one intake thread
+        self._intake: queue.Queue = queue.Queue(maxsize=INCIDENT_INTAKE_QUEUE_SIZE)
+        self._intake_inline = 0
+        self._intake_thread = threading.Thread(
+            target=self._intake_loop, daemon=True, name="incident-intake"
+        )
+        self._intake_thread.start()
 
     # ──────────────────────────────────────────────────────
     # Feed frames into the rolling buffer
     # ──────────────────────────────────────────────────────
-    def push_frame(self, frame_bgr: np.ndarray):
-        """Call this every time a camera frame is received."""
-        with self._lock:
-            self._frame_buffer.append(frame_bgr.copy())
+    def push_frame(
+        self,
+        frame_bgr: np.ndarray,
+        camera_id: str = "default",
+        timestamp: float | None = None,
+    ):
+        """
+        Call this every time a camera frame is received, with its capture
+        time (defaults to now). Encoding happens in the background; the
+        frame must not be modified after this call.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self._preroll.push(camera_id, frame_bgr, timestamp)
+        if self.recorder is not None:
+            self.recorder.push(camera_id, frame_bgr, timestamp)
+
+    def forget_camera(self, camera_id: str):
+        """
+        Free an idle camera's pre-roll, unless a recording is still open for
+        it, and finalize its open recorder segment.
+        """
+        with self._cond:
+            if camera_id not in self._recordings:
+                self._preroll.discard(camera_id)
+            for key in [k for k in self._zone_alerts if k[0] == camera_id]:
+                del self._zone_alerts[key]
+        if self.recorder is not None:
+            self.recorder.forget(camera_id)
+
+    def _on_encoded_frame(self, camera_id: str, timestamp: float, jpeg: bytes):
+        """Append freshly encoded frames to the camera's open recording (post-roll)."""
+        with self._cond:
+            recording = self._recordings.get(camera_id)
+            if recording is not None:
+                insert_in_order(recording.frames, timestamp, jpeg)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            open_recordings = {
+                cid: {
+                    "incidents": len(r.incidents),
+                    "subjects": sum(
+                        len(a.subjects) for a in self._zone_alerts.values()
+                        if a.incident_id in r.incidents
+                    ),
+                    "frames": len(r.frames),
+                }
+                for cid, r in self._recordings.items()
+            }
+            zone_alerts = len(self._zone_alerts)
+        stats = {
+            "preroll": self._preroll.get_stats(),
+            "open_recordings": open_recordings,
+            "zone_alerts": zone_alerts,
+            "intake": {"queued": self._intake.qsize(), "handled_inline": self._intake_inline},
+            "executor": self._executor.get_stats(),
+            "outbox": self.outbox.get_stats(),
+            "firestore_writer": get_writer_stats(),
+            "stage_timings": self.timings.snapshot(),
+        }
+        if self.recorder is not None:
+            stats["recorder"] = self.recorder.get_stats()
+        return stats
 
     # ──────────────────────────────────────────────────────
     # Capture screenshot as JPEG bytes
@@ -51,134 +218,311 @@ class IncidentCaptureService:
             raise RuntimeError("Failed to encode screenshot")
         return buf.tobytes()
 
-    # ──────────────────────────────────────────────────────
-    # Capture last N seconds of video as MP4 bytes
-    # ──────────────────────────────────────────────────────
-    def capture_video_clip(self) -> bytes | None:
+    def capture_images(self, frame_bgr: np.ndarray, bbox=None) -> dict[str, bytes]:
         """
-        Encode the rolling frame buffer as an MP4 video clip.
-        Returns bytes or None if buffer is empty.
+        Encode the incident image renditions, each uploaded separately:
+        "full" frame, a small list "thumb", and (given the triggering
+        person's bbox) a "crop" around them.
         """
-        with self._lock:
-            frames = list(self._frame_buffer)
+        h, w = frame_bgr.shape[:2]
+        images = {
+            "full": self._encode_image(frame_bgr),
+            "thumb": self._encode_image(_fit(frame_bgr, INCIDENT_THUMB_WIDTH / w)),
+        }
+        if bbox is not None:
+            x1, y1, x2, y2 = (int(v) for v in bbox)
+            pad_x = int((x2 - x1) * INCIDENT_CROP_PADDING)
+            pad_y = int((y2 - y1) * INCIDENT_CROP_PADDING)
+            x1, y1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+            x2, y2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+            if x2 > x1 and y2 > y1:
+                crop = frame_bgr[y1:y2, x1:x2]
+                images["crop"] = self._encode_image(
+                    _fit(crop, INCIDENT_CROP_MAX_SIDE / max(crop.shape[:2]))
+                )
+        return images
 
-        if not frames:
-            return None
+    def _encode_image(self, frame_bgr: np.ndarray) -> bytes:
+        if self.image_format == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, INCIDENT_IMAGE_QUALITY]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, INCIDENT_IMAGE_QUALITY]
+        ok, buf = cv2.imencode(f".{self.image_format}", frame_bgr, params)
+        if not ok:
+            raise RuntimeError("Failed to encode incident image")
+        return buf.tobytes()
 
-        h, w = frames[0].shape[:2]
+    def capture_inline_thumbnail(
+        self, frame_bgr: np.ndarray, width: int = INCIDENT_INLINE_THUMB_WIDTH, quality: int = 60
+    ) -> str:
+        """Tiny base-64 JPEG stored inline in the incident document (a few KB)."""
+        h, w = frame_bgr.shape[:2]
+        small = cv2.resize(frame_bgr, (width, max(1, int(h * width / w))), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return base64.b64encode(buf).decode("ascii") if ok else ""
 
-        # Write to a temporary in-memory buffer via OpenCV
-        import tempfile, os
-        tmp_path = tempfile.mktemp(suffix=".mp4")
+    # ──────────────────────────────────────────────────────
+    # Capture video as MP4 bytes
+    # ──────────────────────────────────────────────────────
+    def capture_video_clip(self, camera_id: str = "default") -> bytes | None:
+        """
+        Encode the camera's rolling frame buffer (last N seconds) as an MP4
+        clip. Returns bytes or None if buffer is empty.
+        """
+        return self.encode_clip(self._preroll.snapshot(camera_id))
 
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        writer = cv2.VideoWriter(tmp_path, fourcc, self.video_fps, (w, h))
+    def encode_clip(self, buffered: list[tuple[float, bytes]]) -> bytes | None:
+        """
+        Encode (timestamp, jpeg) frames as an MP4 video clip at a constant
+        `video_fps`, resampled from the frames' capture timestamps so the
+        clip plays back in real time.
+        Returns bytes or None if there are no frames.
+        """
+        if not buffered:
+            return None
 
-        for frame in frames:
-            # Resize if needed (all frames should be same size but just in case)
-            if frame.shape[:2] != (h, w):
-                frame = cv2.resize(frame, (w, h))
-            writer.write(frame)
+        indices = resample_indices([ts for ts, _ in buffered], self.video_fps)
+        decoded: dict[int, np.ndarray] = {}  # each source frame decoded once
+        for i in set(indices):
+            decoded[i] = decode_jpeg(buffered[i][1])
+        frames = [decoded[i] for i in indices]
 
-        writer.release()
+        return encode_mp4(frames, self.video_fps)
 
+    # ──────────────────────────────────────────────────────
+    # Alerts from pipelines (returns immediately)
+    # ──────────────────────────────────────────────────────
+    def report_incident(self, **incident):
+        """Queue `handle_incident(**incident)` for the intake thread."""
         try:
-            with open(tmp_path, "rb") as f:
-                video_bytes = f.read()
-            return video_bytes
-        finally:
+            self._intake.put_nowait(incident)
+        except queue.Full:
+            # Never lose an alert: back-pressure the caller instead
+            self._intake_inline += 1
+            print(f"[WARN] Incident intake queue full - handling alert inline "
+                  f"({incident.get('camera_id')})")
+            self.handle_incident(**incident)
+
+    def _intake_loop(self):
+        while True:
+            incident = self._intake.get()
             try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
+                self.handle_incident(**incident)
+            except Exception as e:
+                print(f"[ERROR] Incident capture failed: {e}")
+                import traceback
+                traceback.print_exc()
 
     # ──────────────────────────────────────────────────────
-    # Full incident flow (runs in background thread)
+    # Incident entry point (never blocks on the network)
     # ──────────────────────────────────────────────────────
     def handle_incident(
         self,
         frame_bgr: np.ndarray,
         prediction: dict,
+        person_id: int | None = None,
+        camera_id: str = "default",
         camera_name: str = "Live Camera",
         user_id: str = "system",
     ):
         """
         Called when shoplifting is detected.
-        Runs the full flow in a background thread:
-          1. Capture screenshot
-          2. Capture video clip (last 5 sec)
-          3. Upload both to Cloudinary
-          4. Save incident to Firestore
-          5. Send FCM push notification
+          1. If an incident was opened less than `coalesce_window` ago in
+             the same camera zone, add this person to its subjects (in the
+             outbox row, or the saved document once it was released) and
+             stop: no new upload or push
+          2. Otherwise reserve the zone for a new incident, encode the
+             screenshot renditions (full, thumbnail, person crop) and
+             persist them with the incident document in the local outbox
+             (survives restarts)
+          3. Open (or join) the camera's recording; once its post-roll
+             ends, encode the pre-roll + post-roll clip once per recording
+             and attach it in the outbox
+        The outbox saves to Firestore and sends the FCM push notification
+        right away, then uploads to media storage and patches the media URLs
+        (and merged subjects) into the document, retrying failures in the
+        background.
         """
-        thread = threading.Thread(
-            target=self._incident_flow,
-            args=(frame_bgr, prediction, camera_name, user_id),
-            daemon=True,
-        )
-        thread.start()
+        confidence = prediction.get("confidence", 0.0)
+        bbox = prediction.get("bbox")
+        zone = self._zone_of(bbox, frame_bgr.shape)
+        subject = {
+            "personId": person_id,
+            "confidence": round(confidence, 4),
+            "bbox": [int(v) for v in bbox] if bbox is not None else None,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
 
-    def _incident_flow(
-        self,
-        frame_bgr: np.ndarray,
-        prediction: dict,
-        camera_name: str,
-        user_id: str,
-    ):
+        key = (camera_id, zone)
+        now = time.time()
+        with self._cond:
+            self._expire_zone_alerts(now)
+            alert = self._zone_alerts.get(key)
+            if alert is not None:
+                alert.subjects.append(subject)
+                # Before the row exists, the reserving call amends it instead
+                if alert.persisted:
+                    self.outbox.amend_doc(alert.incident_id, _subject_fields(alert.subjects))
+                recording = self._recordings.get(camera_id)
+                if recording is not None:
+                    self._extend_postroll(recording, now)
+                print(f"[INCIDENT] Alert merged into incident {alert.incident_id} "
+                      f"({camera_name}, zone {zone}, {len(alert.subjects)} subjects)")
+                return
+            alert = ZoneAlert(uuid.uuid4().hex, now, [subject])
+            self._zone_alerts[key] = alert
+
+        incident_doc = {
+            "id": alert.incident_id,
+            "cameraId": camera_id,
+            "cameraName": camera_name,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "thumbnailUrl": "",
+            "imageUrl": "",
+            "cropUrl": "",
+            "videoUrl": "",
+            # Shown by the client until the uploaded media URLs are patched in
+            "thumbnailInline": self.capture_inline_thumbnail(frame_bgr),
+            "mediaPending": True,
+            "userId": user_id,
+            "prediction": prediction.get("label", "shoplifting"),
+            "zone": zone,
+            "isReviewed": False,
+            **_subject_fields([subject]),
+        }
         try:
-            timestamp = datetime.now(timezone.utc)
-            ts_str = timestamp.isoformat()
-            confidence = prediction.get("confidence", 0.0)
-
-            # 1. Screenshot → Cloudinary
-            print("[INCIDENT] Capturing screenshot...")
-            screenshot_bytes = self.capture_screenshot(frame_bgr)
-            img_result = upload_image_bytes(screenshot_bytes)
-            image_url = img_result.get("secure_url", "")
-            print(f"[INCIDENT] Screenshot uploaded: {image_url}")
-
-            # 2. Video clip → Cloudinary
-            video_url = ""
-            print("[INCIDENT] Capturing video clip...")
-            video_bytes = self.capture_video_clip()
-            if video_bytes:
-                vid_result = upload_video_bytes(video_bytes)
-                video_url = vid_result.get("secure_url", "")
-                print(f"[INCIDENT] Video uploaded: {video_url}")
+            images = self.capture_images(frame_bgr, bbox)
+            incident_id = self.outbox.add_incident(incident_doc, images, self.image_format)
+        except Exception:
+            with self._cond:
+                if self._zone_alerts.get(key) is alert:
+                    del self._zone_alerts[key]
+            raise
+        print(f"[INCIDENT] Incident {incident_id} persisted to outbox ({camera_name})")
+
+        now = time.time()
+        with self._cond:
+            alert.persisted = True
+            if len(alert.subjects) > 1:
+                self.outbox.amend_doc(incident_id, _subject_fields(alert.subjects))
+            recording = self._recordings.get(camera_id)
+            if recording is None:
+                recording = Recording(
+                    camera_id=camera_id,
+                    started=now,
+                    ends_at=now + self.postroll,
+                    frames=self._preroll.snapshot(camera_id),
+                )
+                self._recordings[camera_id] = recording
             else:
-                print("[INCIDENT] No frames in buffer for video clip.")
+                self._extend_postroll(recording, now)
+            recording.incidents.append(incident_id)
+            self._cond.notify()
 
-            # 3. Save to Firestore
-            incident_doc = {
-                "cameraName": camera_name,
-                "timestamp": ts_str,
-                "thumbnailUrl": image_url,
-                "imageUrl": image_url,
-                "videoUrl": video_url,
-                "userId": user_id,
-                "prediction": prediction.get("label", "shoplifting"),
-                "confidence": round(confidence, 4),
-                "isReviewed": False,
-            }
-            doc_id = save_incident(incident_doc)
-
-            # 4. FCM push notification
-            send_shoplifting_notification(
-                title="🚨 Shoplifting Detected",
-                body=f"Camera: {camera_name} | Confidence: {confidence*100:.1f}%",
-                data={
-                    "incidentId": doc_id or "",
-                    "cameraName": camera_name,
-                    "imageUrl": image_url,
-                    "videoUrl": video_url,
-                    "confidence": str(round(confidence, 4)),
-                    "timestamp": ts_str,
-                },
-            )
-
-            print(f"[INCIDENT] Full incident flow complete. Doc ID: {doc_id}")
+    def _expire_zone_alerts(self, now: float):
+        """Forget zone alerts older than the coalesce window (caller holds _cond)."""
+        for key in [k for k, a in self._zone_alerts.items() if now - a.opened > self.coalesce_window]:
+            del self._zone_alerts[key]
+
+    def _extend_postroll(self, recording: Recording, now: float):
+        """Share the open recording; extend its post-roll up to the cap."""
+        recording.ends_at = min(
+            max(recording.ends_at, now + self.postroll),
+            recording.started + self.max_clip - self.video_duration,
+        )
+        self._cond.notify()
+
+    def _zone_of(self, bbox, frame_shape) -> str:
+        """Grid cell ("col,row") of the bbox centre."""
+        cols, rows = self.zone_grid
+        if bbox is None:
+            return "0,0"
+        h, w = frame_shape[:2]
+        cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+        col = min(cols - 1, max(0, int(cx * cols / w)))
+        row = min(rows - 1, max(0, int(cy * rows / h)))
+        return f"{col},{row}"
 
+    def _finalize_loop(self):
+        """Close recordings whose post-roll has ended and hand them off."""
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    due = [r for r in self._recordings.values() if r.ends_at <= now]
+                    if due:
+                        for r in due:
+                            del self._recordings[r.camera_id]
+                        break
+                    next_end = min((r.ends_at for r in self._recordings.values()), default=None)
+                    self._cond.wait(timeout=None if next_end is None else next_end - now)
+
+            for recording in due:
+                self._executor.submit(recording)
+
+    def _recording_flow(self, recording: Recording):
+        """Encode the shared clip once and release its incidents for delivery."""
+        video_bytes = None
+        try:
+            print(f"[INCIDENT] Encoding clip for {recording.camera_id} "
+                  f"({len(recording.frames)} frames, {len(recording.incidents)} incidents)...")
+            with self.timings.timed("encode"):
+                if self.recorder is not None and recording.frames:
+                    # Stream-copy the on-disk segments covering the recording
+                    video_bytes = self.recorder.assemble_clip(
+                        recording.camera_id, recording.frames[0][0], recording.frames[-1][0]
+                    )
+                if video_bytes is None:
+                    video_bytes = self.encode_clip(recording.frames)
+            if not video_bytes:
+                print("[INCIDENT] No frames in buffer for video clip.")
         except Exception as e:
-            print(f"[ERROR] Incident flow failed: {e}")
+            print(f"[ERROR] Incident clip failed: {e}")
             import traceback
             traceback.print_exc()
+
+        # Always release the incidents, with or without a clip
+        self.outbox.attach_clip(recording.incidents, video_bytes)
+
+    def _release_without_clip(self, recording: Recording):
+        """A recording the executor dropped: deliver its incidents without a clip."""
+        self.outbox.attach_clip(recording.incidents, None)
+
+
+def _fit(image: np.ndarray, scale: float) -> np.ndarray:
+    """Downscale by `scale` (never upscale)."""
+    if scale >= 1.0:
+        return image
+    h, w = image.shape[:2]
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _subject_fields(subjects: list) -> dict:
+    """Incident document fields derived from its subjects."""
+    return {
+        "subjects": list(subjects),
+        "subjectCount": len(subjects),
+        "confidence": max(s["confidence"] for s in subjects),
+    }
+
+
+# ──────────────────────────────────────────────────────────
+# Outbox notification step (FCM)
+# ──────────────────────────────────────────────────────────
+def _notify(incident_doc: dict) -> str | None:
+    camera_name = incident_doc["cameraName"]
+    confidence = incident_doc["confidence"]
+    return send_shoplifting_notification(
+        title="🚨 Shoplifting Detected",
+        body=f"Camera: {camera_name} | Confidence: {confidence*100:.1f}%",
+        data={
+            "incidentId": incident_doc["id"],
+            "cameraId": incident_doc["cameraId"],
+            "cameraName": camera_name,
+            "imageUrl": incident_doc["imageUrl"],
+            "videoUrl": incident_doc["videoUrl"],
+            "confidence": str(confidence),
+            "timestamp": incident_doc["timestamp"],
+        },
+    )
@@ -0,0 +1,253 @@
+"""
+Inference pool — a fixed set of worker processes (see inference_worker.py)
+that run detection and classification off the API process.
+
+Each worker owns two shared-memory slots, one for a decoded frame and one for
+a ConvLSTM sequence. A caller checks out an idle worker, copies its array
+into the slot, and sends a tiny control message; the worker replies with
+boxes / raw predictions over a multiprocessing connection. Nothing large is
+ever pickled.
+
+Workers connect back to a listener once their models are loaded. Startup
+fails (instead of hanging) when a worker exits while loading or does not
+connect within `start_timeout_sec`. A worker whose connection dies is
+restarted, up to `max_restarts` times, and never handed out again meanwhile.
+"""
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection, Listener
+
+import numpy as np
+
+from config import (
+    INFERENCE_MAX_FRAME_BYTES,
+    INFERENCE_WORKER_START_TIMEOUT_SEC,
+    INFERENCE_WORKER_WAIT_SEC,
+    INFERENCE_WORKER_MAX_RESTARTS,
+)
+
+
+@dataclass
+class _Worker:
+    worker_id: int
+    process: subprocess.Popen
+    frame_shm: shared_memory.SharedMemory
+    seq_shm: shared_memory.SharedMemory
+    conn: Connection | None = None
+    restarts: int = 0
+
+
+class InferencePool:
+
+    def __init__(
+        self,
+        num_workers: int,
+        yolo_path: str | None,
+        tflite_path: str | None,
+        h5_path: str | None,
+        sequence_length: int = 30,
+        image_height: int = 96,
+        image_width: int = 96,
+        max_frame_bytes: int = INFERENCE_MAX_FRAME_BYTES,
+        start_timeout_sec: float = INFERENCE_WORKER_START_TIMEOUT_SEC,
+        wait_sec: float = INFERENCE_WORKER_WAIT_SEC,
+        max_restarts: int = INFERENCE_WORKER_MAX_RESTARTS,
+    ):
+        self.max_frame_bytes = max_frame_bytes
+        self.max_seq_bytes = sequence_length * image_height * image_width * 3 * 4
+        self.wait_sec = wait_sec
+        self.max_restarts = max_restarts
+        self._idle: queue.Queue = queue.Queue()
+        self._workers: list[_Worker] = []
+        self._lock = threading.Lock()  # guards restarts
+
+        authkey = secrets.token_bytes(16)
+        self._listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = self._listener.address
+        self._env = dict(os.environ, INFERENCE_POOL_AUTHKEY=authkey.hex())
+        self._script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_worker.py")
+        self._args = [
+            "--address", f"{host}:{port}",
+            "--yolo-path", yolo_path or "",
+            "--tflite-path", tflite_path or "",
+            "--h5-path", h5_path or "",
+            "--sequence-length", str(sequence_length),
+            "--image-height", str(image_height),
+            "--image-width", str(image_width),
+        ]
+
+        for worker_id in range(num_workers):
+            frame_shm = shared_memory.SharedMemory(create=True, size=self.max_frame_bytes)
+            seq_shm = shared_memory.SharedMemory(create=True, size=self.max_seq_bytes)
+            process = self._spawn(worker_id, frame_shm, seq_shm)
+            self._workers.append(_Worker(worker_id, process, frame_shm, seq_shm))
+
+        # Workers (and restarted workers) connect back once their models are loaded
+        self._acceptor = threading.Thread(target=self._accept_loop, daemon=True, name="inference-accept")
+        self._acceptor.start()
+        try:
+            self._wait_ready(start_timeout_sec)
+        except RuntimeError:
+            self.close()
+            raise
+        print(f"[INFO] Inference pool ready: {num_workers} worker processes")
+
+    # ──────────────────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────────────────
+    def detect(self, frame_bgr: np.ndarray) -> tuple[np.ndarray, list[tuple]]:
+        """Run YOLO in a worker. Returns (annotated frame, [(x1, y1, x2, y2, conf), ...])."""
+        if frame_bgr.nbytes > self.max_frame_bytes:
+            raise ValueError(
+                f"Frame of {frame_bgr.nbytes} bytes exceeds INFERENCE_MAX_FRAME_BYTES={self.max_frame_bytes}"
+            )
+        frame_bgr = np.ascontiguousarray(frame_bgr, dtype=np.uint8)
+        worker = self._checkout()
+        healthy = True
+        try:
+            slot = np.ndarray(frame_bgr.shape, dtype=np.uint8, buffer=worker.frame_shm.buf)
+            slot[...] = frame_bgr
+            boxes = self._call(worker, ("detect", frame_bgr.shape))
+            return slot.copy(), boxes
+        except (EOFError, OSError):
+            healthy = False
+            raise
+        finally:
+            self._checkin(worker, healthy)
+
+    def predict_raw(self, sequence: np.ndarray) -> np.ndarray:
+        """Run the ConvLSTM in a worker on a (1, seq_len, H, W, 3) sequence."""
+        sequence = np.ascontiguousarray(sequence, dtype=np.float32)
+        if sequence.nbytes > self.max_seq_bytes:
+            raise ValueError(f"Sequence of {sequence.nbytes} bytes exceeds the worker slot")
+        worker = self._checkout()
+        healthy = True
+        try:
+            slot = np.ndarray(sequence.shape, dtype=np.float32, buffer=worker.seq_shm.buf)
+            slot[...] = sequence
+            return np.asarray(self._call(worker, ("classify", sequence.shape)), dtype=np.float32)
+        except (EOFError, OSError):
+            healthy = False
+            raise
+        finally:
+            self._checkin(worker, healthy)
+
+    def close(self):
+        self._listener.close()
+        for worker in self._workers:
+            try:
+                if worker.conn is not None:
+                    worker.conn.send(("stop",))
+                    worker.conn.close()
+                worker.process.wait(timeout=10)
+            except Exception:
+                worker.process.kill()
+            worker.frame_shm.close()
+            worker.frame_shm.unlink()
+            worker.seq_shm.close()
+            worker.seq_shm.unlink()
+
+    # ──────────────────────────────────────────────────────
+    # Worker lifecycle
+    # ──────────────────────────────────────────────────────
+    def _spawn(self, worker_id: int, frame_shm, seq_shm) -> subprocess.Popen:
+        cmd = [
+            sys.executable, self._script,
+            "--worker-id", str(worker_id),
+            "--frame-shm", frame_shm.name,
+            "--seq-shm", seq_shm.name,
+            *self._args,
+        ]
+        return subprocess.Popen(cmd, env=self._env, cwd=os.path.dirname(self._script))
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception as e:
+                print(f"[WARN] Rejected inference worker connection: {e}")
+                continue
+            try:
+                _, worker_id = conn.recv()
+            except (EOFError, OSError):
+                conn.close()
+                continue
+            worker = self._workers[worker_id]
+            worker.conn = conn
+            self._idle.put(worker)
+
+    def _wait_ready(self, timeout_sec: float):
+        deadline = time.monotonic() + timeout_sec
+        while self._idle.qsize() < len(self._workers):
+            for worker in self._workers:
+                code = worker.process.poll()
+                if code is not None:
+                    raise RuntimeError(
+                        f"Inference worker {worker.worker_id} exited with code {code} while loading models"
+                    )
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Inference workers did not start within {timeout_sec:.0f}s")
+            time.sleep(0.2)
+
+    def _checkout(self) -> _Worker:
+        """Take an idle worker, restarting crashed ones while waiting."""
+        deadline = time.monotonic() + self.wait_sec
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                self._restart_exited()
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"No inference worker available within {self.wait_sec:.0f}s")
+
+    def _checkin(self, worker: _Worker, healthy: bool):
+        if healthy:
+            self._idle.put(worker)
+        else:
+            with self._lock:
+                self._restart(worker)
+
+    def _restart_exited(self):
+        """Restart workers that died while out of the idle queue (e.g. while reloading)."""
+        with self._lock:
+            for worker in self._workers:
+                if worker.conn is None and worker.process.poll() is not None:
+                    self._restart(worker)
+
+    def _restart(self, worker: _Worker):
+        """Replace a dead worker's process (lock held); it rejoins once it connects."""
+        if worker.conn is not None:
+            try:
+                worker.conn.close()
+            except OSError:
+                pass
+            worker.conn = None
+        if worker.process.poll() is None:
+            worker.process.kill()
+            worker.process.wait()
+        if worker.restarts >= self.max_restarts:
+            if worker.restarts == self.max_restarts:
+                print(f"[ERROR] Inference worker {worker.worker_id} keeps dying - removed from the pool")
+                worker.restarts += 1
+            return
+        worker.restarts += 1
+        print(f"[WARN] Inference worker {worker.worker_id} died - restarting "
+              f"({worker.restarts}/{self.max_restarts})")
+        worker.process = self._spawn(worker.worker_id, worker.frame_shm, worker.seq_shm)
+
+    @staticmethod
+    def _call(worker: _Worker, msg: tuple):
+        worker.conn.send(msg)
+        status, payload = worker.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {worker.worker_id} failed: {payload}")
+        return payload
@@ -0,0 +1,111 @@
+"""
+Inference worker process — runs YOLO detection and ConvLSTM classification
+outside the API process, so model pre/postprocessing does not compete with
+FastAPI for the GIL.
+
+Started by InferencePool as `python inference_worker.py ...`. Frames and
+sequences arrive through two shared-memory slots owned by the parent; only
+small control messages and results travel over the connection.
+"""
+import argparse
+import os
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client
+
+import numpy as np
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # The parent owns (and unlinks) the segment; don't let this process's
+    # resource tracker destroy it on exit.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--worker-id", type=int, required=True)
+    parser.add_argument("--frame-shm", required=True)
+    parser.add_argument("--seq-shm", required=True)
+    parser.add_argument("--yolo-path", default="")
+    parser.add_argument("--tflite-path", default="")
+    parser.add_argument("--h5-path", default="")
+    parser.add_argument("--sequence-length", type=int, default=30)
+    parser.add_argument("--image-height", type=int, default=96)
+    parser.add_argument("--image-width", type=int, default=96)
+    args = parser.parse_args()
+
+    from config import INFERENCE_WORKERS, YOLO_CONFIDENCE, YOLO_IMGSZ
+    from thread_budget import resolve_thread_budget, apply_thread_budget
+
+    # This worker's share of the cores, applied before any model is loaded
+    budget = resolve_thread_budget(workers=INFERENCE_WORKERS)
+    apply_thread_budget(budget)
+
+    from convlstm_runtime import load_convlstm_predictor
+    from detector import load_yolo_weights, resolve_person_classes
+
+    # The parent already exported the model; just load the file it prepared
+    yolo_model = load_yolo_weights(args.yolo_path) if args.yolo_path else None
+    person_classes = resolve_person_classes(yolo_model.names) if yolo_model is not None else None
+    predict_raw = load_convlstm_predictor(
+        args.tflite_path or None,
+        args.h5_path or None,
+        args.sequence_length,
+        args.image_height,
+        args.image_width,
+        tflite_threads=budget.tflite,
+    )
+
+    frame_shm = _attach(args.frame_shm)
+    seq_shm = _attach(args.seq_shm)
+
+    host, port = args.address.rsplit(":", 1)
+    authkey = bytes.fromhex(os.environ["INFERENCE_POOL_AUTHKEY"])
+    conn = Client((host, int(port)), authkey=authkey)
+    conn.send(("ready", args.worker_id))
+
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            op = msg[0]
+            try:
+                if op == "detect":
+                    shape = msg[1]
+                    frame = np.ndarray(shape, dtype=np.uint8, buffer=frame_shm.buf)
+                    if yolo_model is None:
+                        h, w = shape[:2]
+                        conn.send(("ok", [(0, 0, w, h, 1.0)]))
+                        continue
+                    result = yolo_model(
+                        frame, conf=YOLO_CONFIDENCE, imgsz=YOLO_IMGSZ,
+                        classes=person_classes, verbose=False,
+                    )[0]
+                    # Annotated frame goes back through the same slot
+                    frame[...] = result.plot()
+                    xyxy = result.boxes.xyxy.cpu().numpy().astype(int).tolist()
+                    confs = result.boxes.conf.cpu().numpy().tolist()
+                    conn.send(("ok", [(*b, c) for b, c in zip(xyxy, confs)]))
+                elif op == "classify":
+                    shape = msg[1]
+                    sequence = np.ndarray(shape, dtype=np.float32, buffer=seq_shm.buf)
+                    conn.send(("ok", np.asarray(predict_raw(sequence)).tolist()))
+                elif op == "stop":
+                    break
+                else:
+                    conn.send(("error", f"unknown op {op!r}"))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+    finally:
+        conn.close()
+        frame_shm.close()
+        seq_shm.close()
+
+
+if __name__ == "__main__":
+    main()
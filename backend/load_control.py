@@ -0,0 +1,165 @@
+"""
+Load control for /camera_frame — per-camera send-rate and resolution
+recommendations, and load shedding with Retry-After.
+
+Each camera has a recommended max fps and max frame width, adjusted at most
+once per `interval_sec` from the server-side latency of its recent frames
+(AIMD): over the target latency, or after a shed frame, the width steps down
+first (YOLO letterboxes to its own size and the crops are 96x96, so pixels
+are the cheaper thing to give up), then the rate is cut by 30%; well under
+the target the rate grows by 1 fps, then the width steps back up.
+
+A frame is shed when its camera already has `max_inflight_per_camera`
+frames in the pipeline or the server has `max_inflight_total`.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from config import (
+    FRAME_TARGET_LATENCY_MS,
+    FRAME_MIN_FPS,
+    FRAME_MAX_FPS,
+    FRAME_WIDTHS,
+    FRAME_MAX_INFLIGHT_PER_CAMERA,
+    FRAME_MAX_INFLIGHT_TOTAL,
+    FRAME_CONTROL_INTERVAL_SEC,
+)
+
+
+@dataclass
+class _CameraLoad:
+    max_fps: float
+    width_index: int = 0  # into the widths, largest first
+    in_flight: int = 0
+    latency_ms: float | None = None  # EMA of server time per frame
+    shed_since_adjust: int = 0
+    last_adjust: float = 0.0
+    admitted: int = 0
+    shed: int = 0
+
+
+class LoadController:
+
+    def __init__(
+        self,
+        target_latency_ms: float = FRAME_TARGET_LATENCY_MS,
+        min_fps: float = FRAME_MIN_FPS,
+        max_fps: float = FRAME_MAX_FPS,
+        widths: tuple[int, ...] = FRAME_WIDTHS,
+        max_inflight_per_camera: int = FRAME_MAX_INFLIGHT_PER_CAMERA,
+        max_inflight_total: int = FRAME_MAX_INFLIGHT_TOTAL,
+        interval_sec: float = FRAME_CONTROL_INTERVAL_SEC,
+    ):
+        self.target_ms = target_latency_ms
+        self.min_fps = min_fps
+        self.max_fps = max(min_fps, max_fps)
+        self.widths = tuple(sorted(widths, reverse=True)) or (0,)
+        self.max_inflight_per_camera = max_inflight_per_camera
+        self.max_inflight_total = max_inflight_total
+        self.interval = interval_sec
+
+        self._cameras: dict[str, _CameraLoad] = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    # ──────────────────────────────────────────────────────
+    # Public API
+    # ──────────────────────────────────────────────────────
+    def try_admit(self, camera_id: str) -> float | None:
+        """
+        Reserve a pipeline slot for one of the camera's frames. Returns None
+        when admitted (call `release` when done), else the seconds the client
+        should wait before sending again.
+        """
+        with self._lock:
+            cam = self._camera(camera_id)
+            if (
+                cam.in_flight < self.max_inflight_per_camera
+                and self._in_flight < self.max_inflight_total
+            ):
+                cam.in_flight += 1
+                cam.admitted += 1
+                self._in_flight += 1
+                return None
+
+            cam.shed += 1
+            cam.shed_since_adjust += 1
+            self._adjust(cam, time.time())
+            # Roughly when a slot frees up, and no sooner than the new send interval
+            return max(1.0 / cam.max_fps, (cam.latency_ms or self.target_ms) / 1000.0)
+
+    def release(self, camera_id: str, latency_sec: float | None):
+        """A frame admitted by `try_admit` finished (`latency_sec` None if it failed)."""
+        with self._lock:
+            cam = self._camera(camera_id)
+            cam.in_flight = max(0, cam.in_flight - 1)
+            self._in_flight = max(0, self._in_flight - 1)
+            if latency_sec is not None:
+                ms = latency_sec * 1000.0
+                cam.latency_ms = ms if cam.latency_ms is None else 0.8 * cam.latency_ms + 0.2 * ms
+            self._adjust(cam, time.time())
+
+    def recommendation(self, camera_id: str) -> dict:
+        """Send rate and frame width the camera's client should use."""
+        with self._lock:
+            cam = self._camera(camera_id)
+            return {
+                "max_fps": round(cam.max_fps, 2),
+                "max_width": self.widths[cam.width_index],
+                "server_latency_ms": round(cam.latency_ms, 1) if cam.latency_ms is not None else None,
+            }
+
+    def forget(self, camera_id: str):
+        """Drop an idle camera's state."""
+        with self._lock:
+            cam = self._cameras.get(camera_id)
+            if cam is not None and cam.in_flight == 0:
+                del self._cameras[camera_id]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "target_latency_ms": self.target_ms,
+                "cameras": {
+                    camera_id: {
+                        "max_fps": round(cam.max_fps, 2),
+                        "max_width": self.widths[cam.width_index],
+                        "latency_ms": round(cam.latency_ms, 1) if cam.latency_ms is not None else None,
+                        "in_flight": cam.in_flight,
+                        "admitted": cam.admitted,
+                        "shed": cam.shed,
+                    }
+                    for camera_id, cam in self._cameras.items()
+                },
+            }
+
+    # ──────────────────────────────────────────────────────
+    # Internals (lock held)
+    # ──────────────────────────────────────────────────────
+    def _camera(self, camera_id: str) -> _CameraLoad:
+        cam = self._cameras.get(camera_id)
+        if cam is None:
+            cam = self._cameras[camera_id] = _CameraLoad(max_fps=self.max_fps)
+        return cam
+
+    def _adjust(self, cam: _CameraLoad, now: float):
+        if now - cam.last_adjust < self.interval:
+            return
+        cam.last_adjust = now
+        overloaded = cam.shed_since_adjust > 0 or (
+            cam.latency_ms is not None and cam.latency_ms > self.target_ms
+        )
+        cam.shed_since_adjust = 0
+
+        if overloaded:
+            if cam.width_index < len(self.widths) - 1:
+                cam.width_index += 1
+            else:
+                cam.max_fps = max(self.min_fps, cam.max_fps * 0.7)
+        elif cam.latency_ms is not None and cam.latency_ms < 0.7 * self.target_ms:
+            if cam.max_fps < self.max_fps:
+                cam.max_fps = min(self.max_fps, cam.max_fps + 1.0)
+            elif cam.width_index > 0:
+                cam.width_index -= 1
@@ -1,6 +1,6 @@
 
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -11,9 +11,13 @@ import tempfile
 import os
 import cv2
 import json
+import math
 import base64
 import asyncio
+import threading
+import time
 from collections import deque
+from datetime import datetime, timezone
 
 # ──────────────────────────────────────────────────────────
 # App
@@ -25,6 +29,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 if os.path.isdir("dataset"):
@@ -38,6 +43,17 @@ IMAGE_HEIGHT = 96
 IMAGE_WIDTH = 96
 LABELS = ["normal", "shoplifting"]
 
+# ──────────────────────────────────────────────────────────
+# CPU thread budget (before TF / torch run their first op)
+# ──────────────────────────────────────────────────────────
+from config import INFERENCE_WORKERS
+from thread_budget import resolve_api_thread_budget, apply_thread_budget
+
+# In process-pool mode the models run in the workers, which split the cores
+# between them; this process then only decodes, crops and encodes frames
+thread_budget = resolve_api_thread_budget(INFERENCE_WORKERS)
+apply_thread_budget(thread_budget)
+
 # ──────────────────────────────────────────────────────────
 # Load ConvLSTM model (TFLite with Flex delegate, fallback to .h5)
 # ──────────────────────────────────────────────────────────
@@ -63,7 +79,9 @@ _use_tflite = False
 
 if _tflite_path:
     try:
-        convlstm_interpreter = tf.lite.Interpreter(model_path=_tflite_path)
+        convlstm_interpreter = tf.lite.Interpreter(
+            model_path=_tflite_path, num_threads=thread_budget.tflite
+        )
         convlstm_interpreter.allocate_tensors()
         _use_tflite = True
         print(f"[INFO] ConvLSTM TFLite model loaded from: {_tflite_path}")
@@ -83,12 +101,29 @@ elif not _use_tflite:
         "ConvLSTM model not found. Place model_grocery.tflite or model_grocery.h5 in backend/models/"
     )
 
+
+# ──────────────────────────────────────────────────────────
+# Compiled Keras inference (avoids model.predict per-call overhead)
+# ──────────────────────────────────────────────────────────
+from convlstm_runtime import build_keras_infer_fns, run_keras_compiled, format_prediction
+
+_keras_infer_fns = {}
+if convlstm_model is not None:
+    _keras_infer_fns = build_keras_infer_fns(
+        convlstm_model, SEQUENCE_LENGTH, IMAGE_HEIGHT, IMAGE_WIDTH
+    )
+    print(f"[INFO] Keras ConvLSTM compiled + warmed up for batch sizes: {sorted(_keras_infer_fns)}")
+
 # ──────────────────────────────────────────────────────────
 # Load YOLO model
 # ──────────────────────────────────────────────────────────
+from config import YOLO_RUNTIME, YOLO_IMGSZ, YOLO_CONFIDENCE
+
 yolo_model = None
+_yolo_path = None
+_yolo_weights = None  # the file actually loaded (ONNX export or .pt), handed to workers
 try:
-    from ultralytics import YOLO
+    from detector import prepare_yolo_weights, load_yolo_weights
 
     _yolo_candidates = [
         "models/best.pt",
@@ -98,69 +133,205 @@ try:
     ]
     _yolo_path = next((p for p in _yolo_candidates if os.path.isfile(p)), None)
     if _yolo_path:
-        yolo_model = YOLO(_yolo_path)
-        print(f"[INFO] YOLO model loaded from: {_yolo_path}")
+        # Exported once here, before any inference worker is spawned
+        _yolo_weights = prepare_yolo_weights(_yolo_path, runtime=YOLO_RUNTIME, imgsz=YOLO_IMGSZ)
+        try:
+            yolo_model = load_yolo_weights(_yolo_weights)
+        except Exception as e:
+            if _yolo_weights == _yolo_path:
+                raise
+            print(f"[WARN] YOLO ONNX load failed ({e}), using PyTorch weights")
+            _yolo_weights = _yolo_path
+            yolo_model = load_yolo_weights(_yolo_path)
     else:
         print("[WARN] YOLO .pt not found - person detection disabled.")
 except ImportError:
     print("[WARN] ultralytics not installed - YOLO detection disabled.")
 
 
+# ──────────────────────────────────────────────────────────
+# Optional process-pool inference (detection + classification in workers)
+# ──────────────────────────────────────────────────────────
+from inference_pool import InferencePool
+
+inference_pool = None
+if INFERENCE_WORKERS > 0:
+    inference_pool = InferencePool(
+        INFERENCE_WORKERS,
+        yolo_path=_yolo_weights if yolo_model is not None else None,
+        tflite_path=_tflite_path if _use_tflite else None,
+        h5_path=_h5_path,
+        sequence_length=SEQUENCE_LENGTH,
+        image_height=IMAGE_HEIGHT,
+        image_width=IMAGE_WIDTH,
+    )
+
+    @app.on_event("shutdown")
+    def _close_inference_pool():
+        inference_pool.close()
+
+
 # ──────────────────────────────────────────────────────────
 # ConvLSTM prediction helper
 # ──────────────────────────────────────────────────────────
+_interpreter_lock = threading.Lock()
+
+
 def predict_convlstm(sequence: np.ndarray) -> dict:
     """Run ConvLSTM prediction on a (1, 30, 96, 96, 3) float32 sequence."""
-    if _use_tflite:
-        inp_det = convlstm_interpreter.get_input_details()
-        out_det = convlstm_interpreter.get_output_details()
-        convlstm_interpreter.set_tensor(inp_det[0]["index"], sequence)
-        convlstm_interpreter.invoke()
-        preds = convlstm_interpreter.get_tensor(out_det[0]["index"])
+    if inference_pool is not None:
+        preds = inference_pool.predict_raw(sequence)
+    elif _use_tflite:
+        # The interpreter is shared by every camera's pipeline and is not thread-safe
+        with _interpreter_lock:
+            inp_det = convlstm_interpreter.get_input_details()
+            out_det = convlstm_interpreter.get_output_details()
+            convlstm_interpreter.set_tensor(inp_det[0]["index"], sequence)
+            convlstm_interpreter.invoke()
+            preds = convlstm_interpreter.get_tensor(out_det[0]["index"])
     else:
-        preds = convlstm_model.predict(sequence, verbose=0)
-
-    probs = preds[0].tolist()
-    if len(probs) == 1:
-        p = float(probs[0])
-        probs = [round(1.0 - p, 6), round(p, 6)]
+        preds = run_keras_compiled(_keras_infer_fns, convlstm_model, sequence)
 
-    max_idx = int(np.argmax(probs))
-    return {
-        "label": LABELS[max_idx],
-        "confidence": round(float(probs[max_idx]), 4),
-        "probabilities": [round(p, 6) for p in probs],
-    }
+    return format_prediction(preds, LABELS)
 
 
 # ──────────────────────────────────────────────────────────
-# Initialize Detection Pipeline
+# Initialize Incident Capture Service
 # ──────────────────────────────────────────────────────────
-from pipeline import ShopliftingPipeline
+from incident_service import IncidentCaptureService
+from media_storage import LocalMediaStorage, parse_byte_range
+
+incident_capture = IncidentCaptureService()
+print(f"[INFO] Incident capture service ready: Screenshot + Video -> "
+      f"{incident_capture.storage.name} -> Firestore -> FCM")
 
-pipeline = ShopliftingPipeline(
-    yolo_model=yolo_model,
-    convlstm_predict_fn=predict_convlstm,
-    sequence_length=SEQUENCE_LENGTH,
-    image_height=IMAGE_HEIGHT,
-    image_width=IMAGE_WIDTH,
-    yolo_confidence=0.4,
-    shoplifting_threshold=0.5,
-    person_timeout=5.0,
-    labels=LABELS,
-)
 
-print("[INFO] Pipeline initialized: Camera -> YOLO -> Crop -> Buffer -> ConvLSTM -> Firebase Alert")
+# ──────────────────────────────────────────────────────────
+# Shared batched detector (one YOLO call for all cameras)
+# ──────────────────────────────────────────────────────────
+from config import DETECTOR_BATCHING
+from detector import resolve_person_classes
+from detector_service import BatchedDetectorService
+
+detector_service = None
+if yolo_model is not None and DETECTOR_BATCHING and inference_pool is None:
+    detector_service = BatchedDetectorService(
+        yolo_model,
+        confidence=YOLO_CONFIDENCE,
+        imgsz=YOLO_IMGSZ,
+        classes=resolve_person_classes(yolo_model.names),
+    )
+    print("[INFO] Batched detector service started")
 
 
 # ──────────────────────────────────────────────────────────
-# Initialize Incident Capture Service
+# Per-camera Detection Pipelines
 # ──────────────────────────────────────────────────────────
-from incident_service import IncidentCaptureService
+from config import (
+    PIPELINE_PARALLEL,
+    PIPELINE_QUEUE_SIZE,
+    ALERT_SCORE_LOG,
+    REID_ENABLED,
+    TRACKER_BACKEND,
+    CONVLSTM_FPS,
+    TEMPORAL_MAX_HOLD_SEC,
+    CAPTURE_TS_MAX_SKEW_SEC,
+    MAX_CAMERAS,
+    CAMERA_IDLE_SEC,
+    CAMERA_TELEMETRY_INTERVAL_SEC,
+    SHOPLIFTING_THRESHOLD,
+)
+from alert_smoothing import ScoreLog, smoothing_config_for, validate_smoothing_overrides
+from load_control import LoadController
+from pipeline import ShopliftingPipeline
+from reid import ReIdGallery
+from tracker import validate_tracker_backend
+from firebase_service import save_camera_telemetry
+
+DEFAULT_CAMERA_ID = "default"
+
+pipelines: dict[str, ShopliftingPipeline] = {}
+_pipeline_last_used: dict[str, float] = {}
+_pipelines_lock = threading.Lock()
+validate_smoothing_overrides()
+validate_tracker_backend(TRACKER_BACKEND)
+score_log = ScoreLog(ALERT_SCORE_LOG) if ALERT_SCORE_LOG else None
+load_control = LoadController()
+_telemetry_sent: dict[str, float] = {}
+
+
+def _create_pipeline(camera_id: str) -> ShopliftingPipeline:
+    pipeline = ShopliftingPipeline(
+        yolo_model=yolo_model,
+        convlstm_predict_fn=predict_convlstm,
+        sequence_length=SEQUENCE_LENGTH,
+        image_height=IMAGE_HEIGHT,
+        image_width=IMAGE_WIDTH,
+        yolo_confidence=YOLO_CONFIDENCE,
+        yolo_imgsz=YOLO_IMGSZ,
+        shoplifting_threshold=SHOPLIFTING_THRESHOLD,
+        person_timeout=5.0,
+        labels=LABELS,
+        camera_id=camera_id,
+        camera_name="Live Camera" if camera_id == DEFAULT_CAMERA_ID else camera_id,
+        parallel=PIPELINE_PARALLEL,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        smoothing=smoothing_config_for(camera_id),
+        score_log=score_log,
+        reid_gallery=ReIdGallery() if REID_ENABLED else None,
+        tracker_backend=TRACKER_BACKEND,
+        model_fps=CONVLSTM_FPS,
+        max_hold_sec=TEMPORAL_MAX_HOLD_SEC,
+    )
+    pipeline.set_incident_service(incident_capture)
+    if inference_pool is not None:
+        pipeline.set_inference_pool(inference_pool)
+    elif detector_service is not None:
+        pipeline.set_detector_service(detector_service)
+    print(f"[INFO] Pipeline initialized for camera '{camera_id}': "
+          "Camera -> YOLO -> Crop -> Buffer -> ConvLSTM -> Firebase Alert")
+    return pipeline
+
+
+def _pop_idle_pipelines(now: float, keep: str) -> list[tuple[str, ShopliftingPipeline]]:
+    """Remove cameras idle for CAMERA_IDLE_SEC (never the default one). Lock held."""
+    idle = [
+        cid for cid, used in _pipeline_last_used.items()
+        if cid not in (DEFAULT_CAMERA_ID, keep) and now - used > CAMERA_IDLE_SEC
+    ]
+    for cid in idle:
+        del _pipeline_last_used[cid]
+    return [(cid, pipelines.pop(cid)) for cid in idle]
 
-incident_capture = IncidentCaptureService()
-pipeline.set_incident_service(incident_capture)
-print("[INFO] Incident capture service connected: Screenshot + Video -> Cloudinary -> Firestore -> FCM")
+
+def get_pipeline(camera_id: str = DEFAULT_CAMERA_ID) -> ShopliftingPipeline:
+    """
+    Return the pipeline for `camera_id`, creating it on first use. Cameras
+    idle for CAMERA_IDLE_SEC are evicted; beyond MAX_CAMERAS, new camera
+    ids are refused with 503.
+    """
+    now = time.time()
+    with _pipelines_lock:
+        evicted = _pop_idle_pipelines(now, keep=camera_id)
+        pipeline = pipelines.get(camera_id)
+        if pipeline is None and len(pipelines) < MAX_CAMERAS:
+            pipeline = pipelines[camera_id] = _create_pipeline(camera_id)
+        if pipeline is not None:
+            _pipeline_last_used[camera_id] = now
+
+    # Stopping stage workers joins threads, so it happens outside the lock
+    for cid, idle_pipeline in evicted:
+        idle_pipeline.close()
+        load_control.forget(cid)
+        incident_capture.forget_camera(cid)
+        _telemetry_sent.pop(cid, None)
+        print(f"[INFO] Camera '{cid}' idle for {CAMERA_IDLE_SEC:.0f}s - pipeline closed")
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail=f"Camera limit reached ({MAX_CAMERAS})")
+    return pipeline
+
+
+get_pipeline(DEFAULT_CAMERA_ID)
 
 
 # ──────────────────────────────────────────────────────────
@@ -189,9 +360,16 @@ def health():
 
 
 @app.get("/pipeline/status")
-def pipeline_status():
+def pipeline_status(camera_id: str = DEFAULT_CAMERA_ID):
     """Return current pipeline state: tracked persons, buffer counts, etc."""
-    return pipeline.get_status()
+    status = get_pipeline(camera_id).get_status()
+    status["cameras"] = list(pipelines)
+    status["input_fps"] = {cid: p.input_fps() for cid, p in list(pipelines.items())}
+    status["incident_capture"] = incident_capture.get_stats()
+    status["load_control"] = load_control.get_stats()
+    if detector_service is not None:
+        status["detector"] = detector_service.get_stats()
+    return status
 
 
 @app.get("/images")
@@ -208,24 +386,129 @@ def serve_image(name: str):
     return FileResponse(f"dataset/{name}")
 
 
+@app.get("/media/{kind}/{filename}")
+def serve_media(kind: str, filename: str, request: Request):
+    """Serve locally stored incident media (MEDIA_STORAGE=local), with range requests for video seeking."""
+    storage = incident_capture.storage
+    if not isinstance(storage, LocalMediaStorage):
+        raise HTTPException(status_code=404, detail="Media is not stored locally")
+    resolved = storage.resolve(kind, filename)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    path, media_type = resolved
+
+    size = os.path.getsize(path)
+    headers = {"Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_byte_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    def read_range(chunk_size: int = 256 * 1024):
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(read_range(), status_code=206, media_type=media_type, headers=headers)
+
+
 @app.post("/camera_frame")
-async def camera_frame(file: UploadFile = File(...)):
+async def camera_frame(
+    file: UploadFile = File(...),
+    camera_id: str = DEFAULT_CAMERA_ID,
+    capture_ts: float | None = None,
+):
     """
     Accept a live camera frame and run through the full pipeline:
       Camera -> YOLO -> Crop Person -> Buffer -> ConvLSTM -> Firebase Alert
 
     Returns per-person detections, buffer status, and predictions.
     If shoplifting is detected, a Firebase alert is triggered automatically.
+    `capture_ts` is the client's capture time (epoch seconds); defaults to
+    arrival time, which is also used when the client's clock is far off.
+
+    Every response carries `control`: the send rate and frame width this
+    camera's client should use. When the server is saturated the frame is
+    shed with 429 and Retry-After instead of queueing.
     """
+    # Resolved first: refuses new cameras past MAX_CAMERAS before any state is kept
+    pipeline = get_pipeline(camera_id)
+    retry_after = load_control.try_admit(camera_id)
+    if retry_after is not None:
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            content={
+                "detail": "Server busy, frame dropped",
+                "retry_after_sec": round(retry_after, 2),
+                "control": load_control.recommendation(camera_id),
+            },
+        )
+
+    started = time.perf_counter()
+    latency = None
+    try:
+        response = await _process_camera_frame(pipeline, file, camera_id, capture_ts)
+        latency = time.perf_counter() - started
+    finally:
+        load_control.release(camera_id, latency)
+    response["control"] = load_control.recommendation(camera_id)
+    _report_telemetry(camera_id, response)
+    return response
+
+
+def _report_telemetry(camera_id: str, response: dict):
+    """Merge the camera's latest stats into Firestore, at most every CAMERA_TELEMETRY_INTERVAL_SEC."""
+    now = time.time()
+    if CAMERA_TELEMETRY_INTERVAL_SEC <= 0:
+        return
+    if now - _telemetry_sent.get(camera_id, 0.0) < CAMERA_TELEMETRY_INTERVAL_SEC:
+        return
+    _telemetry_sent[camera_id] = now
+    control = response["control"]
+    save_camera_telemetry(camera_id, {
+        "cameraId": camera_id,
+        "lastFrameAt": datetime.now(timezone.utc).isoformat(),
+        "frameIndex": response["frame_index"],
+        "inputFps": response["input_fps"],
+        "trackedPersons": response["tracked_persons"],
+        "frameWidth": response["frame_width"],
+        "frameHeight": response["frame_height"],
+        "serverLatencyMs": control["server_latency_ms"],
+        "maxFps": control["max_fps"],
+        "maxWidth": control["max_width"],
+    })
+
+
+async def _process_camera_frame(
+    pipeline: ShopliftingPipeline, file: UploadFile, camera_id: str, capture_ts: float | None
+) -> dict:
+    now = time.time()
+    if capture_ts is None or abs(now - capture_ts) > CAPTURE_TS_MAX_SKEW_SEC:
+        capture_ts = now
     contents = await file.read()
     img = Image.open(io.BytesIO(contents)).convert("RGB")
     frame_bgr = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
 
     # Feed frame into rolling buffer for video clip capture
-    incident_capture.push_frame(frame_bgr)
+    incident_capture.push_frame(frame_bgr, camera_id, timestamp=capture_ts)
 
-    # Run the full pipeline
-    result = pipeline.process_frame(frame_bgr)
+    # Run the full pipeline off the event loop, so other cameras' frames can batch
+    # and this camera's next frame can enter detection while this one is classified
+    future = await asyncio.to_thread(pipeline.submit_frame, frame_bgr, capture_ts)
+    result = await asyncio.wrap_future(future)
 
     # Encode annotated frame
     annotated_b64 = ""
@@ -252,11 +535,13 @@ async def camera_frame(file: UploadFile = File(...)):
     h, w = frame_bgr.shape[:2]
 
     return {
+        "camera_id": camera_id,
         "annotated_frame": annotated_b64,
         "frame_index": result.frame_index,
         "tracked_persons": len(result.persons),
         "buffer_counts": {str(k): v for k, v in result.buffer_counts.items()},
         "buffer_needed": SEQUENCE_LENGTH,
+        "input_fps": pipeline.input_fps(),
         "predictions": result.predictions,
         "shoplifting_detected": result.shoplifting_detected,
         "detections": detections,
@@ -265,10 +550,21 @@ async def camera_frame(file: UploadFile = File(...)):
     }
 
 
+@app.get("/recordings/{camera_id}/clip")
+def recording_clip(camera_id: str, start: float, end: float):
+    """Assemble an MP4 for [start, end] (epoch seconds) from the camera's recorded segments."""
+    if incident_capture.recorder is None:
+        raise HTTPException(status_code=404, detail="Segment recorder is disabled (RECORDER_ENABLED=0)")
+    clip = incident_capture.recorder.assemble_clip(camera_id, start, end, wait_sec=0)
+    if clip is None:
+        raise HTTPException(status_code=404, detail="No recorded segments for that window")
+    return Response(content=clip, media_type="video/mp4")
+
+
 @app.post("/camera_reset")
-async def camera_reset():
-    """Reset the pipeline: clear all tracked persons and frame buffers."""
-    pipeline.reset()
+async def camera_reset(camera_id: str = DEFAULT_CAMERA_ID):
+    """Reset the camera's pipeline: clear all tracked persons and frame buffers."""
+    get_pipeline(camera_id).reset()
     return {"status": "pipeline_reset", "message": "All tracks and buffers cleared."}
 
 
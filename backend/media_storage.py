@@ -0,0 +1,214 @@
+"""
+Media storage — where incident screenshots and clips are uploaded.
+
+MEDIA_STORAGE selects the backend:
+  "cloudinary"  hosted Cloudinary (default)
+  "local"       files under MEDIA_LOCAL_DIR, served by this backend at
+                /media/... with HTTP range support (air-gapped stores,
+                offline benchmarks)
+  "s3"          any S3-compatible bucket (AWS, MinIO, ...) via boto3
+
+Every backend stores under a caller-chosen key, so re-uploading the same
+incident overwrites instead of duplicating, and returns the public URL.
+"""
+import io
+import os
+import re
+import tempfile
+
+from config import (
+    MEDIA_STORAGE,
+    MEDIA_LOCAL_DIR,
+    MEDIA_PUBLIC_BASE_URL,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+    S3_PUBLIC_BASE_URL,
+    UPLOAD_CHUNKED_MIN_BYTES,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_POOL_SIZE,
+)
+
+_FOLDERS = {"images": "incidents/images", "videos": "incidents/videos"}
+_CONTENT_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "mp4": "video/mp4"}
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _safe_id(public_id: str) -> str:
+    return _SAFE_ID.sub("_", public_id)
+
+
+class MediaStorage:
+    """Base class: upload bytes under a stable id, return the public URL."""
+
+    name = "base"
+
+    def put_image(self, data: bytes, public_id: str, fmt: str = "jpg") -> str:
+        return self.put("images", data, public_id, fmt)
+
+    def put_video(self, data: bytes, public_id: str) -> str:
+        return self.put("videos", data, public_id, "mp4")
+
+    def put(self, kind: str, data: bytes, public_id: str, fmt: str) -> str:
+        raise NotImplementedError
+
+
+# ──────────────────────────────────────────────────────────
+# Cloudinary
+# ──────────────────────────────────────────────────────────
+class CloudinaryMediaStorage(MediaStorage):
+    name = "cloudinary"
+
+    def __init__(self):
+        # Imported lazily: configures the SDK and its connection pool
+        import cloudinary_service
+        self._service = cloudinary_service
+
+    def put(self, kind: str, data: bytes, public_id: str, fmt: str) -> str:
+        folder = _FOLDERS[kind]
+        if kind == "images":
+            result = self._service.upload_image_bytes(
+                data, folder=folder, public_id=public_id, image_format=fmt
+            )
+        else:
+            result = self._service.upload_video_bytes(data, folder=folder, public_id=public_id)
+        return result.get("secure_url", "")
+
+
+# ──────────────────────────────────────────────────────────
+# Local filesystem
+# ──────────────────────────────────────────────────────────
+class LocalMediaStorage(MediaStorage):
+    """Files under `root_dir/<kind>/<id>.<ext>`, served at `<base_url>/media/<kind>/<file>`."""
+
+    name = "local"
+
+    def __init__(self, root_dir: str = MEDIA_LOCAL_DIR, base_url: str = MEDIA_PUBLIC_BASE_URL):
+        self.root_dir = root_dir
+        self.base_url = base_url.rstrip("/")
+        for kind in _FOLDERS:
+            os.makedirs(os.path.join(root_dir, kind), exist_ok=True)
+
+    def put(self, kind: str, data: bytes, public_id: str, fmt: str) -> str:
+        filename = f"{_safe_id(public_id)}.{fmt}"
+        directory = os.path.join(self.root_dir, kind)
+        # Write then rename, so a reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(directory, filename))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return f"{self.base_url}/media/{kind}/{filename}"
+
+    def resolve(self, kind: str, filename: str) -> tuple[str, str] | None:
+        """(path, content type) of a stored file, or None if unknown."""
+        content_type = _CONTENT_TYPES.get(os.path.splitext(filename)[1][1:])
+        if kind not in _FOLDERS or content_type is None or filename != _safe_id(filename):
+            return None
+        path = os.path.join(self.root_dir, kind, filename)
+        if not os.path.isfile(path):
+            return None
+        return path, content_type
+
+
+def parse_byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range `Range: bytes=...` header against a file size.
+    Returns inclusive (start, end), None for no/unsupported range, and
+    raises ValueError if the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+# ──────────────────────────────────────────────────────────
+# S3-compatible object storage
+# ──────────────────────────────────────────────────────────
+class S3MediaStorage(MediaStorage):
+    """Objects at `incidents/<kind>/<id>.<ext>` in S3_BUCKET; the bucket (or a CDN) must be readable."""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str = S3_BUCKET,
+        endpoint_url: str = S3_ENDPOINT_URL,
+        region: str = S3_REGION,
+        public_base_url: str = S3_PUBLIC_BASE_URL,
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError as e:
+            raise RuntimeError("MEDIA_STORAGE=s3 requires boto3 (pip install boto3)") from e
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE=s3 requires S3_BUCKET")
+
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            config=Config(max_pool_connections=UPLOAD_POOL_SIZE),
+        )
+        # Large clips go up as a multipart upload, like Cloudinary's chunked path
+        self._transfer = TransferConfig(
+            multipart_threshold=UPLOAD_CHUNKED_MIN_BYTES,
+            multipart_chunksize=UPLOAD_CHUNK_SIZE,
+        )
+        if public_base_url:
+            self.base_url = public_base_url.rstrip("/")
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f"https://{bucket}.s3.{region or 'us-east-1'}.amazonaws.com"
+
+    def put(self, kind: str, data: bytes, public_id: str, fmt: str) -> str:
+        key = f"{_FOLDERS[kind]}/{_safe_id(public_id)}.{fmt}"
+        self._client.upload_fileobj(
+            io.BytesIO(data),
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": _CONTENT_TYPES[fmt]},
+            Config=self._transfer,
+        )
+        return f"{self.base_url}/{key}"
+
+
+_BACKENDS = {
+    "cloudinary": CloudinaryMediaStorage,
+    "local": LocalMediaStorage,
+    "s3": S3MediaStorage,
+}
+
+
+def create_media_storage(name: str = MEDIA_STORAGE) -> MediaStorage:
+    """Instantiate the configured storage backend."""
+    try:
+        backend = _BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown MEDIA_STORAGE {name!r} (expected one of {', '.join(_BACKENDS)})"
+        ) from None
+    storage = backend()
+    print(f"[INFO] Media storage: {storage.name}")
+    return storage
@@ -20,9 +20,20 @@ import numpy as np
 import cv2
 import threading
 from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from typing import Optional
 
+from alert_smoothing import AlertSmoother, SmoothingConfig
+from detector import resolve_person_classes
+import reid
+from stage_graph import StageGraph, StageGraphClosed
+from tracker import create_tracker
+
+# Every camera's pipeline shares one YOLO model, and the ultralytics predictor
+# is not thread-safe: direct calls (no detector service / pool) take this lock
+_yolo_lock = threading.Lock()
+
 
 # ─────────────────────────────────────────────────────────
 # Data classes
@@ -45,6 +56,9 @@ class PersonTrack:
     last_seen: float = field(default_factory=time.time)
     last_prediction: Optional[dict] = None
     alert_sent: bool = False  # debounce: only alert once per event
+    last_frame: int = -1  # frame index the track was last matched in
+    embedding: Optional[np.ndarray] = None  # running appearance embedding (re-ID)
+    last_slot: Optional[int] = None  # model time step of the newest buffered crop
 
 
 @dataclass
@@ -58,6 +72,21 @@ class FrameResult:
     buffer_counts: dict  # person_id -> buffer length
 
 
+@dataclass
+class FrameJob:
+    """A frame in flight through the stage graph, filled in stage by stage."""
+    frame_bgr: np.ndarray
+    frame_index: int
+    timestamp: float = field(default_factory=time.time)  # capture time (epoch seconds)
+    future: Future = field(default_factory=Future)
+    annotated: Optional[np.ndarray] = None
+    bboxes: list = field(default_factory=list)
+    assignments: list = field(default_factory=list)  # (person_id, bbox) per detection
+    sequences: dict = field(default_factory=dict)  # person_id -> (sequence, bbox list)
+    predictions: list = field(default_factory=list)
+    buffer_counts: dict = field(default_factory=dict)
+
+
 class ShopliftingPipeline:
 
     def __init__(
@@ -68,10 +97,21 @@ class ShopliftingPipeline:
         image_height: int = 96,
         image_width: int = 96,
         yolo_confidence: float = 0.4,
+        yolo_imgsz: int = 640,
         shoplifting_threshold: float = 0.5,
         person_timeout: float = 5.0,
         alert_cooldown: float = 30.0,
         labels: list = None,
+        camera_id: str = "default",
+        camera_name: str = "Live Camera",
+        parallel: bool = False,
+        queue_size: int = 4,
+        smoothing: SmoothingConfig | None = None,
+        score_log=None,
+        reid_gallery: reid.ReIdGallery | None = None,
+        tracker_backend: str = "iou",
+        model_fps: float = 10.0,
+        max_hold_sec: float = 1.0,
     ):
 
         self.yolo_model = yolo_model
@@ -80,49 +120,99 @@ class ShopliftingPipeline:
         self.img_h = image_height
         self.img_w = image_width
         self.yolo_conf = yolo_confidence
+        self.yolo_imgsz = yolo_imgsz
+        # Person-like class ids, passed to YOLO so NMS drops everything else
+        self.person_classes = (
+            resolve_person_classes(yolo_model.names) if yolo_model is not None else None
+        )
         self.shoplifting_threshold = shoplifting_threshold
         self.person_timeout = person_timeout
         self.alert_cooldown = alert_cooldown
         self.labels = labels or ["normal", "shoplifting"]
+        self.camera_id = camera_id
+        self.camera_name = camera_name
 
         # Per-person tracking state
         self._tracks: dict[int, PersonTrack] = {}
         self._next_person_id = 0
-        self._lock = threading.Lock()
+        self._lock = threading.Lock()  # guards tracking state
+        self._frame_lock = threading.Lock()  # serialises frames in sequential mode
         self._frame_index = 0
         self._last_alert_time: dict[int, float] = {}
+        # Smoothed shoplifting score + hysteresis per track
+        self._smoother = AlertSmoother(smoothing or SmoothingConfig(
+            mode="none", enter_threshold=shoplifting_threshold, exit_threshold=shoplifting_threshold
+        ))
+        self._score_log = score_log
+        # Optional appearance re-ID: lost tracks are parked here with their state
+        self._reid = reid_gallery
+        # Association backend: None = built-in IoU matcher, else a tracker
+        # whose ids are mapped to person ids
+        self.tracker_backend = tracker_backend
+        self._tracker = create_tracker(tracker_backend)
+        self._tracker_ids: dict[int, int] = {}
+        self._tracking_frames = 0
+        # Resize target for all persons of a frame, grown on demand
+        self._roi_scratch = np.empty((8, image_height, image_width, 3), dtype=np.uint8)
+        self._tracking_ms = 0.0
+        self._ids_created = 0
+        # Buffers hold one crop per 1/model_fps of capture time
+        self.model_fps = model_fps
+        self._max_hold_slots = max(0, int(round(max_hold_sec * model_fps)))
+        self._last_input_ts: float | None = None
+        self._input_interval: float | None = None  # EMA of capture-time deltas
+        self._held_frames = 0
+        self._dropped_frames = 0
+
+        # Optional stage graph: each stage on its own worker, frames overlap
+        self._stage_graph = None
+        if parallel:
+            self._stage_graph = StageGraph(
+                [
+                    ("detect", self._stage_detect),
+                    ("track", self._stage_track),
+                    ("classify", self._stage_classify),
+                    ("alert", self._stage_alert),
+                ],
+                queue_size=queue_size,
+                name=f"pipeline-{camera_id}",
+            )
 
     # ─────────────────────────────────────────────────────
     # Step 1: YOLO person detection
     # ─────────────────────────────────────────────────────
     def detect_persons(self, frame_bgr: np.ndarray) -> tuple[np.ndarray, list[BoundingBox]]:
         
+        if self._inference_pool is not None:
+            annotated, raw_boxes = self._inference_pool.detect(frame_bgr)
+            return annotated, [BoundingBox(*b) for b in raw_boxes]
+
         if self.yolo_model is None:
             # Fallback: treat entire frame as single person
             h, w = frame_bgr.shape[:2]
             return frame_bgr.copy(), [BoundingBox(0, 0, w, h, 1.0)]
 
-        results = self.yolo_model(frame_bgr, conf=self.yolo_conf, verbose=False)
-        annotated = results[0].plot()
-
-        boxes = []
-        for box in results[0].boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-            conf = float(box.conf[0])
-            cls_name = results[0].names[int(box.cls[0])]
-            # Only keep "person" detections (YOLO class 0 or custom model)
-            if cls_name.lower() in ("person", "human", "man", "woman", "people"):
-                boxes.append(BoundingBox(x1, y1, x2, y2, conf))
-           
-            elif "shoplift" in cls_name.lower() or "suspect" in cls_name.lower():
-                boxes.append(BoundingBox(x1, y1, x2, y2, conf))
-
-        if not boxes and len(results[0].boxes) > 0:
-            for box in results[0].boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                conf = float(box.conf[0])
-                boxes.append(BoundingBox(x1, y1, x2, y2, conf))
-
+        # Class filtering happens inside YOLO's postprocess (before NMS);
+        # if the model has no person-like classes, every detection is kept.
+        if self._detector_service is not None:
+            result = self._detector_service.detect(self.camera_id, frame_bgr)
+        else:
+            with _yolo_lock:
+                result = self.yolo_model(
+                    frame_bgr,
+                    conf=self.yolo_conf,
+                    imgsz=self.yolo_imgsz,
+                    classes=self.person_classes,
+                    verbose=False,
+                )[0]
+        annotated = result.plot()
+
+        xyxy = result.boxes.xyxy.cpu().numpy().astype(int)
+        confs = result.boxes.conf.cpu().numpy()
+        boxes = [
+            BoundingBox(int(x1), int(y1), int(x2), int(y2), float(conf))
+            for (x1, y1, x2, y2), conf in zip(xyxy, confs)
+        ]
         return annotated, boxes
 
     # ─────────────────────────────────────────────────────
@@ -149,8 +239,38 @@ class ShopliftingPipeline:
         rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
         return rgb.astype(np.float32) / 255.0
 
-    def _assign_person_id(self, bbox: BoundingBox) -> int:
-        """Simple IoU-based tracking: match new bbox to existing tracks."""
+    def resize_rois(self, frame_bgr: np.ndarray, bboxes: list[BoundingBox]) -> np.ndarray:
+        """
+        Crop and resize every person of a frame into one (N, H, W, 3) uint8
+        BGR batch. The batch is a reused scratch buffer, valid until the
+        next call.
+        """
+        n = len(bboxes)
+        if self._roi_scratch.shape[0] < n:
+            self._roi_scratch = np.empty(
+                (max(n, 2 * self._roi_scratch.shape[0]), self.img_h, self.img_w, 3), dtype=np.uint8
+            )
+        rois = self._roi_scratch[:n]
+        for i, bbox in enumerate(bboxes):
+            cv2.resize(self.crop_person(frame_bgr, bbox), (self.img_w, self.img_h), dst=rois[i])
+        return rois
+
+    @staticmethod
+    def normalize_rois(rois_bgr: np.ndarray) -> np.ndarray:
+        """BGR uint8 batch -> new (N, H, W, 3) float32 RGB batch in [0, 1], in one vectorised pass."""
+        batch = np.empty(rois_bgr.shape, dtype=np.float32)
+        np.divide(rois_bgr[..., ::-1], np.float32(255.0), out=batch)
+        return batch
+
+    def _assign_person_id(
+        self, bbox: BoundingBox, embedding: np.ndarray | None = None, frame_index: int = -1
+    ) -> int:
+        """
+        Simple IoU-based tracking: match new bbox to existing tracks.
+        Without overlap, re-ID matches the box's appearance `embedding` to
+        tracks not seen in this frame or recently lost, which then resume
+        with their frame buffer and alert state.
+        """
         best_id = None
         best_iou = 0.3  # minimum IoU to consider a match
 
@@ -163,9 +283,48 @@ class ShopliftingPipeline:
         if best_id is not None:
             return best_id
 
-        # New person
+        pid = self._reidentify(embedding, bbox, frame_index)
+        return pid if pid is not None else self._new_person_id()
+
+    def _person_for_tracker_id(
+        self, tracker_id: int, bbox: BoundingBox, embedding: np.ndarray | None, frame_index: int
+    ) -> int:
+        """Person id for a tracker backend's id; new tracker ids go through re-ID first."""
+        pid = self._tracker_ids.get(tracker_id)
+        if pid is None:
+            pid = self._reidentify(embedding, bbox, frame_index)
+            if pid is None:
+                pid = self._new_person_id()
+            self._tracker_ids[tracker_id] = pid
+        return pid
+
+    def _reidentify(
+        self, embedding: np.ndarray | None, bbox: BoundingBox, frame_index: int
+    ) -> int | None:
+        """
+        Person id of an unmatched or recently lost track that looks like
+        `embedding` and was last seen near `bbox`.
+        """
+        if self._reid is None or embedding is None:
+            return None
+        unmatched = {
+            pid: (track.embedding, (track.bbox.x1, track.bbox.y1, track.bbox.x2, track.bbox.y2),
+                  track.last_seen)
+            for pid, track in self._tracks.items()
+            if track.last_frame != frame_index and track.embedding is not None
+        }
+        match = self._reid.match(embedding, (bbox.x1, bbox.y1, bbox.x2, bbox.y2), unmatched)
+        if match is None:
+            return None
+        pid, parked_track = match
+        if parked_track is not None:
+            self._tracks[pid] = parked_track
+        return pid
+
+    def _new_person_id(self) -> int:
         pid = self._next_person_id
         self._next_person_id += 1
+        self._ids_created += 1
         return pid
 
     @staticmethod
@@ -181,8 +340,15 @@ class ShopliftingPipeline:
         union = area_a + area_b - inter
         return inter / union if union > 0 else 0.0
 
-    def store_frame(self, person_id: int, bbox: BoundingBox, preprocessed: np.ndarray):
-        """Add a preprocessed frame to the person's sliding-window buffer."""
+    def store_frame(
+        self, person_id: int, bbox: BoundingBox, preprocessed: np.ndarray, timestamp: float | None = None
+    ) -> bool:
+        """
+        Sample a preprocessed frame onto the person's sliding-window buffer
+        at `model_fps` by capture time: a second crop in the same time step
+        is dropped, a gap is filled by repeating the previous crop (for at
+        most `max_hold_sec`). Returns True when the buffer advanced.
+        """
         if person_id not in self._tracks:
             self._tracks[person_id] = PersonTrack(
                 person_id=person_id,
@@ -192,7 +358,20 @@ class ShopliftingPipeline:
         track = self._tracks[person_id]
         track.bbox = bbox
         track.last_seen = time.time()
+
+        slot = int((time.time() if timestamp is None else timestamp) * self.model_fps)
+        if track.last_slot is not None and track.frame_buffer:
+            if slot <= track.last_slot:
+                self._dropped_frames += 1  # same step (or out of order)
+                return False
+            hold = min(slot - track.last_slot - 1, self._max_hold_slots)
+            previous = track.frame_buffer[-1]
+            for _ in range(hold):
+                track.frame_buffer.append(previous)
+            self._held_frames += hold
         track.frame_buffer.append(preprocessed)
+        track.last_slot = slot
+        return True
 
     # ─────────────────────────────────────────────────────
     # Step 4: ConvLSTM classification
@@ -206,55 +385,73 @@ class ShopliftingPipeline:
         if track is None or len(track.frame_buffer) < self.sequence_length:
             return None
 
-        # Build sequence: (1, seq_len, H, W, 3)
-        sequence = np.expand_dims(
+        bbox = [track.bbox.x1, track.bbox.y1, track.bbox.x2, track.bbox.y2]
+        prediction = self._classify_sequence(person_id, self._build_sequence(track), bbox)
+        track.last_prediction = prediction
+        return prediction
+
+    @staticmethod
+    def _build_sequence(track: PersonTrack) -> np.ndarray:
+        """Snapshot the track buffer as a (1, seq_len, H, W, 3) float32 sequence."""
+        return np.expand_dims(
             np.array(list(track.frame_buffer)), axis=0
         ).astype(np.float32)
 
+    def _classify_sequence(self, person_id: int, sequence: np.ndarray, bbox: list) -> dict:
         prediction = self.convlstm_predict_fn(sequence)
         prediction["person_id"] = person_id
-        prediction["bbox"] = [track.bbox.x1, track.bbox.y1, track.bbox.x2, track.bbox.y2]
-        track.last_prediction = prediction
+        prediction["bbox"] = bbox
         return prediction
 
     # ─────────────────────────────────────────────────────
-    # Incident capture service (set externally after init)
+    # Services (set externally after init)
     # ─────────────────────────────────────────────────────
     _incident_service = None  # will be injected from main.py
+    _detector_service = None  # shared BatchedDetectorService, optional
+    _inference_pool = None  # InferencePool (worker processes), optional
 
     def set_incident_service(self, service):
         """Inject the IncidentCaptureService instance."""
         self._incident_service = service
 
+    def set_detector_service(self, service):
+        """Route detection through a shared (batched) detector service."""
+        self._detector_service = service
+
+    def set_inference_pool(self, pool):
+        """Run detection in the InferencePool's worker processes."""
+        self._inference_pool = pool
+
     # ─────────────────────────────────────────────────────
     # Step 5: Check & trigger Firebase alert
     # ─────────────────────────────────────────────────────
-    def _check_alert(self, prediction: dict, person_id: int, frame_bgr: np.ndarray):
-        """If shoplifting detected and cooldown has passed, trigger alert and save incident."""
-        if prediction["label"] != "shoplifting":
-            return False
-
-        if prediction["confidence"] < self.shoplifting_threshold:
+    def _check_alert(self, prediction: dict, person_id: int) -> bool:
+        """
+        Feed the track's shoplifting score to the smoother; True if it enters
+        the alert state and the cooldown has passed (lock held).
+        """
+        now = time.time()
+        score = self._shoplifting_score(prediction)
+        if self._score_log is not None:
+            self._score_log.write(self.camera_id, person_id, now, score)
+        if not self._smoother.update(person_id, score):
             return False
 
-        now = time.time()
         last_alert = self._last_alert_time.get(person_id, 0)
         if now - last_alert < self.alert_cooldown:
             return False  # still in cooldown
 
         self._last_alert_time[person_id] = now
-
-        # Trigger the full incident capture flow (screenshot + video + upload + Firestore + FCM)
-        if self._incident_service is not None:
-            self._incident_service.handle_incident(
-                frame_bgr=frame_bgr,
-                prediction=prediction,
-                camera_name="Live Camera",
-                user_id="system",
-            )
-
         return True
 
+    def _shoplifting_score(self, prediction: dict) -> float:
+        """Probability of the shoplifting class for one prediction."""
+        probabilities = prediction.get("probabilities")
+        if probabilities and "shoplifting" in self.labels:
+            return float(probabilities[self.labels.index("shoplifting")])
+        confidence = prediction["confidence"]
+        return confidence if prediction["label"] == "shoplifting" else 1.0 - confidence
+
     # ─────────────────────────────────────────────────────
     # Cleanup stale tracks
     # ─────────────────────────────────────────────────────
@@ -265,14 +462,177 @@ class ShopliftingPipeline:
             pid for pid, track in self._tracks.items()
             if now - track.last_seen > self.person_timeout
         ]
+        dropped_ids = []
         for pid in stale_ids:
-            del self._tracks[pid]
+            track = self._tracks.pop(pid)
+            if self._reid is not None and track.embedding is not None:
+                # Keep buffer + alert state for re-association until evicted
+                b = track.bbox
+                dropped_ids += self._reid.park(
+                    pid, track.embedding, track, (b.x1, b.y1, b.x2, b.y2), track.last_seen, now
+                )
+            else:
+                dropped_ids.append(pid)
+        if self._reid is not None:
+            dropped_ids += self._reid.evict(now)
+        for pid in dropped_ids:
             self._last_alert_time.pop(pid, None)
+            self._smoother.forget(pid)
+        if stale_ids and self._tracker_ids:
+            self._tracker_ids = {
+                tid: pid for tid, pid in self._tracker_ids.items() if pid in self._tracks
+            }
+
+    # ─────────────────────────────────────────────────────
+    # Stages (run in order, either inline or on the stage graph)
+    # ─────────────────────────────────────────────────────
+    def _stage_detect(self, job: FrameJob):
+        """Step 1: YOLO detection."""
+        job.annotated, job.bboxes = self.detect_persons(job.frame_bgr)
+
+    def _stage_track(self, job: FrameJob):
+        """Steps 2–3: assign IDs, crop, preprocess, store; snapshot full buffers."""
+        with self._lock:
+            tracking_sec = 0.0
+            bboxes = job.bboxes
+            tracker_ids = None
+            if self._tracker is not None:
+                t0 = time.perf_counter()
+                tracker_ids = self._tracker.update(bboxes)
+                tracking_sec += time.perf_counter() - t0
+                # Skip low-score detections the tracker did not keep
+                kept = [i for i, tid in enumerate(tracker_ids) if tid is not None]
+                bboxes = [bboxes[i] for i in kept]
+                tracker_ids = [tracker_ids[i] for i in kept]
+
+            # All persons cropped + resized into one batch, normalised at once;
+            # each track stores a view of its row
+            rois = self.resize_rois(job.frame_bgr, bboxes)
+            preprocessed = self.normalize_rois(rois)
+
+            for i, bbox in enumerate(bboxes):
+                embedding = reid.embed(rois[i]) if self._reid is not None else None
+                t0 = time.perf_counter()
+                if tracker_ids is None:
+                    person_id = self._assign_person_id(bbox, embedding, job.frame_index)
+                else:
+                    person_id = self._person_for_tracker_id(
+                        tracker_ids[i], bbox, embedding, job.frame_index
+                    )
+                tracking_sec += time.perf_counter() - t0
+                advanced = self.store_frame(person_id, bbox, preprocessed[i], job.timestamp)
+
+                track = self._tracks[person_id]
+                track.last_frame = job.frame_index
+                if embedding is not None:
+                    track.embedding = reid.blend(track.embedding, embedding)
+                job.buffer_counts[person_id] = len(track.frame_buffer)
+                job.assignments.append((person_id, bbox))
+                if advanced and len(track.frame_buffer) >= self.sequence_length:
+                    # Classify once per new time step. Copy now: the buffer keeps moving while this frame is classified
+                    job.sequences[person_id] = (
+                        self._build_sequence(track), [bbox.x1, bbox.y1, bbox.x2, bbox.y2]
+                    )
+
+            self._tracking_frames += 1
+            self._tracking_ms += tracking_sec * 1000
+
+    def _stage_classify(self, job: FrameJob):
+        """Step 4: ConvLSTM classification on the snapshotted sequences."""
+        for person_id, _ in job.assignments:
+            if person_id in job.sequences:
+                sequence, bbox = job.sequences[person_id]
+                job.predictions.append(self._classify_sequence(person_id, sequence, bbox))
+
+    def _stage_alert(self, job: FrameJob) -> FrameResult:
+        """Step 5: alert on shoplifting, annotate, clean up stale tracks."""
+        annotated = job.annotated
+        alerts = []
+
+        with self._lock:
+            for prediction in job.predictions:
+                person_id = prediction["person_id"]
+                track = self._tracks.get(person_id)
+                if track is not None:
+                    track.last_prediction = prediction
+
+                if self._check_alert(prediction, person_id):
+                    alerts.append(prediction)
+
+                # Draw classification result on annotated frame
+                x1, y1, x2, y2 = prediction["bbox"]
+                label = prediction["label"]
+                conf = prediction["confidence"]
+                color = (0, 0, 255) if label == "shoplifting" else (0, 255, 0)
+                cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+                text = f"P{person_id}: {label} ({conf:.2f})"
+                cv2.putText(
+                    annotated, text,
+                    (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2,
+                )
+
+            # Cleanup old tracks
+            self._cleanup_stale_tracks()
+            persons = list(self._tracks.values())
+
+        # Incident capture (image encoding, outbox writes) runs on the
+        # service's intake thread, never under the tracking lock
+        if self._incident_service is not None:
+            for prediction in alerts:
+                self._incident_service.report_incident(
+                    frame_bgr=job.frame_bgr,
+                    prediction=prediction,
+                    person_id=prediction["person_id"],
+                    camera_id=self.camera_id,
+                    camera_name=self.camera_name,
+                    user_id="system",
+                )
+
+        return FrameResult(
+            annotated_frame=annotated,
+            persons=persons,
+            predictions=job.predictions,
+            shoplifting_detected=bool(alerts),
+            frame_index=job.frame_index,
+            buffer_counts=job.buffer_counts,
+        )
 
     # ─────────────────────────────────────────────────────
     # Main entry point: process one frame
     # ─────────────────────────────────────────────────────
-    def process_frame(self, frame_bgr: np.ndarray) -> FrameResult:
+    def submit_frame(self, frame_bgr: np.ndarray, timestamp: float | None = None) -> Future:
+        """
+        Queue a frame captured at `timestamp` (epoch seconds, default now)
+        and return a Future[FrameResult].
+        On the stage graph, frames of this camera overlap across stages but
+        complete in submission order. Without it, the frame runs inline.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            self._frame_index += 1
+            self._note_input_time(timestamp)
+            job = FrameJob(frame_bgr=frame_bgr, frame_index=self._frame_index, timestamp=timestamp)
+
+        stage_graph = self._stage_graph
+        if stage_graph is not None:
+            try:
+                return stage_graph.submit(job)
+            except StageGraphClosed:
+                pass  # closed meanwhile: run inline
+
+        with self._frame_lock:
+            try:
+                self._stage_detect(job)
+                self._stage_track(job)
+                self._stage_classify(job)
+                job.future.set_result(self._stage_alert(job))
+            except Exception as e:
+                job.future.set_exception(e)
+        return job.future
+
+    def process_frame(self, frame_bgr: np.ndarray, timestamp: float | None = None) -> FrameResult:
         """
         Full pipeline for a single camera frame:
           1. YOLO → detect persons → bounding boxes
@@ -283,61 +643,22 @@ class ShopliftingPipeline:
 
         Returns FrameResult with all detections and predictions.
         """
-        with self._lock:
-            self._frame_index += 1
-
-            # Step 1: YOLO detection
-            annotated, bboxes = self.detect_persons(frame_bgr)
-
-            predictions = []
-            shoplifting_detected = False
-            buffer_counts = {}
-
-            for bbox in bboxes:
-                # Assign/match person ID
-                person_id = self._assign_person_id(bbox)
-
-                # Step 2: Crop person from frame
-                crop = self.crop_person(frame_bgr, bbox)
-
-                # Step 3: Preprocess and store in buffer
-                preprocessed = self.preprocess_crop(crop)
-                self.store_frame(person_id, bbox, preprocessed)
-
-                buffer_counts[person_id] = len(self._tracks[person_id].frame_buffer)
-
-                # Step 4: ConvLSTM classification
-                prediction = self.classify_person(person_id)
-                if prediction:
-                    predictions.append(prediction)
-
-                    # Step 5: Check for shoplifting & alert
-                    if self._check_alert(prediction, person_id, frame_bgr):
-                        shoplifting_detected = True
-
-                    # Draw classification result on annotated frame
-                    label = prediction["label"]
-                    conf = prediction["confidence"]
-                    color = (0, 0, 255) if label == "shoplifting" else (0, 255, 0)
-                    cv2.rectangle(annotated, (bbox.x1, bbox.y1), (bbox.x2, bbox.y2), color, 2)
-                    text = f"P{person_id}: {label} ({conf:.2f})"
-                    cv2.putText(
-                        annotated, text,
-                        (bbox.x1, bbox.y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2,
-                    )
-
-            # Cleanup old tracks
-            self._cleanup_stale_tracks()
-
-            return FrameResult(
-                annotated_frame=annotated,
-                persons=[self._tracks[pid] for pid in self._tracks],
-                predictions=predictions,
-                shoplifting_detected=shoplifting_detected,
-                frame_index=self._frame_index,
-                buffer_counts=buffer_counts,
-            )
+        return self.submit_frame(frame_bgr, timestamp).result()
+
+    def _note_input_time(self, timestamp: float):
+        """Track the camera's effective input rate from capture-time deltas."""
+        if self._last_input_ts is not None:
+            dt = timestamp - self._last_input_ts
+            # Pauses longer than a track timeout are not part of the stream's rate
+            if 0 < dt <= self.person_timeout:
+                self._input_interval = dt if self._input_interval is None else (
+                    0.9 * self._input_interval + 0.1 * dt
+                )
+        self._last_input_ts = timestamp
+
+    def input_fps(self) -> float | None:
+        """Effective input frame rate (by capture time), or None before two frames."""
+        return 1.0 / self._input_interval if self._input_interval else None
 
     # ─────────────────────────────────────────────────────
     # Utilities
@@ -347,20 +668,53 @@ class ShopliftingPipeline:
         with self._lock:
             self._tracks.clear()
             self._last_alert_time.clear()
+            self._smoother.reset()
+            if self._reid is not None:
+                self._reid.clear()
+            if self._tracker is not None:
+                self._tracker.reset()
+            self._tracker_ids.clear()
             self._frame_index = 0
             self._next_person_id = 0
+            self._last_input_ts = None
+            self._input_interval = None
+
+    def close(self):
+        """Stop the stage graph workers; later frames run inline."""
+        if self._stage_graph is not None:
+            self._stage_graph.stop()
+            self._stage_graph = None
 
     def get_status(self) -> dict:
         """Return current pipeline state summary."""
         with self._lock:
+            input_fps = self.input_fps()
             return {
+                "camera_id": self.camera_id,
                 "tracked_persons": len(self._tracks),
                 "frame_index": self._frame_index,
                 "sequence_length": self.sequence_length,
+                "stage_graph": self._stage_graph.get_stats() if self._stage_graph else None,
+                "alert_smoothing": self._smoother.config.describe(),
+                "temporal": {
+                    "input_fps": round(input_fps, 2) if input_fps else None,
+                    "model_fps": self.model_fps,
+                    "held_frames": self._held_frames,
+                    "dropped_frames": self._dropped_frames,
+                },
+                "tracking": {
+                    "backend": self._tracker.name if self._tracker is not None else "iou",
+                    "requested": self.tracker_backend,
+                    "avg_ms_per_frame": round(self._tracking_ms / max(1, self._tracking_frames), 3),
+                    "ids_created": self._ids_created,
+                },
+                "reid": {"matches": self._reid.matches, "gallery": len(self._reid)}
+                if self._reid is not None else None,
                 "tracks": {
                     pid: {
                         "buffer_count": len(t.frame_buffer),
                         "last_prediction": t.last_prediction,
+                        "smoothed_score": self._smoother.smoothed(pid),
                         "bbox": [t.bbox.x1, t.bbox.y1, t.bbox.x2, t.bbox.y2],
                     }
                     for pid, t in self._tracks.items()
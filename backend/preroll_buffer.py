@@ -0,0 +1,189 @@
+"""
+Pre-roll buffer — per-camera ring of JPEG-compressed frames waiting for a
+(rare) incident.
+
+`push` never encodes on the ingest path: it hands the frame to a background
+encoder thread, which downscales it to the clip resolution, JPEG-encodes it
+and appends it to that camera's ring. Every frame carries its capture
+timestamp; each ring keeps the last `max_duration_sec` seconds, capped by
+total bytes, so memory stays bounded per camera whatever the frame rate.
+Frames can finish out of capture order (concurrent uploads); a late frame
+is inserted at its place, or dropped if it is already older than the ring.
+"""
+import bisect
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from config import (
+    INCIDENT_CLIP_MAX_WIDTH,
+    INCIDENT_PREROLL_JPEG_QUALITY,
+    INCIDENT_PREROLL_MAX_BYTES,
+)
+
+
+class _CameraRing:
+    """(timestamp, jpeg) pairs for one camera, evicted oldest-first past either cap."""
+
+    def __init__(self, max_duration_sec: float, max_bytes: int):
+        self.max_duration = max_duration_sec
+        self.max_bytes = max_bytes
+        self.frames: deque = deque()
+        self.total_bytes = 0
+        self.late = 0  # frames that arrived after a newer one
+
+    def append(self, timestamp: float, jpeg: bytes) -> bool:
+        """Add a frame in capture order. Returns False if it was too late to keep."""
+        if self.frames and timestamp < self.frames[-1][0]:
+            self.late += 1
+            if timestamp < self.frames[-1][0] - self.max_duration:
+                return False
+        insert_in_order(self.frames, timestamp, jpeg)
+        self.total_bytes += len(jpeg)
+        oldest_allowed = self.frames[-1][0] - self.max_duration
+        while self.frames and (
+            self.frames[0][0] < oldest_allowed or self.total_bytes > self.max_bytes
+        ):
+            self.total_bytes -= len(self.frames.popleft()[1])
+        return True
+
+    def span_sec(self) -> float:
+        return self.frames[-1][0] - self.frames[0][0] if self.frames else 0.0
+
+
+class PrerollBuffer:
+
+    def __init__(
+        self,
+        max_duration_sec: float,
+        max_bytes: int = INCIDENT_PREROLL_MAX_BYTES,
+        max_width: int = INCIDENT_CLIP_MAX_WIDTH,
+        jpeg_quality: int = INCIDENT_PREROLL_JPEG_QUALITY,
+        queue_size: int = 64,
+        on_frame=None,
+    ):
+        self.max_duration = max_duration_sec
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self._rings: dict[str, _CameraRing] = {}
+        self._lock = threading.Lock()
+        self._pending: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        # Optional callback(camera_id, timestamp, jpeg) for every encoded frame
+        self._on_frame = on_frame
+
+        self._encoder = threading.Thread(target=self._encode_loop, daemon=True, name="preroll-encoder")
+        self._encoder.start()
+
+    # ──────────────────────────────────────────────────────
+    # Ingest (non-blocking)
+    # ──────────────────────────────────────────────────────
+    def push(self, camera_id: str, frame_bgr: np.ndarray, timestamp: float | None = None):
+        """
+        Queue a frame (captured at `timestamp`, default now) for encoding.
+        The frame is not copied, so callers must not modify it afterwards.
+        If the encoder falls behind, the frame is dropped rather than
+        blocking ingest.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        try:
+            self._pending.put_nowait((camera_id, frame_bgr, timestamp))
+        except queue.Full:
+            self._dropped += 1
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            camera_id, frame, timestamp = self._pending.get()
+            try:
+                self._encode_one(camera_id, frame, timestamp, params)
+            except Exception as e:
+                # One bad frame must not stop every camera's pre-roll
+                self._dropped += 1
+                print(f"[WARN] Pre-roll encode failed for {camera_id}: {e}")
+
+    def _encode_one(self, camera_id: str, frame: np.ndarray, timestamp: float, params: list):
+        h, w = frame.shape[:2]
+        if self.max_width and w > self.max_width:
+            scale = self.max_width / w
+            frame = cv2.resize(frame, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, params)
+        if not ok:
+            return
+        with self._lock:
+            ring = self._rings.get(camera_id)
+            if ring is None:
+                ring = self._rings[camera_id] = _CameraRing(self.max_duration, self.max_bytes)
+            jpeg = buf.tobytes()
+            if not ring.append(timestamp, jpeg):
+                return
+        if self._on_frame is not None:
+            self._on_frame(camera_id, timestamp, jpeg)
+
+    # ──────────────────────────────────────────────────────
+    # Read back
+    # ──────────────────────────────────────────────────────
+    def snapshot(self, camera_id: str) -> list[tuple[float, bytes]]:
+        """Return the camera's (timestamp, jpeg) frames, oldest first."""
+        with self._lock:
+            ring = self._rings.get(camera_id)
+            return list(ring.frames) if ring else []
+
+    def discard(self, camera_id: str):
+        """Free an idle camera's ring."""
+        with self._lock:
+            self._rings.pop(camera_id, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "cameras": {
+                    cid: {
+                        "frames": len(r.frames),
+                        "bytes": r.total_bytes,
+                        "span_sec": round(r.span_sec(), 2),
+                        "late": r.late,
+                    }
+                    for cid, r in self._rings.items()
+                },
+                "encode_queue": self._pending.qsize(),
+                "dropped": self._dropped,
+            }
+
+
+def insert_in_order(frames, timestamp: float, jpeg: bytes):
+    """Insert (timestamp, jpeg) into a list / deque kept sorted by timestamp."""
+    if not frames or timestamp >= frames[-1][0]:
+        frames.append((timestamp, jpeg))
+    else:
+        frames.insert(bisect.bisect_right(frames, timestamp, key=lambda f: f[0]), (timestamp, jpeg))
+
+
+# ──────────────────────────────────────────────────────────
+# Resampling to a constant output frame rate
+# ──────────────────────────────────────────────────────────
+def resample_indices(timestamps: list[float], fps: float) -> list[int]:
+    """
+    Map a constant-rate output timeline onto irregularly timed input frames
+    (`timestamps` ascending, as the rings keep them).
+    For each output tick t = t0 + k/fps (up to the last timestamp) returns
+    the index of the latest input frame captured at or before t, so slow
+    sources are held (duplicated) and fast sources are decimated. A clip
+    built this way plays back at real-time speed.
+    """
+    if not timestamps:
+        return []
+    start, end = timestamps[0], timestamps[-1]
+    n_out = max(1, int((end - start) * fps) + 1)
+    ticks = start + np.arange(n_out) / fps
+    return (np.searchsorted(np.asarray(timestamps), ticks, side="right") - 1).tolist()
+
+
+def decode_jpeg(jpeg: bytes) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
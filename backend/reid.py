@@ -0,0 +1,168 @@
+"""
+Lightweight person re-identification — appearance embeddings that let the
+tracker re-associate a box with a recently lost track instead of starting a
+new one with an empty frame buffer.
+
+The embedding is a colour descriptor: hue/saturation histograms of the
+upper and lower body (clothing), Hellinger-normalised so cosine similarity
+compares them. It costs a few microseconds per box and needs no model.
+
+Lost tracks are parked in a small gallery (one embedding matrix, compared
+in a single matrix-vector product) and evicted after `max_age_sec`.
+Colour alone confuses similarly dressed people, so a candidate is only
+considered if the new box is near where the track was last seen: within
+`gate_base` box heights, plus `gate_per_sec` box heights per second since.
+"""
+import time
+
+import cv2
+import numpy as np
+
+from config import (
+    REID_THRESHOLD,
+    REID_MAX_AGE_SEC,
+    REID_GALLERY_SIZE,
+    REID_EMBED_MOMENTUM,
+    REID_GATE_BASE,
+    REID_GATE_PER_SEC,
+)
+
+_EMBED_SIZE = (32, 64)  # (w, h) the crop is reduced to before the histograms
+_H_BINS, _S_BINS = 8, 4
+
+
+def embed(crop_bgr: np.ndarray) -> np.ndarray | None:
+    """Unit-length appearance embedding of a person crop, or None if empty."""
+    if crop_bgr.size == 0:
+        return None
+    small = cv2.resize(crop_bgr, _EMBED_SIZE, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    half = _EMBED_SIZE[1] // 2
+    parts = []
+    for region in (hsv[:half], hsv[half:]):  # upper body, lower body
+        hist = cv2.calcHist([region], [0, 1], None, [_H_BINS, _S_BINS], [0, 180, 0, 256])
+        parts.append(hist.ravel() / max(1.0, float(hist.sum())))
+    vector = np.sqrt(np.concatenate(parts)).astype(np.float32)
+    return vector / max(1e-6, float(np.linalg.norm(vector)))
+
+
+def blend(track_embedding: np.ndarray | None, embedding: np.ndarray,
+          momentum: float = REID_EMBED_MOMENTUM) -> np.ndarray:
+    """Running (EMA) embedding of a track, kept unit length."""
+    if track_embedding is None:
+        return embedding
+    mixed = momentum * track_embedding + (1.0 - momentum) * embedding
+    return mixed / max(1e-6, float(np.linalg.norm(mixed)))
+
+
+class ReIdGallery:
+    """Embeddings of lost tracks (with their state), evicted by age."""
+
+    def __init__(
+        self,
+        threshold: float = REID_THRESHOLD,
+        max_age_sec: float = REID_MAX_AGE_SEC,
+        max_size: int = REID_GALLERY_SIZE,
+        gate_base: float = REID_GATE_BASE,
+        gate_per_sec: float = REID_GATE_PER_SEC,
+    ):
+        self.threshold = threshold
+        self.max_age = max_age_sec
+        self.max_size = max_size
+        self.gate_base = gate_base
+        self.gate_per_sec = gate_per_sec
+        self._ids: list[int] = []
+        self._matrix = np.empty((0, 2 * _H_BINS * _S_BINS), dtype=np.float32)
+        self._lost_at = np.empty(0, dtype=np.float64)
+        self._boxes = np.empty((0, 4), dtype=np.float32)  # last box (x1, y1, x2, y2)
+        self._seen_at = np.empty(0, dtype=np.float64)  # when that box was seen
+        self._payloads: dict[int, object] = {}
+        self.matches = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def park(
+        self, track_id: int, embedding: np.ndarray, payload, box, seen_at: float,
+        now: float | None = None,
+    ) -> list[int]:
+        """
+        Keep a lost track, last seen at `box` at time `seen_at`, for
+        re-association. Returns ids evicted to make room.
+        """
+        now = time.time() if now is None else now
+        self._ids.append(track_id)
+        self._matrix = np.vstack([self._matrix, embedding[None, :]])
+        self._lost_at = np.append(self._lost_at, now)
+        self._boxes = np.vstack([self._boxes, np.asarray(box, dtype=np.float32)[None, :]])
+        self._seen_at = np.append(self._seen_at, seen_at)
+        self._payloads[track_id] = payload
+        evicted = []
+        while len(self._ids) > self.max_size:
+            evicted.append(self._remove(0)[0])  # oldest first
+        return evicted
+
+    def evict(self, now: float | None = None) -> list[int]:
+        """Drop tracks lost longer than `max_age`. Returns their ids."""
+        now = time.time() if now is None else now
+        expired = np.flatnonzero(now - self._lost_at > self.max_age)
+        return [self._remove(i)[0] for i in expired[::-1]]
+
+    def match(self, embedding: np.ndarray, box, live: dict[int, tuple], now: float | None = None):
+        """
+        Best match for `embedding`, seen at `box`, among `live` (track id ->
+        (embedding, last box, last seen) of tracks not seen this frame) and
+        the gallery, above `threshold` and within the distance gate.
+        Returns (track id, parked payload or None for a live track), or None.
+        """
+        now = time.time() if now is None else now
+        box = np.asarray(box, dtype=np.float32)
+        best_id, best_sim, gallery_index = None, self.threshold, None
+        if live:
+            ids = list(live)
+            sims = np.stack([live[i][0] for i in ids]) @ embedding
+            sims[~self._within_gate(
+                box, np.array([live[i][1] for i in ids], dtype=np.float32),
+                now - np.array([live[i][2] for i in ids]),
+            )] = -1.0
+            i = int(np.argmax(sims))
+            if sims[i] >= best_sim:
+                best_id, best_sim = ids[i], float(sims[i])
+        if self._ids:
+            sims = self._matrix @ embedding
+            sims[~self._within_gate(box, self._boxes, now - self._seen_at)] = -1.0
+            i = int(np.argmax(sims))
+            if sims[i] >= best_sim:
+                best_id, best_sim, gallery_index = self._ids[i], float(sims[i]), i
+        if best_id is None:
+            return None
+
+        self.matches += 1
+        if gallery_index is not None:
+            return self._remove(gallery_index)
+        return best_id, None
+
+    def _within_gate(self, box: np.ndarray, last_boxes: np.ndarray, elapsed: np.ndarray) -> np.ndarray:
+        """Mask of candidates whose last box centre is close enough to `box`'s."""
+        centre = (box[:2] + box[2:]) / 2
+        centres = (last_boxes[:, :2] + last_boxes[:, 2:]) / 2
+        distance = np.linalg.norm(centres - centre, axis=1)
+        height = np.maximum(box[3] - box[1], last_boxes[:, 3] - last_boxes[:, 1])
+        return distance <= height * (self.gate_base + self.gate_per_sec * np.maximum(elapsed, 0.0))
+
+    def clear(self):
+        self._ids.clear()
+        self._matrix = self._matrix[:0]
+        self._lost_at = self._lost_at[:0]
+        self._boxes = self._boxes[:0]
+        self._seen_at = self._seen_at[:0]
+        self._payloads.clear()
+
+    def _remove(self, index: int) -> tuple[int, object]:
+        """Take entry `index` out of the gallery; returns (track id, payload)."""
+        track_id = self._ids.pop(index)
+        self._matrix = np.delete(self._matrix, index, axis=0)
+        self._lost_at = np.delete(self._lost_at, index)
+        self._boxes = np.delete(self._boxes, index, axis=0)
+        self._seen_at = np.delete(self._seen_at, index)
+        return track_id, self._payloads.pop(track_id, None)
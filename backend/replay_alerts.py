@@ -0,0 +1,103 @@
+"""
+Replay logged shoplifting scores through alert smoothing settings and count
+the alerts each setting would have raised.
+
+Record scores by running the backend with ALERT_SCORE_LOG=scores.jsonl, then
+(from backend/):
+    python replay_alerts.py scores.jsonl [--camera aisle-3]
+        [--enter 0.5,0.6,0.7] [--exit 0.3,0.4] [--alphas 0.3,0.5] [--k-of-n 2/3,3/5]
+"""
+import argparse
+import itertools
+import json
+from collections import defaultdict
+
+from alert_smoothing import AlertSmoother, SmoothingConfig
+from config import ALERT_COOLDOWN_SEC
+
+
+def _floats(text: str) -> list[float]:
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def load_scores(path: str, camera: str | None) -> dict[str, list[tuple[float, int, float]]]:
+    """camera_id -> [(ts, track_id, score)] in time order."""
+    by_camera = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if camera is None or row["camera_id"] == camera:
+                by_camera[row["camera_id"]].append((row["ts"], row["track_id"], row["score"]))
+    for rows in by_camera.values():
+        rows.sort()
+    return by_camera
+
+
+def replay(rows: list[tuple[float, int, float]], config: SmoothingConfig, cooldown: float) -> int:
+    """Number of alerts one camera's scores raise under `config` (with the per-track cooldown)."""
+    smoother = AlertSmoother(config)
+    last_alert: dict[int, float] = {}
+    alerts = 0
+    for ts, track_id, score in rows:
+        if not smoother.update(track_id, score):
+            continue
+        if ts - last_alert.get(track_id, float("-inf")) < cooldown:
+            continue
+        last_alert[track_id] = ts
+        alerts += 1
+    return alerts
+
+
+def candidate_configs(args) -> list[SmoothingConfig]:
+    configs = []
+    for enter in _floats(args.enter):
+        configs.append(SmoothingConfig(mode="none", enter_threshold=enter, exit_threshold=enter))
+    for enter, exit_, alpha in itertools.product(_floats(args.enter), _floats(args.exit), _floats(args.alphas)):
+        if exit_ <= enter:
+            configs.append(SmoothingConfig(
+                mode="ema", ema_alpha=alpha, enter_threshold=enter, exit_threshold=exit_
+            ))
+    for enter, exit_, kn in itertools.product(_floats(args.enter), _floats(args.exit), args.k_of_n.split(",")):
+        k, n = (int(v) for v in kn.split("/"))
+        if exit_ <= enter:
+            configs.append(SmoothingConfig(
+                mode="k_of_n", k=k, n=n, enter_threshold=enter, exit_threshold=exit_
+            ))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scores", help="JSONL written via ALERT_SCORE_LOG")
+    parser.add_argument("--camera", default=None, help="only replay this camera")
+    parser.add_argument("--enter", default="0.5,0.6,0.7")
+    parser.add_argument("--exit", default="0.3,0.4")
+    parser.add_argument("--alphas", default="0.3,0.5")
+    parser.add_argument("--k-of-n", default="2/3,3/5")
+    parser.add_argument("--cooldown", type=float, default=ALERT_COOLDOWN_SEC)
+    args = parser.parse_args()
+
+    by_camera = load_scores(args.scores, args.camera)
+    if not by_camera:
+        raise SystemExit("No scores to replay")
+    cameras = sorted(by_camera)
+    windows = sum(len(rows) for rows in by_camera.values())
+    span_h = max(
+        (rows[-1][0] - rows[0][0]) for rows in by_camera.values()
+    ) / 3600 or 1 / 3600
+    print(f"{windows} scored windows from {len(cameras)} camera(s) over {span_h:.2f} h "
+          f"(cooldown {args.cooldown:.0f}s)\n")
+
+    header = f"  {'setting':<44} {'alerts':>7} {'per h':>7}  " + "  ".join(cameras)
+    print(header)
+    for config in candidate_configs(args):
+        counts = [replay(by_camera[c], config, args.cooldown) for c in cameras]
+        total = sum(counts)
+        print(f"  {config.describe():<44} {total:>7} {total / span_h:>7.1f}  "
+              + "  ".join(str(c) for c in counts))
+
+
+if __name__ == "__main__":
+    main()
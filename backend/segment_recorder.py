@@ -0,0 +1,397 @@
+"""
+Segmented recorder — continuously writes each camera's frames as short MP4
+segments into an on-disk ring with a size cap.
+
+Encoding is paid once per frame, at a steady rate, on the recorder's own
+thread. An incident clip is assembled by concatenating the segments that
+cover its time window with ffmpeg's concat demuxer (stream copy, no
+re-encode). Any window still on disk can be assembled.
+
+Segments are H.264 (avc1) where this OpenCV build can write it, else MPEG-4
+Part 2. Their file names carry start time, size and codec, so segments
+left by an earlier run are indexed (and counted against the size cap) at
+startup. A camera's open segment is finalized when the camera is forgotten
+or has sent nothing for `idle_close_sec`.
+"""
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from config import (
+    INCIDENT_CLIP_MAX_WIDTH,
+    INCIDENT_VIDEO_FPS,
+    RECORDER_DIR,
+    RECORDER_SEGMENT_SEC,
+    RECORDER_MAX_BYTES_PER_CAMERA,
+)
+
+
+@dataclass
+class Segment:
+    path: str
+    start_ts: float
+    end_ts: float
+    size: int
+    frame_size: tuple  # (w, h)
+    codec: str = "avc1"
+
+
+class _CameraSegments:
+    """Open writer + closed segment ring for one camera."""
+
+    def __init__(self, camera_dir: str):
+        self.camera_dir = camera_dir
+        self.closed: deque[Segment] = deque()
+        self.total_bytes = 0
+        self.writer = None
+        self.path = None
+        self.start_ts = 0.0
+        self.next_tick = 0.0
+        self.last_frame = None
+        self.size = None
+        self.codec = None
+        self.last_write = 0.0  # monotonic time of the last frame written
+
+
+class SegmentRecorder:
+
+    def __init__(
+        self,
+        root_dir: str = RECORDER_DIR,
+        fps: float = INCIDENT_VIDEO_FPS,
+        segment_sec: float = RECORDER_SEGMENT_SEC,
+        max_bytes_per_camera: int = RECORDER_MAX_BYTES_PER_CAMERA,
+        max_width: int = INCIDENT_CLIP_MAX_WIDTH,
+        queue_size: int = 64,
+        idle_close_sec: float | None = None,
+    ):
+        self.root_dir = root_dir
+        self.fps = fps
+        self.segment_sec = segment_sec
+        self.max_bytes = max_bytes_per_camera
+        self.max_width = max_width
+        self.idle_close_sec = idle_close_sec if idle_close_sec is not None else 2 * segment_sec
+        self._codecs = ["avc1", "mp4v"]  # preference order; avc1 dropped if unavailable
+        self._ffmpeg = shutil.which("ffmpeg")
+        if self._ffmpeg is None:
+            print("[WARN] ffmpeg not found - incident clips will be re-encoded from the pre-roll")
+
+        self._cameras: dict[str, _CameraSegments] = {}
+        self._cond = threading.Condition()
+        self._pending: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        # Segments being read by assemble_clip are only deleted once released
+        self._pins: dict[str, int] = {}
+        self._evicted_pinned: set[str] = set()
+        os.makedirs(root_dir, exist_ok=True)
+        # Segments from earlier runs, by camera directory, until the camera is seen
+        self._restored: dict[str, _CameraSegments] = self._index_existing()
+
+        self._thread = threading.Thread(target=self._record_loop, daemon=True, name="segment-recorder")
+        self._thread.start()
+
+    def _index_existing(self) -> dict[str, _CameraSegments]:
+        """
+        Index segments left by earlier runs, oldest first, and apply the size
+        cap. Files without the current naming scheme and each camera's newest
+        segment, if unreadable (the writer was never released), are removed.
+        """
+        restored = {}
+        for name in sorted(os.listdir(self.root_dir)):
+            camera_dir = os.path.join(self.root_dir, name)
+            if not os.path.isdir(camera_dir):
+                continue
+            found = []
+            for filename in os.listdir(camera_dir):
+                path = os.path.join(camera_dir, filename)
+                match = _SEGMENT_NAME.match(filename)
+                if match is None:
+                    _remove(path)
+                    continue
+                ms, w, h, codec = match.groups()
+                found.append((int(ms) / 1000.0, path, (int(w), int(h)), codec))
+            found.sort()
+            if found and not _readable(found[-1][1]):
+                _remove(found.pop()[1])
+            if not found:
+                continue
+
+            cam = _CameraSegments(camera_dir)
+            for i, (start_ts, path, frame_size, codec) in enumerate(found):
+                end_ts = start_ts + self.segment_sec
+                if i + 1 < len(found):
+                    end_ts = min(end_ts, found[i + 1][0])
+                size = os.path.getsize(path)
+                cam.closed.append(Segment(path, start_ts, end_ts, size, frame_size, codec))
+                cam.total_bytes += size
+            while cam.closed and cam.total_bytes > self.max_bytes:
+                old = cam.closed.popleft()
+                cam.total_bytes -= old.size
+                _remove(old.path)
+            restored[name] = cam
+            print(f"[INFO] Recorder: {len(cam.closed)} segments from earlier runs for {name}")
+        return restored
+
+    # ──────────────────────────────────────────────────────
+    # Ingest (non-blocking)
+    # ──────────────────────────────────────────────────────
+    def push(self, camera_id: str, frame_bgr: np.ndarray, timestamp: float):
+        """Queue a frame for recording; dropped if the recorder falls behind."""
+        try:
+            self._pending.put_nowait((camera_id, frame_bgr, timestamp))
+        except queue.Full:
+            self._dropped += 1
+
+    def forget(self, camera_id: str):
+        """Finalize an idle camera's open segment (its closed segments stay on disk)."""
+        try:
+            self._pending.put_nowait((camera_id, None, 0.0))
+        except queue.Full:
+            pass  # the idle timeout finalizes it
+
+    def _record_loop(self):
+        while True:
+            try:
+                camera_id, frame, timestamp = self._pending.get(timeout=self.idle_close_sec)
+            except queue.Empty:
+                self._close_idle()
+                continue
+            if frame is None:
+                cam = self._cameras.get(camera_id)
+                if cam is not None:
+                    self._finish_camera(camera_id, cam)
+                continue
+            h, w = frame.shape[:2]
+            if self.max_width and w > self.max_width:
+                scale = self.max_width / w
+                frame = cv2.resize(frame, (self.max_width, int(h * scale)), interpolation=cv2.INTER_AREA)
+            try:
+                self._write(camera_id, frame, timestamp)
+            except Exception as e:
+                print(f"[ERROR] Segment recorder failed for {camera_id}: {e}")
+            self._close_idle()
+
+    def _close_idle(self):
+        """Finalize open segments of cameras that stopped sending frames."""
+        now = time.monotonic()
+        for camera_id, cam in list(self._cameras.items()):
+            if cam.writer is not None and now - cam.last_write > self.idle_close_sec:
+                self._finish_camera(camera_id, cam)
+
+    def _finish_camera(self, camera_id: str, cam: _CameraSegments):
+        self._close_segment(camera_id, cam, cam.next_tick)
+        cam.last_frame = None
+
+    def _camera(self, camera_id: str) -> _CameraSegments | None:
+        """Camera state, adopting segments indexed at startup on first use (lock held)."""
+        cam = self._cameras.get(camera_id)
+        if cam is None:
+            cam = self._restored.pop(_dir_name(camera_id), None)
+            if cam is not None:
+                self._cameras[camera_id] = cam
+        return cam
+
+    def _write(self, camera_id: str, frame: np.ndarray, timestamp: float):
+        with self._cond:
+            cam = self._camera(camera_id)
+            if cam is None:
+                camera_dir = os.path.join(self.root_dir, _dir_name(camera_id))
+                os.makedirs(camera_dir, exist_ok=True)
+                cam = self._cameras[camera_id] = _CameraSegments(camera_dir)
+        cam.last_write = time.monotonic()
+
+        size = (frame.shape[1], frame.shape[0])
+        gap = cam.last_frame is not None and timestamp - cam.next_tick > self.segment_sec
+        if cam.writer is None or size != cam.size or gap:
+            # Start fresh rather than filling a resolution change or a long
+            # pause in the feed with held frames
+            self._close_segment(camera_id, cam, cam.next_tick if gap else timestamp)
+            cam.last_frame = None
+            self._open_segment(cam, size, timestamp)
+
+        # Constant-rate output: hold the previous frame for every tick up to
+        # this frame's capture time, then make this frame current.
+        tick = 1.0 / self.fps
+        while cam.last_frame is not None and cam.next_tick < timestamp:
+            cam.writer.write(cam.last_frame)
+            cam.next_tick += tick
+            if cam.next_tick - cam.start_ts >= self.segment_sec:
+                self._close_segment(camera_id, cam, cam.next_tick)
+                self._open_segment(cam, size, cam.next_tick)
+        cam.last_frame = frame
+        if cam.next_tick < timestamp:
+            cam.next_tick = timestamp
+
+    def _open_segment(self, cam: _CameraSegments, size: tuple, start_ts: float):
+        for codec in list(self._codecs):
+            cam.path = os.path.join(
+                cam.camera_dir, f"{int(start_ts * 1000)}_{size[0]}x{size[1]}_{codec}.mp4"
+            )
+            cam.writer = cv2.VideoWriter(cam.path, cv2.VideoWriter_fourcc(*codec), self.fps, size)
+            if cam.writer.isOpened():
+                break
+            cam.writer.release()
+            _remove(cam.path)
+            if codec == "avc1" and len(self._codecs) > 1:
+                self._codecs.remove("avc1")
+                print("[WARN] OpenCV cannot write H.264 - recording segments as MPEG-4 Part 2 (mp4v)")
+        else:
+            print(f"[ERROR] Recorder cannot open a video writer for {cam.path}")
+        cam.codec = codec
+        cam.size = size
+        cam.start_ts = start_ts
+        if cam.next_tick < start_ts:
+            cam.next_tick = start_ts
+
+    def _close_segment(self, camera_id: str, cam: _CameraSegments, end_ts: float):
+        if cam.writer is None:
+            return
+        cam.writer.release()
+        cam.writer = None
+        size = os.path.getsize(cam.path) if os.path.exists(cam.path) else 0
+        with self._cond:
+            cam.closed.append(Segment(cam.path, cam.start_ts, end_ts, size, cam.size, cam.codec))
+            cam.total_bytes += size
+            while cam.closed and cam.total_bytes > self.max_bytes:
+                old = cam.closed.popleft()
+                cam.total_bytes -= old.size
+                if old.path in self._pins:
+                    self._evicted_pinned.add(old.path)
+                else:
+                    _remove(old.path)
+            self._cond.notify_all()
+
+    # ──────────────────────────────────────────────────────
+    # Clip assembly
+    # ──────────────────────────────────────────────────────
+    def assemble_clip(
+        self, camera_id: str, start_ts: float, end_ts: float, wait_sec: float | None = None
+    ) -> bytes | None:
+        """
+        Concatenate the closed segments overlapping [start_ts, end_ts] into
+        one MP4 without re-encoding. Waits up to `wait_sec` (default: two
+        segment lengths) for the segment covering `end_ts` to close.
+        Returns None if ffmpeg is unavailable, nothing is on disk or ffmpeg
+        fails, so the caller can fall back to re-encoding.
+        """
+        if self._ffmpeg is None:
+            return None
+        if wait_sec is None:
+            wait_sec = 2 * self.segment_sec
+
+        deadline = time.time() + wait_sec
+        with self._cond:
+            while True:
+                cam = self._camera(camera_id)
+                closed = list(cam.closed) if cam else []
+                if closed and closed[-1].end_ts >= end_ts:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            segments = _longest_same_size_run(
+                [s for s in closed if s.end_ts > start_ts and s.start_ts < end_ts]
+            )
+            for seg in segments:
+                self._pins[seg.path] = self._pins.get(seg.path, 0) + 1
+        if not segments:
+            return None
+
+        # Segment list on stdin, fragmented MP4 on stdout: nothing touches disk
+        segment_list = "".join(f"file '{os.path.abspath(s.path)}'\n" for s in segments)
+        try:
+            result = subprocess.run(
+                [
+                    self._ffmpeg, "-hide_banner", "-loglevel", "error",
+                    "-f", "concat", "-safe", "0", "-protocol_whitelist", "file,pipe",
+                    "-i", "pipe:0",
+                    "-c", "copy", "-movflags", "frag_keyframe+empty_moov+default_base_moof",
+                    "-f", "mp4", "pipe:1",
+                ],
+                input=segment_list.encode(),
+                capture_output=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as e:
+            print(f"[WARN] Segment concat failed for {camera_id}: {e.stderr.decode(errors='replace').strip()}")
+            return None
+        except OSError as e:
+            print(f"[WARN] Segment concat failed for {camera_id}: {e}")
+            return None
+        finally:
+            self._unpin(segments)
+        return result.stdout or None
+
+    def _unpin(self, segments: list[Segment]):
+        with self._cond:
+            for seg in segments:
+                count = self._pins.pop(seg.path) - 1
+                if count:
+                    self._pins[seg.path] = count
+                elif seg.path in self._evicted_pinned:
+                    self._evicted_pinned.discard(seg.path)
+                    _remove(seg.path)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                "cameras": {
+                    cid: {
+                        "segments": len(c.closed),
+                        "bytes": c.total_bytes,
+                        "recording": c.writer is not None,
+                    }
+                    for cid, c in self._cameras.items()
+                },
+                "restored": {
+                    name: {"segments": len(c.closed), "bytes": c.total_bytes}
+                    for name, c in self._restored.items()
+                },
+                "queue": self._pending.qsize(),
+                "dropped": self._dropped,
+            }
+
+
+def _longest_same_size_run(segments: list[Segment]) -> list[Segment]:
+    """Longest run of consecutive segments with one resolution and codec (stream copy can't mix them)."""
+    best, run = [], []
+    for seg in segments:
+        if run and (seg.frame_size, seg.codec) != (run[-1].frame_size, run[-1].codec):
+            run = []
+        run.append(seg)
+        if len(run) > len(best):
+            best = list(run)
+    return best
+
+
+_SEGMENT_NAME = re.compile(r"^(\d+)_(\d+)x(\d+)_(avc1|mp4v)\.mp4$")
+
+
+def _dir_name(camera_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", camera_id)
+
+
+def _readable(path: str) -> bool:
+    capture = cv2.VideoCapture(path)
+    try:
+        return capture.isOpened() and capture.read()[0]
+    finally:
+        capture.release()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
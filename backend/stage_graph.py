@@ -0,0 +1,108 @@
+"""
+Stage graph — a linear chain of pipeline stages, each with its own worker
+thread and a bounded queue in front of it.
+
+Every stage has exactly one worker and FIFO queues, so jobs leave the graph
+in the order they entered it. While stage k works on frame N, stage k-1 can
+already work on frame N+1, so throughput approaches that of the slowest
+stage instead of the sum of all stages. Full queues block `submit`, which
+gives natural backpressure to the caller. Once `stop` has been called,
+`submit` raises StageGraphClosed instead of queueing a job nobody runs.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+_STOP = object()
+
+
+class StageGraphClosed(RuntimeError):
+    """The graph was stopped; the job was not queued."""
+
+
+class StageGraph:
+
+    def __init__(self, stages: list[tuple[str, Callable]], queue_size: int = 4, name: str = "pipeline"):
+        """
+        `stages` is an ordered list of (name, fn). Each fn receives the job and
+        mutates it in place; the return value of the last stage becomes the
+        result of the job's future. Jobs must expose a `future` attribute.
+        """
+        self.name = name
+        self._stages = stages
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._timings = {stage_name: [0, 0.0] for stage_name, _ in stages}  # count, total sec
+        self._timings_lock = threading.Lock()
+        self._closed = False
+        self._submit_lock = threading.Lock()  # orders submits against the stop marker
+        self._threads = [
+            threading.Thread(
+                target=self._worker, args=(i,), daemon=True, name=f"{name}-{stage_name}"
+            )
+            for i, (stage_name, _) in enumerate(stages)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, job) -> Future:
+        """Enqueue a job at the first stage (blocks while that queue is full)."""
+        with self._submit_lock:
+            if self._closed:
+                raise StageGraphClosed(f"Stage graph {self.name} is stopped")
+            self._queues[0].put(job)
+        return job.future
+
+    def stop(self):
+        """Refuse new jobs, drain the queued ones and stop all workers."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queues[0].put(_STOP)
+        for t in self._threads:
+            t.join(timeout=5)
+
+    def get_stats(self) -> dict:
+        with self._timings_lock:
+            timings = {
+                stage_name: round(total * 1000.0 / count, 2) if count else 0.0
+                for stage_name, (count, total) in self._timings.items()
+            }
+        return {
+            "queue_depths": {
+                stage_name: q.qsize() for (stage_name, _), q in zip(self._stages, self._queues)
+            },
+            "avg_stage_ms": timings,
+        }
+
+    def _worker(self, index: int):
+        stage_name, fn = self._stages[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self._queues) else None
+
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                if outbox is not None:
+                    outbox.put(_STOP)
+                return
+
+            started = time.perf_counter()
+            try:
+                result = fn(job)
+            except Exception as e:
+                # Later stages never see a failed job
+                job.future.set_exception(e)
+                continue
+            finally:
+                with self._timings_lock:
+                    entry = self._timings[stage_name]
+                    entry[0] += 1
+                    entry[1] += time.perf_counter() - started
+
+            if outbox is not None:
+                outbox.put(job)
+            else:
+                job.future.set_result(result)
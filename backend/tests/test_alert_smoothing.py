@@ -0,0 +1,30 @@
+from alert_smoothing import AlertSmoother, SmoothingConfig
+
+
+def _ema(**overrides) -> AlertSmoother:
+    settings = dict(mode="ema", ema_alpha=0.4, ema_prior=0.0, enter_threshold=0.5, exit_threshold=0.4)
+    return AlertSmoother(SmoothingConfig(**{**settings, **overrides}))
+
+
+def test_single_high_window_on_new_track_does_not_alert():
+    smoother = _ema()
+    assert smoother.update(1, 0.95) is False
+    assert smoother.smoothed(1) < 0.5
+
+
+def test_sustained_high_score_alerts_once():
+    smoother = _ema()
+    alerts = [smoother.update(1, 0.95) for _ in range(4)]
+    assert alerts == [False, True, False, False]
+
+
+def test_alert_rearms_below_exit_threshold():
+    smoother = _ema()
+    assert [smoother.update(1, 0.95) for _ in range(2)] == [False, True]
+    for _ in range(5):
+        assert smoother.update(1, 0.0) is False
+    assert [smoother.update(1, 0.95) for _ in range(2)] == [False, True]
+
+
+def test_prior_is_configurable():
+    assert _ema(ema_prior=0.5).update(1, 0.95) is True
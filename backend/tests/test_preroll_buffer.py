@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from preroll_buffer import _CameraRing, resample_indices
+
+
+def test_ring_keeps_out_of_order_frames_sorted():
+    ring = _CameraRing(max_duration_sec=5.0, max_bytes=1 << 20)
+    for ts in (0.0, 0.2, 0.1, 0.5, 0.4):
+        assert ring.append(ts, b"x")
+    assert [ts for ts, _ in ring.frames] == [0.0, 0.1, 0.2, 0.4, 0.5]
+    assert ring.late == 2
+
+
+def test_ring_drops_frames_older_than_its_window():
+    ring = _CameraRing(max_duration_sec=1.0, max_bytes=1 << 20)
+    ring.append(0.0, b"x")
+    ring.append(3.0, b"x")
+    assert not ring.append(1.5, b"x")
+    assert [ts for ts, _ in ring.frames] == [3.0]
+
+
+def test_resampling_picks_frames_by_capture_time_after_late_arrivals():
+    ring = _CameraRing(max_duration_sec=5.0, max_bytes=1 << 20)
+    for ts in (0.0, 0.2, 0.1, 0.3):
+        ring.append(ts, f"{ts}".encode())
+    frames = list(ring.frames)
+    indices = resample_indices([ts for ts, _ in frames], fps=10)
+    assert [frames[i][1] for i in indices] == [b"0.0", b"0.1", b"0.2", b"0.3"]
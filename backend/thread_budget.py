@@ -0,0 +1,221 @@
+"""
+CPU thread budget — one place that sizes the thread pools of TensorFlow
+(ConvLSTM), PyTorch (ultralytics YOLO) and OpenCV.
+
+Left alone, each library sizes its pool to every core, so under load they
+oversubscribe the CPU. `apply_thread_budget()` must run before TensorFlow or
+torch execute their first op (main.py and inference_worker.py call it right
+at startup). In process-pool mode the cores are split across workers and
+the API process keeps single-threaded model pools.
+
+Benchmark mode searches for the best TF/torch split on this machine:
+    python thread_budget.py --benchmark [--cores 16] [--seconds 10]
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+from config import (
+    THREAD_BUDGET_CORES,
+    THREADS_TORCH_INTRA,
+    THREADS_TORCH_INTER,
+    THREADS_TF_INTRA,
+    THREADS_TF_INTER,
+    THREADS_TFLITE,
+    THREADS_OPENCV,
+)
+
+_ENV_KEYS = {
+    "torch_intra": "THREADS_TORCH_INTRA",
+    "torch_inter": "THREADS_TORCH_INTER",
+    "tf_intra": "THREADS_TF_INTRA",
+    "tf_inter": "THREADS_TF_INTER",
+    "tflite": "THREADS_TFLITE",
+    "opencv": "THREADS_OPENCV",
+}
+
+
+@dataclass
+class ThreadBudget:
+    torch_intra: int
+    torch_inter: int
+    tf_intra: int
+    tf_inter: int
+    tflite: int
+    opencv: int
+
+    def as_env(self) -> dict:
+        return {_ENV_KEYS[k]: str(v) for k, v in asdict(self).items()}
+
+
+def resolve_thread_budget(workers: int = 1, cores: int = THREAD_BUDGET_CORES) -> ThreadBudget:
+    """
+    Derive the budget for one process. Cores are split evenly across
+    `workers` processes, then roughly half to YOLO (torch) and half to the
+    ConvLSTM (TF/TFLite). Inter-op pools and OpenCV get a single thread:
+    our graphs are sequential and OpenCV only does small per-crop ops.
+    Explicit THREADS_* settings always win.
+    """
+    per_process = max(1, cores // max(1, workers))
+    torch_intra = max(1, per_process // 2)
+    tf_intra = max(1, per_process - torch_intra)
+    return ThreadBudget(
+        torch_intra=THREADS_TORCH_INTRA or torch_intra,
+        torch_inter=THREADS_TORCH_INTER or 1,
+        tf_intra=THREADS_TF_INTRA or tf_intra,
+        tf_inter=THREADS_TF_INTER or 1,
+        tflite=THREADS_TFLITE or tf_intra,
+        opencv=THREADS_OPENCV or 1,
+    )
+
+
+def resolve_api_thread_budget(inference_workers: int) -> ThreadBudget:
+    """
+    Budget for the API process. Without a process pool it runs the models
+    and gets the whole machine. With one, the workers already split every
+    core between them and the API process only decodes, crops and encodes
+    frames, so its model pools get a single thread each.
+    """
+    if inference_workers <= 0:
+        return resolve_thread_budget(workers=1)
+    return ThreadBudget(
+        torch_intra=1, torch_inter=1, tf_intra=1, tf_inter=1, tflite=1,
+        opencv=THREADS_OPENCV or 1,
+    )
+
+
+def apply_thread_budget(budget: ThreadBudget):
+    """Apply `budget` to OpenMP/MKL, OpenCV, torch and TensorFlow."""
+    # OpenMP/MKL pools are sized from the environment when first used
+    os.environ.setdefault("OMP_NUM_THREADS", str(budget.torch_intra))
+    os.environ.setdefault("MKL_NUM_THREADS", str(budget.torch_intra))
+
+    import cv2
+    cv2.setNumThreads(budget.opencv)
+
+    try:
+        import torch
+        torch.set_num_threads(budget.torch_intra)
+        torch.set_num_interop_threads(budget.torch_inter)
+    except ImportError:
+        pass
+    except RuntimeError as e:
+        print(f"[WARN] torch thread budget not applied (already initialised): {e}")
+
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(budget.tf_intra)
+        tf.config.threading.set_inter_op_parallelism_threads(budget.tf_inter)
+    except ImportError:
+        pass
+    except RuntimeError as e:
+        print(f"[WARN] TensorFlow thread budget not applied (already initialised): {e}")
+
+    print(f"[INFO] Thread budget applied: {asdict(budget)}")
+
+
+# ──────────────────────────────────────────────────────────
+# Benchmark mode
+# ──────────────────────────────────────────────────────────
+def _bench_child(args):
+    """Run detector and classifier loops concurrently under the env budget; print JSON."""
+    import numpy as np
+
+    budget = resolve_thread_budget(cores=args.cores)
+    apply_thread_budget(budget)
+
+    from convlstm_runtime import load_convlstm_predictor
+    from detector import load_yolo_detector
+
+    yolo = load_yolo_detector(args.yolo) if args.yolo else None
+    predict_raw = load_convlstm_predictor(
+        args.tflite or None, args.h5 or None, 30, 96, 96, tflite_threads=budget.tflite
+    )
+    frame = np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8)
+    sequence = np.random.rand(1, 30, 96, 96, 3).astype(np.float32)
+
+    counts = {"detect": 0, "classify": 0}
+    stop_at = time.time() + args.seconds
+
+    def detect_loop():
+        while time.time() < stop_at:
+            if yolo is not None:
+                yolo(frame, verbose=False)
+            counts["detect"] += 1
+
+    def classify_loop():
+        while time.time() < stop_at:
+            predict_raw(sequence)
+            counts["classify"] += 1
+
+    threads = [threading.Thread(target=detect_loop), threading.Thread(target=classify_loop)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        "detect_per_sec": counts["detect"] / args.seconds,
+        "classify_per_sec": counts["classify"] / args.seconds,
+    }))
+
+
+def _benchmark(args):
+    """Try TF/torch splits of `cores` in fresh processes and report the best one."""
+    splits = sorted({max(1, round(args.cores * f)) for f in (0.25, 0.375, 0.5, 0.625, 0.75)})
+    results = []
+    for torch_intra, opencv in itertools.product(splits, (1, 2)):
+        tf_intra = max(1, args.cores - torch_intra)
+        env = dict(
+            os.environ,
+            THREADS_TORCH_INTRA=str(torch_intra),
+            THREADS_TF_INTRA=str(tf_intra),
+            THREADS_TFLITE=str(tf_intra),
+            THREADS_OPENCV=str(opencv),
+        )
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--bench-child",
+            "--cores", str(args.cores), "--seconds", str(args.seconds),
+            "--yolo", args.yolo, "--tflite", args.tflite, "--h5", args.h5,
+        ]
+        out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout
+        stats = json.loads(out.strip().splitlines()[-1])
+        # A frame needs one detection and (at least) one classification
+        score = min(stats["detect_per_sec"], stats["classify_per_sec"])
+        results.append((score, torch_intra, tf_intra, opencv, stats))
+        print(f"torch={torch_intra:<3} tf={tf_intra:<3} opencv={opencv}  "
+              f"detect={stats['detect_per_sec']:.1f}/s  classify={stats['classify_per_sec']:.1f}/s")
+
+    score, torch_intra, tf_intra, opencv, _ = max(results)
+    print(f"\nBest split for {args.cores} cores ({score:.1f} frames/s):")
+    print(f"  THREADS_TORCH_INTRA={torch_intra} THREADS_TF_INTRA={tf_intra} "
+          f"THREADS_TFLITE={tf_intra} THREADS_OPENCV={opencv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU thread budget")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--bench-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--cores", type=int, default=THREAD_BUDGET_CORES)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--yolo", default=os.path.join("models", "best (2).pt"))
+    parser.add_argument("--tflite", default=os.path.join("models", "model_grocery.tflite"))
+    parser.add_argument("--h5", default="")
+    args = parser.parse_args()
+
+    if args.bench_child:
+        _bench_child(args)
+    elif args.benchmark:
+        _benchmark(args)
+    else:
+        print(json.dumps(asdict(resolve_thread_budget()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Multi-object tracking backends for the pipeline.
+
+TRACKER_BACKEND selects how detections are associated across frames:
+  "iou"          the pipeline's built-in greedy IoU matcher (default)
+  "bytetrack"    ByteTrack-style association in vectorised NumPy: motion-
+                 predicted boxes, high-score detections matched first, then
+                 low-score ones to the tracks left over, lost tracks kept for
+                 a few frames before they are dropped
+  "ultralytics"  ultralytics' own BYTETracker, fed with the detections of
+                 whichever detection path the pipeline uses (direct, batched
+                 or process pool), one tracker per camera
+
+A backend's `update(bboxes)` returns one tracker id per detection (None for
+a detection it does not track); the pipeline maps tracker ids to person ids.
+"""
+import numpy as np
+
+from config import (
+    TRACKER_HIGH_THRESH,
+    TRACKER_NEW_TRACK_THRESH,
+    TRACKER_MATCH_IOU,
+    TRACKER_BUFFER_FRAMES,
+)
+
+BACKENDS = ("iou", "bytetrack", "ultralytics")
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes -> (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def greedy_match(iou: np.ndarray, min_iou: float) -> list[tuple[int, int]]:
+    """One-to-one (row, col) pairs, highest IoU first, each at least `min_iou`."""
+    if iou.size == 0:
+        return []
+    rows, cols = np.nonzero(iou >= min_iou)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols, pairs = set(), set(), []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            pairs.append((r, c))
+    return pairs
+
+
+def _as_arrays(bboxes) -> tuple[np.ndarray, np.ndarray]:
+    boxes = np.array([[b.x1, b.y1, b.x2, b.y2] for b in bboxes], dtype=np.float32).reshape(-1, 4)
+    scores = np.array([b.confidence for b in bboxes], dtype=np.float32)
+    return boxes, scores
+
+
+class NumpyByteTracker:
+    """ByteTrack-style two-stage association over struct-of-arrays track state."""
+
+    name = "bytetrack"
+
+    def __init__(
+        self,
+        high_thresh: float = TRACKER_HIGH_THRESH,
+        new_track_thresh: float = TRACKER_NEW_TRACK_THRESH,
+        match_iou: float = TRACKER_MATCH_IOU,
+        buffer_frames: int = TRACKER_BUFFER_FRAMES,
+        velocity_momentum: float = 0.7,
+    ):
+        self.high_thresh = high_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_iou = match_iou
+        self.buffer_frames = buffer_frames
+        self.momentum = velocity_momentum
+        self.reset()
+
+    def reset(self):
+        self._ids = np.empty(0, dtype=np.int64)
+        self._boxes = np.empty((0, 4), dtype=np.float32)
+        self._velocity = np.empty((0, 4), dtype=np.float32)
+        self._misses = np.empty(0, dtype=np.int32)
+        self._next_id = 0
+
+    def update(self, bboxes) -> list[int | None]:
+        boxes, scores = _as_arrays(bboxes)
+        ids: list[int | None] = [None] * len(boxes)
+
+        # Constant-velocity prediction of where each track is now
+        predicted = self._boxes + self._velocity * (self._misses[:, None] + 1)
+        matched_tracks = np.zeros(len(self._ids), dtype=bool)
+        matched_dets = np.zeros(len(boxes), dtype=bool)
+        new_boxes = self._boxes.copy()
+
+        # Stage 1: high-score detections against all tracks;
+        # stage 2: low-score detections against the tracks still unmatched
+        high = np.flatnonzero(scores >= self.high_thresh)
+        low = np.flatnonzero(scores < self.high_thresh)
+        for det_idx, min_iou in ((high, self.match_iou), (low, max(self.match_iou, 0.5))):
+            track_idx = np.flatnonzero(~matched_tracks)
+            iou = iou_matrix(predicted[track_idx], boxes[det_idx])
+            for r, c in greedy_match(iou, min_iou):
+                t, d = track_idx[r], det_idx[c]
+                matched_tracks[t] = matched_dets[d] = True
+                new_boxes[t] = boxes[d]
+                ids[d] = int(self._ids[t])
+
+        # Matched tracks: update velocity and box; unmatched: age
+        step = (new_boxes - self._boxes) / (self._misses[:, None] + 1)
+        self._velocity = np.where(
+            matched_tracks[:, None],
+            self.momentum * self._velocity + (1 - self.momentum) * step,
+            self._velocity,
+        )
+        self._boxes = new_boxes
+        self._misses = np.where(matched_tracks, 0, self._misses + 1).astype(np.int32)
+        keep = self._misses <= self.buffer_frames
+        self._ids, self._boxes = self._ids[keep], self._boxes[keep]
+        self._velocity, self._misses = self._velocity[keep], self._misses[keep]
+
+        # Confident unmatched detections start new tracks
+        new = np.flatnonzero(~matched_dets & (scores >= self.new_track_thresh))
+        if len(new):
+            new_ids = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            self._ids = np.concatenate([self._ids, new_ids])
+            self._boxes = np.concatenate([self._boxes, boxes[new]])
+            self._velocity = np.concatenate([self._velocity, np.zeros((len(new), 4), np.float32)])
+            self._misses = np.concatenate([self._misses, np.zeros(len(new), np.int32)])
+            for d, track_id in zip(new.tolist(), new_ids.tolist()):
+                ids[d] = track_id
+        return ids
+
+
+class _Detections:
+    """The slice of ultralytics' Boxes interface its trackers read."""
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray):
+        self.xyxy = boxes
+        self.conf = scores
+        self.cls = np.zeros(len(scores), dtype=np.float32)
+        wh = boxes[:, 2:] - boxes[:, :2]
+        self.xywh = np.concatenate([boxes[:, :2] + wh / 2, wh], axis=1)
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def __getitem__(self, index) -> "_Detections":
+        """Subset by mask or indices, as BYTETracker splits high / low scores."""
+        return _Detections(self.xyxy[index].reshape(-1, 4), np.atleast_1d(self.conf[index]))
+
+
+class UltralyticsByteTracker:
+    """
+    ultralytics' BYTETracker (settings from its bytetrack.yaml) for one
+    camera. If it raises, the camera switches to the NumPy backend.
+    """
+
+    name = "ultralytics"
+
+    def __init__(self, frame_rate: int = 30):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+        try:
+            from ultralytics.utils import YAML
+            load_yaml = YAML.load
+        except ImportError:  # releases before the YAML helper
+            from ultralytics.utils import yaml_load as load_yaml
+
+        self._args = IterableSimpleNamespace(**load_yaml(check_yaml("bytetrack.yaml")))
+        self._frame_rate = frame_rate
+        self._tracker_cls = BYTETracker
+        self._fallback: NumpyByteTracker | None = None
+        self.reset()
+
+    def reset(self):
+        if self._fallback is not None:
+            self._fallback.reset()
+        else:
+            self._tracker = self._tracker_cls(args=self._args, frame_rate=self._frame_rate)
+
+    def update(self, bboxes) -> list[int | None]:
+        if self._fallback is not None:
+            return self._fallback.update(bboxes)
+        boxes, scores = _as_arrays(bboxes)
+        ids: list[int | None] = [None] * len(boxes)
+        try:
+            tracks = self._tracker.update(_Detections(boxes, scores))
+            # Rows are [x1, y1, x2, y2, track_id, score, cls, detection index]
+            for row in np.asarray(tracks).reshape(-1, 8):
+                ids[int(row[7])] = int(row[4])
+        except Exception as e:
+            print(f"[ERROR] ultralytics tracker failed ({type(e).__name__}: {e}) - "
+                  "switching this camera to the NumPy ByteTrack backend.")
+            self._fallback = NumpyByteTracker()
+            self.name = self._fallback.name
+            return self._fallback.update(bboxes)
+        return ids
+
+
+def validate_tracker_backend(backend: str):
+    """Reject an unknown TRACKER_BACKEND at startup, not when the first camera connects."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown tracker backend {backend!r} (expected one of {BACKENDS})")
+
+
+def create_tracker(backend: str, frame_rate: int = 30):
+    """Tracker for one camera, or None for the pipeline's built-in IoU matcher."""
+    validate_tracker_backend(backend)
+    if backend == "bytetrack":
+        return NumpyByteTracker()
+    if backend == "ultralytics":
+        try:
+            return UltralyticsByteTracker(frame_rate)
+        except Exception as e:
+            print(f"[ERROR] ultralytics tracker unavailable ({type(e).__name__}: {e}) - "
+                  "using the NumPy ByteTrack backend.")
+            return NumpyByteTracker()
+    return None
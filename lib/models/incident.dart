@@ -12,6 +12,19 @@ class Incident {
   final String? imageUrl;
   final String? videoUrl;
 
+  /// Crop around the person who triggered the alert (smaller than [imageUrl]).
+  final String? cropUrl;
+
+  /// Number of people whose alerts were merged into this incident.
+  final int subjectCount;
+
+  /// Small base-64 JPEG written with the first Firestore save, shown until
+  /// the backend patches in the uploaded media URLs.
+  final String? thumbnailInline;
+
+  /// True while the backend is still uploading the screenshot / clip.
+  final bool mediaPending;
+
   Incident({
     required this.id,
     required this.cameraName,
@@ -23,6 +36,10 @@ class Incident {
     this.confidence,
     this.imageUrl,
     this.videoUrl,
+    this.cropUrl,
+    this.subjectCount = 1,
+    this.thumbnailInline,
+    this.mediaPending = false,
   });
 
   Map<String, dynamic> toMap() {
@@ -37,6 +54,10 @@ class Incident {
       'confidence': confidence,
       'imageUrl': imageUrl,
       'videoUrl': videoUrl,
+      'cropUrl': cropUrl,
+      'subjectCount': subjectCount,
+      'thumbnailInline': thumbnailInline,
+      'mediaPending': mediaPending,
     };
   }
 
@@ -68,6 +89,10 @@ class Incident {
       confidence: map['confidence']?.toDouble(),
       imageUrl: map['imageUrl'],
       videoUrl: map['videoUrl'],
+      cropUrl: map['cropUrl'],
+      subjectCount: map['subjectCount'] ?? 1,
+      thumbnailInline: map['thumbnailInline'],
+      mediaPending: map['mediaPending'] ?? false,
     );
   }
 }
@@ -1,3 +1,5 @@
+import 'dart:convert';
+
 import 'package:flutter/material.dart';
 import 'package:flutter_svg/flutter_svg.dart';
 import 'package:google_fonts/google_fonts.dart';
@@ -75,7 +77,10 @@ class _CameraIncidentScreenState extends State<CameraIncidentScreen> {
                         ClipRRect(
                           borderRadius: BorderRadius.circular(8),
                           child: Image.network(
-                            incident.imageUrl!,
+                            // The person crop is smaller; the full frame opens on tap
+                            incident.cropUrl?.isNotEmpty == true
+                                ? incident.cropUrl!
+                                : incident.imageUrl!,
                             height: 250,
                             width: double.infinity,
                             fit: BoxFit.cover,
@@ -484,6 +489,14 @@ class _FullScreenIncidentViewerState extends State<_FullScreenIncidentViewer> {
     );
   }
 
+  /// Uploaded screenshot, falling back to the uploaded thumbnail.
+  String get _imageUrl {
+    final imageUrl = widget.incident.imageUrl;
+    return imageUrl != null && imageUrl.isNotEmpty
+        ? imageUrl
+        : widget.incident.thumbnailUrl;
+  }
+
   Widget _buildImageViewer() {
     return Stack(
       alignment: Alignment.center,
@@ -492,8 +505,14 @@ class _FullScreenIncidentViewerState extends State<_FullScreenIncidentViewer> {
           minScale: 0.5,
           maxScale: 4.0,
           child: Center(
-            child: Image.network(
-              widget.incident.imageUrl ?? widget.incident.thumbnailUrl,
+            child: _imageUrl.isEmpty &&
+                    (widget.incident.thumbnailInline ?? '').isNotEmpty
+                ? Image.memory(
+                    base64Decode(widget.incident.thumbnailInline!),
+                    fit: BoxFit.contain,
+                  )
+                : Image.network(
+              _imageUrl,
               fit: BoxFit.contain,
               loadingBuilder: (context, child, loadingProgress) {
                 if (loadingProgress == null) return child;
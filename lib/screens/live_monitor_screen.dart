@@ -51,6 +51,7 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     with WidgetsBindingObserver {
   // ── Camera ────────────────────────────────────────────────
   CameraController? _controller;
+  CameraDescription? _camera;
   List<CameraDescription> _cameras = [];
   bool _cameraInitialized = false;
   String? _cameraError;
@@ -60,6 +61,14 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
   bool _isSendingFrame = false;
   Timer? _webPollTimer; // Used on web (startImageStream not supported)
 
+  // ── Server-driven send rate (from each response's `control`) ──
+  double _maxFps = 10.0;
+  int _maxWidth = 0; // 0 = send full resolution
+  DateTime _nextSendAt = DateTime.fromMillisecondsSinceEpoch(0);
+  // Web sends the camera's own JPEG, so a smaller width means a smaller preset
+  ResolutionPreset _resolutionPreset = ResolutionPreset.medium;
+  bool _switchingResolution = false;
+
   // ── Pipeline results ──────────────────────────────────────
   // ignore: unused_field
   Uint8List? _annotatedFrame;
@@ -127,18 +136,12 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
         return;
       }
 
-      final camera = _cameras.firstWhere(
+      _camera = _cameras.firstWhere(
         (c) => c.lensDirection == CameraLensDirection.back,
         orElse: () => _cameras.first,
       );
 
-      _controller = CameraController(
-        camera,
-        ResolutionPreset.medium,
-        enableAudio: false,
-        imageFormatGroup: ImageFormatGroup.yuv420,
-      );
-
+      _controller = _createController(_camera!, _resolutionPreset);
       await _controller!.initialize();
 
       if (!mounted) return;
@@ -154,6 +157,49 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     }
   }
 
+  CameraController _createController(
+      CameraDescription camera, ResolutionPreset preset) {
+    return CameraController(
+      camera,
+      preset,
+      enableAudio: false,
+      imageFormatGroup: ImageFormatGroup.yuv420,
+    );
+  }
+
+  /// Camera preset for the recommended width, capped at the initial medium.
+  static ResolutionPreset _presetForWidth(int maxWidth) =>
+      maxWidth > 0 && maxWidth <= 320
+          ? ResolutionPreset.low
+          : ResolutionPreset.medium;
+
+  /// Web: re-open the camera at the preset matching `_maxWidth`, so frames
+  /// shrink without decoding and re-encoding them in Dart.
+  Future<void> _switchResolutionIfNeeded() async {
+    final preset = _presetForWidth(_maxWidth);
+    if (!kIsWeb || _switchingResolution || preset == _resolutionPreset) return;
+    if (_camera == null || !_isStreaming || !mounted) return;
+    _switchingResolution = true;
+    _webPollTimer?.cancel();
+    _webPollTimer = null;
+    final old = _controller;
+    setState(() => _cameraInitialized = false);
+    try {
+      _resolutionPreset = preset;
+      _controller = null;
+      await old?.dispose();
+      _controller = _createController(_camera!, preset);
+      await _controller!.initialize();
+      if (!mounted) return;
+      setState(() => _cameraInitialized = true);
+      if (_isStreaming) _startWebPolling();
+    } catch (e) {
+      _setError('Camera error: $e');
+    } finally {
+      _switchingResolution = false;
+    }
+  }
+
   void _setError(String message) {
     debugPrint('[LiveMonitor] $message');
     if (!mounted) return;
@@ -172,11 +218,17 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     final int yRowStride = params['yRowStride'];
     final int uvRowStride = params['uvRowStride'];
     final int uvPixelStride = params['uvPixelStride'];
+    final int maxWidth = params['maxWidth'];
 
-    final image = img.Image(width: width, height: height);
+    // Subsample while converting when the server asks for smaller frames
+    final int step =
+        maxWidth > 0 && width > maxWidth ? (width / maxWidth).ceil() : 1;
+    final image = img.Image(width: width ~/ step, height: height ~/ step);
 
-    for (int y = 0; y < height; y++) {
-      for (int x = 0; x < width; x++) {
+    for (int oy = 0; oy < image.height; oy++) {
+      final int y = oy * step;
+      for (int ox = 0; ox < image.width; ox++) {
+        final int x = ox * step;
         final int yIndex = y * yRowStride + x;
         final int uvIndex = (y ~/ 2) * uvRowStride + (x ~/ 2) * uvPixelStride;
 
@@ -191,7 +243,7 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
             .clamp(0, 255);
         int b = (yVal + 1.732446 * (uVal - 128)).round().clamp(0, 255);
 
-        image.setPixelRgba(x, y, r, g, b, 255);
+        image.setPixelRgba(ox, oy, r, g, b, 255);
       }
     }
 
@@ -209,6 +261,7 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
       'yRowStride': planes[0].bytesPerRow,
       'uvRowStride': planes[1].bytesPerRow,
       'uvPixelStride': planes[1].bytesPerPixel ?? 1,
+      'maxWidth': _maxWidth,
     });
   }
 
@@ -236,11 +289,7 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
 
     // Use startImageStream on mobile, takePicture+Timer on web
     if (kIsWeb) {
-      // Web: poll with takePicture every ~500ms
-      _webPollTimer = Timer.periodic(
-        const Duration(milliseconds: 500),
-        (_) => _captureAndSendFrame(),
-      );
+      _startWebPolling();
     } else {
       _controller!.startImageStream((CameraImage image) {
         _processImageStreamFrame(image);
@@ -248,6 +297,14 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     }
   }
 
+  void _startWebPolling() {
+    // Web: poll with takePicture every ~500ms (a lower max_fps skips ticks)
+    _webPollTimer = Timer.periodic(
+      const Duration(milliseconds: 500),
+      (_) => _captureAndSendFrame(),
+    );
+  }
+
   void _stopStreaming() {
     _webPollTimer?.cancel();
     _webPollTimer = null;
@@ -267,12 +324,14 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
   Future<void> _captureAndSendFrame() async {
     if (!_isStreaming || _isSendingFrame) return;
     if (_controller == null || !_controller!.value.isInitialized) return;
+    if (!_takeSendSlot()) return;
     _isSendingFrame = true;
 
     try {
+      final capturedAt = DateTime.now();
       final XFile photo = await _controller!.takePicture();
       final Uint8List jpegBytes = await photo.readAsBytes();
-      await _sendFrameToBackend(jpegBytes);
+      await _sendFrameToBackend(jpegBytes, capturedAt);
     } catch (e) {
       debugPrint('[LiveMonitor] Web capture error: $e');
       _errorCount++;
@@ -284,6 +343,8 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     } finally {
       _isSendingFrame = false;
     }
+    // Never swap the controller while a picture is being taken
+    await _switchResolutionIfNeeded();
   }
 
   // ──────────────────────────────────────────────────────────
@@ -291,11 +352,13 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
   // ──────────────────────────────────────────────────────────
   Future<void> _processImageStreamFrame(CameraImage image) async {
     if (!_isStreaming || _isSendingFrame) return;
+    if (!_takeSendSlot()) return;
     _isSendingFrame = true;
 
     try {
+      final capturedAt = DateTime.now();
       final Uint8List jpegBytes = await _cameraImageToJpeg(image);
-      await _sendFrameToBackend(jpegBytes);
+      await _sendFrameToBackend(jpegBytes, capturedAt);
     } catch (e) {
       debugPrint('[LiveMonitor] Stream frame error: $e');
       _errorCount++;
@@ -312,10 +375,15 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
   // ──────────────────────────────────────────────────────────
   // Send frame bytes to backend pipeline
   // ──────────────────────────────────────────────────────────
-  Future<void> _sendFrameToBackend(Uint8List jpegBytes) async {
+  Future<void> _sendFrameToBackend(
+    Uint8List jpegBytes,
+    DateTime capturedAt,
+  ) async {
+    // Capture time lets the backend sample frames onto the model's time grid
+    final captureTs = capturedAt.millisecondsSinceEpoch / 1000.0;
     final request = http.MultipartRequest(
       'POST',
-      Uri.parse('$_backendBaseUrl/camera_frame'),
+      Uri.parse('$_backendBaseUrl/camera_frame?capture_ts=$captureTs'),
     );
     request.files.add(
       http.MultipartFile.fromBytes('file', jpegBytes, filename: 'frame.jpg'),
@@ -324,6 +392,22 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
     final response = await request.send();
     final body = await response.stream.bytesToString();
 
+    if (response.statusCode == 429) {
+      // Server is shedding load: wait as told and adopt its recommended rate
+      double retryAfter =
+          double.tryParse(response.headers['retry-after'] ?? '') ?? 1.0;
+      try {
+        final data = jsonDecode(body) as Map<String, dynamic>;
+        _applyControl(data['control']);
+        retryAfter =
+            (data['retry_after_sec'] as num?)?.toDouble() ?? retryAfter;
+      } catch (_) {}
+      _nextSendAt = DateTime.now().add(
+        Duration(milliseconds: (retryAfter * 1000).round()),
+      );
+      return;
+    }
+
     if (response.statusCode != 200) {
       debugPrint('[LiveMonitor] Backend error ${response.statusCode}: $body');
       _errorCount++;
@@ -332,9 +416,27 @@ class _LiveMonitorScreenState extends State<LiveMonitorScreen>
 
     _errorCount = 0;
     final data = jsonDecode(body) as Map<String, dynamic>;
+    _applyControl(data['control']);
     _updateFromResponse(data);
   }
 
+  /// Claims the next send slot at the server's recommended rate.
+  bool _takeSendSlot() {
+    final now = DateTime.now();
+    if (now.isBefore(_nextSendAt)) return false;
+    _nextSendAt = now.add(Duration(milliseconds: (1000 / _maxFps).round()));
+    return true;
+  }
+
+  /// Adopts the send rate and frame width the backend recommends.
+  void _applyControl(dynamic control) {
+    if (control is! Map) return;
+    final fps = (control['max_fps'] as num?)?.toDouble();
+    if (fps != null && fps > 0) _maxFps = fps;
+    final width = (control['max_width'] as num?)?.toInt();
+    if (width != null && width >= 0) _maxWidth = width;
+  }
+
   // ──────────────────────────────────────────────────────────
   // Update UI from backend pipeline response
   // ──────────────────────────────────────────────────────────
@@ -33,10 +33,22 @@ class ApiService {
   /// Returns per-person detections, buffer status, and predictions.
   /// If shoplifting is detected, a Firebase alert is triggered automatically
   /// on the backend (screenshot + video -> Cloudinary -> Firestore -> FCM push).
-  Future<Map<String, dynamic>> sendCameraFrame(Uint8List bytes) async {
+  ///
+  /// [capturedAt] (default: now) is sent as the frame's capture time, which
+  /// the backend uses to sample frames onto the model's time grid.
+  ///
+  /// Every response has a `control` map (`max_fps`, `max_width`) the caller
+  /// should pace and size its frames by. A busy server answers 429 with
+  /// `retry_after_sec` instead of processing the frame.
+  Future<Map<String, dynamic>> sendCameraFrame(
+    Uint8List bytes, {
+    DateTime? capturedAt,
+  }) async {
+    final captureTs =
+        (capturedAt ?? DateTime.now()).millisecondsSinceEpoch / 1000.0;
     final request = http.MultipartRequest(
       'POST',
-      Uri.parse('$baseUrl/camera_frame'),
+      Uri.parse('$baseUrl/camera_frame?capture_ts=$captureTs'),
     );
     request.files.add(
       http.MultipartFile.fromBytes('file', bytes, filename: 'frame.jpg'),
@@ -1,3 +1,5 @@
+import 'dart:convert';
+
 import 'package:flutter/material.dart';
 import 'package:intl/intl.dart';
 import 'package:shoplifting_app/models/incident.dart';
@@ -15,6 +17,20 @@ class IncidentCard extends StatefulWidget {
 class _IncidentCardState extends State<IncidentCard> {
   bool _isHovered = false;
 
+  /// Uploaded thumbnail if available, otherwise the inline preview the
+  /// backend writes before media uploads finish.
+  ImageProvider? _thumbnailImage() {
+    final incident = widget.incident;
+    if (incident.thumbnailUrl.isNotEmpty) {
+      return NetworkImage(incident.thumbnailUrl);
+    }
+    final inline = incident.thumbnailInline;
+    if (inline != null && inline.isNotEmpty) {
+      return MemoryImage(base64Decode(inline));
+    }
+    return null;
+  }
+
   @override
   Widget build(BuildContext context) {
     return MouseRegion(
@@ -42,10 +58,12 @@ class _IncidentCardState extends State<IncidentCard> {
                         width: 2,
                       )
                     : null,
-                image: DecorationImage(
-                  image: NetworkImage(widget.incident.thumbnailUrl),
-                  fit: BoxFit.cover,
-                ),
+                image: _thumbnailImage() == null
+                    ? null
+                    : DecorationImage(
+                        image: _thumbnailImage()!,
+                        fit: BoxFit.cover,
+                      ),
               ),
               child: Center(
                 child: AnimatedScale(
@@ -111,6 +129,19 @@ class _IncidentCardState extends State<IncidentCard> {
                               .onSurfaceVariant,
                         ),
                       ),
+                    if (widget.incident.subjectCount > 1)
+                      Padding(
+                        padding: const EdgeInsets.only(left: 6),
+                        child: Text(
+                          '${widget.incident.subjectCount} people',
+                          style: TextStyle(
+                            fontSize: 10,
+                            color: Theme.of(context)
+                                .colorScheme
+                                .onSurfaceVariant,
+                          ),
+                        ),
+                      ),
                     if (!widget.incident.isReviewed)
                       Container(
                         margin: const EdgeInsets.only(left: 6),